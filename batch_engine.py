@@ -0,0 +1,212 @@
+from collections.abc import Callable
+import numpy as np
+
+from game_engine import CARD_KINDS, TEMPLATE_COUNTS, derive_rngs, remove_cards
+
+
+# batch decks hold the same card codes as Deck, so a card kind doubles as its position in DECK_TEMPLATE
+KIND_COUNTS = TEMPLATE_COUNTS
+KIND_VALUES = np.array([value if card_type != "Trap" else 0 for card_type, value in CARD_KINDS], dtype=np.int64)
+IS_TREASURE = np.array([card_type == "Treasure" for card_type, _ in CARD_KINDS])
+TRAP_NAMES = [value for card_type, value in CARD_KINDS if card_type == "Trap"]
+TRAP_INDEX = np.array([TRAP_NAMES.index(value) if card_type == "Trap" else -1
+                       for card_type, value in CARD_KINDS], dtype=np.int64)
+TRAP_MASKS = 1 << np.arange(len(TRAP_NAMES), dtype=np.int64)
+RELIC_KIND = CARD_KINDS.index(("Relic", 5))
+DECK_SIZE = int(KIND_COUNTS.sum())
+
+
+class BatchState:
+    """
+        state of n_games games, one row per game and one column per player
+        pockets, chests, in_cave, continuing: (n_games, n_players)
+        route: (n_games, DECK_SIZE) card kinds, -1 past route_length, route_values: what is left on each of those cards
+        double_trap, path_complete, route_length: (n_games,)
+        traps_seen: (n_games, len(TRAP_NAMES)) traps already on the route of the current path
+        traps_removed: (n_games, len(TRAP_NAMES)) traps that lost a card to a double trap in an earlier path
+        route_traps and removed_traps give both as (n_games,) bitmasks, laid out like Route.traps
+        decks: (n_games, DECK_SIZE) card kinds, deck_length of them are in play, remaining: (n_games, card kinds)
+    """
+    def __init__(self, n_games: int, n_players: int):
+        self.path_num = 0
+        self.pockets = np.zeros((n_games, n_players), dtype=np.int64)
+        self.chests = np.zeros((n_games, n_players), dtype=np.int64)
+        self.in_cave = np.ones((n_games, n_players), dtype=bool)
+        self.continuing = np.ones((n_games, n_players), dtype=bool)
+
+        self.route = np.full((n_games, DECK_SIZE), -1, dtype=np.int64)
+        self.route_length = np.zeros(n_games, dtype=np.int64)
+        self.double_trap = np.zeros(n_games, dtype=bool)
+        self.traps_seen = np.zeros((n_games, len(TRAP_NAMES)), dtype=bool)
+        self.traps_removed = np.zeros((n_games, len(TRAP_NAMES)), dtype=bool)
+        self.path_complete = np.zeros(n_games, dtype=bool)
+        self.relics_picked = np.zeros(n_games, dtype=np.int64)
+
+        # every card on the route keeps its own value, like the Card objects of the scalar engine
+        self.route_values = np.zeros((n_games, DECK_SIZE), dtype=np.int64)
+        self.path_relics = np.zeros(n_games, dtype=np.int64)
+
+        self.decks = np.full((n_games, DECK_SIZE), -1, dtype=np.int64)
+        self.deck_position = np.zeros(n_games, dtype=np.int64)
+        self.deck_length = np.zeros(n_games, dtype=np.int64)  # 0 until the first deal
+        self.remaining = np.tile(KIND_COUNTS, (n_games, 1))  # cards of every kind left in the game, like DeckManager
+
+    @property
+    def n_games(self):
+        return self.pockets.shape[0]
+
+    @property
+    def route_traps(self) -> np.ndarray:
+        return self.traps_seen @ TRAP_MASKS
+
+    @property
+    def removed_traps(self) -> np.ndarray:
+        return self.traps_removed @ TRAP_MASKS
+
+    def reset_path(self):
+        self.pockets[:] = 0
+        self.in_cave[:] = True
+        self.continuing[:] = True
+        self.route[:] = -1
+        self.route_length[:] = 0
+        self.double_trap[:] = False
+        self.traps_seen[:] = False
+        self.path_complete[:] = False
+        self.route_values[:] = 0
+        self.path_relics[:] = 0
+
+
+class BatchGameEngine:
+    """
+        runs many offline games at once, following the same rules as GameEngine.run_game
+        decision_maker(state: BatchState) returns an array of shape (n_games, n_players), truthy to keep exploring
+        only rows of games still on the current path are read
+    """
+    def __init__(self, decision_maker: Callable, n_players: int = 6):
+        self.decision_maker = decision_maker
+        self.n_players = n_players
+        self.state = None
+
+    @staticmethod
+    def deal_decks(state: BatchState, rngs: list):
+        # mirror DeckManager: the first deal lays out the remaining cards, later ones reshuffle the deck in place
+        state.deck_position[:] = 0
+        kinds = np.arange(len(CARD_KINDS))
+        for game, rng in enumerate(rngs):
+            if state.deck_length[game] == 0:
+                deck = np.repeat(kinds, state.remaining[game])
+                state.deck_length[game] = len(deck)
+                state.decks[game, :len(deck)] = deck
+            rng.shuffle(state.decks[game, :state.deck_length[game]])
+
+    @staticmethod
+    def remove_path_exclusions(state: BatchState):
+        # the relics laid on the path and the trap that ended it leave the game, like DeckManager.next_path
+        triggered_traps = state.route[np.arange(state.n_games), np.maximum(state.route_length - 1, 0)]
+        for game in range(state.n_games):
+            removed_kinds = [RELIC_KIND] * int(state.path_relics[game])
+            if state.double_trap[game]:
+                removed_kinds.append(int(triggered_traps[game]))
+                state.traps_removed[game, TRAP_INDEX[triggered_traps[game]]] = True
+            if not removed_kinds:
+                continue
+            for kind in removed_kinds:  # all of them were drawn from this deck, so none is missing
+                state.remaining[game, kind] -= 1
+            deck = remove_cards(state.decks[game, :state.deck_length[game]], removed_kinds)
+            state.decks[game, len(deck):state.deck_length[game]] = -1
+            state.deck_length[game] = len(deck)
+
+    @staticmethod
+    def advancement_phase(state: BatchState, games: np.ndarray):
+        kinds = state.decks[games, state.deck_position[games]]
+        positions = state.route_length[games]
+        state.deck_position[games] += 1
+        state.route[games, positions] = kinds
+        state.route_values[games, positions] = KIND_VALUES[kinds]
+        state.route_length[games] += 1
+
+        traps = TRAP_INDEX[kinds]
+        is_trap = traps >= 0
+        trap_games, trap_ids = games[is_trap], traps[is_trap]
+        repeated = state.traps_seen[trap_games, trap_ids]
+        state.double_trap[trap_games[repeated]] = True
+        state.traps_seen[trap_games, trap_ids] = True
+
+        is_relic = kinds == RELIC_KIND
+        relic_games = games[is_relic]
+        state.relics_picked[relic_games] += 1
+        state.path_relics[relic_games] += 1
+        upgraded = state.relics_picked[relic_games] > 3  # 4th and 5th relic
+        state.route_values[relic_games[upgraded], positions[is_relic][upgraded]] = 10
+
+        no_active_players = state.in_cave[games].sum(axis=1)
+        state.path_complete[games[no_active_players == 0]] = True
+
+        treasure = IS_TREASURE[kinds] & (no_active_players > 0)
+        treasure_games, treasure_positions = games[treasure], positions[treasure]
+        sharing_players = no_active_players[treasure]
+        values = state.route_values[treasure_games, treasure_positions]
+        state.route_values[treasure_games, treasure_positions] = values % sharing_players
+        state.pockets[treasure_games] += (values // sharing_players)[:, None] * state.in_cave[treasure_games]
+
+        dead_games = games[is_trap & state.double_trap[games] & (no_active_players > 0)]
+        state.pockets[dead_games] *= ~state.in_cave[dead_games]
+        state.in_cave[dead_games] = False
+        state.continuing[dead_games] = False
+        state.path_complete[dead_games] = True
+
+    def decision_phase(self, state: BatchState, games: np.ndarray):
+        decisions = np.asarray(self.decision_maker(state), dtype=bool)
+        state.continuing[games] = decisions[games]
+
+        leaving = state.in_cave[games] & ~state.continuing[games]
+        no_leaving_players = leaving.sum(axis=1)
+        has_leavers = no_leaving_players > 0
+        games, leaving, no_leaving_players = games[has_leavers], leaving[has_leavers], no_leaving_players[has_leavers]
+
+        # split every treasure on the route between the leaving players, only the first width cards are on any route
+        width = state.route_length[games].max(initial=0)
+        route, values = state.route[games, :width], state.route_values[games, :width]
+        treasures = (route >= 0) & IS_TREASURE[route]
+        sharing_players = no_leaving_players[:, None]
+        loot = np.where(treasures, values // sharing_players, 0).sum(axis=1)
+        values = np.where(treasures, values % sharing_players, values)
+
+        # a lone leaver collects the relics
+        relics = (route == RELIC_KIND) & (no_leaving_players == 1)[:, None]
+        loot += np.where(relics, values, 0).sum(axis=1)
+        state.route_values[games, :width] = np.where(relics, 0, values)
+
+        pockets = state.pockets[games] + loot[:, None] * leaving
+        state.chests[games] += pockets * leaving
+        state.pockets[games] = pockets * ~leaving
+        state.in_cave[games] &= ~leaving
+        state.continuing[games] &= ~leaving
+        state.path_complete[games[~state.in_cave[games].any(axis=1)]] = True  # nobody is left to draw for
+
+    def run_path(self, state: BatchState):
+        while True:
+            games = np.flatnonzero(~state.path_complete)
+            if len(games) == 0:
+                break
+            self.advancement_phase(state, games)
+            games = games[~state.path_complete[games]]
+            if len(games) > 0:
+                self.decision_phase(state, games)
+
+        self.remove_path_exclusions(state)
+        state.reset_path()
+
+    def run_games(self, seeds: list) -> list:
+        # game i draws its path decks from the same streams as GameEngine(seed=seeds[i]).run_game
+        path_rngs = [derive_rngs(np.random.default_rng(seed), 5) for seed in seeds]
+        self.state = BatchState(len(path_rngs), self.n_players)
+
+        for path_num in range(5):  # do 5 paths
+            self.state.path_num = path_num
+            self.deal_decks(self.state, [game_rngs[path_num] for game_rngs in path_rngs])
+            self.run_path(self.state)
+
+        # if there is a draw, players share the win
+        chests = self.state.chests
+        return [np.flatnonzero(row == row.max()).tolist() for row in chests]
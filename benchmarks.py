@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import timeit
+from typing import Callable
+
+import numpy as np
+
+from game_engine import (AsyncGameEngine, Board, Card, Deck, DeckManager, GameEngine, generate_deck, MatchEvent,
+                         MatchHistory, Player, TEMPLATE_COUNTS)
+from oracle import DiamantOracle, OracleState
+from wire_protocol import (accept_protocol, decode_decisions, decode_updates, encode_decisions, encode_updates,
+                           JsonProtocol, PROTOCOLS, WireEngineInterface)
+
+
+class RandomDecisionInterface:
+    # offline interface for benchmarks, every player continues with probability continue_chance
+    def __init__(self, seed=None, n_players: int = 6, continue_chance: float = 0.8):
+        self.random = random.Random(seed)
+        self.players = range(n_players)
+        self.continue_chance = continue_chance
+
+    def init_players(self):
+        pass
+
+    def request_decisions(self, updates):
+        return {player_id: {"decision": int(self.random.random() < self.continue_chance)}
+                for player_id in self.players}
+
+    def report_outcome(self, winners, match_history):
+        pass
+
+
+class FakeGameServer:
+    """
+        local stand in for the gameserver, answers every update batch with random decisions
+        speaks the protocols of wire_protocol.py it supports, and json lines to clients that do not negotiate
+        only used to time the decision round-trip, it decodes the updates but does not look at them
+    """
+    def __init__(self, n_players: int = 6, seed=None, protocols=tuple(PROTOCOLS)):
+        self.decisions = RandomDecisionInterface(seed, n_players)
+        self.protocols = protocols
+        self.server = None
+        self.connections = set()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections.add(asyncio.current_task())
+        protocol, updates = await accept_protocol(reader, writer, self.protocols)
+        if updates is not None:
+            await protocol.write_decisions(writer, self.decisions.request_decisions(updates))
+        while await protocol.read_updates(reader) is not None:
+            await protocol.write_decisions(writer, self.decisions.request_decisions(None))
+        writer.close()
+
+    async def start(self) -> tuple:
+        self.server = await asyncio.start_server(self.handle_connection, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):  # the clients have to close their connections first
+        await asyncio.gather(*self.connections)
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class SocketEngineInterface(WireEngineInterface):
+    # talks to FakeGameServer over TCP and keeps the time spent waiting for decisions
+    def __init__(self, address: tuple, n_players: int = 6, protocols=tuple(PROTOCOLS)):
+        super().__init__(address, range(n_players), protocols)
+        self.requests = 0
+        self.request_time = 0.0
+
+    async def request_decisions(self, updates):
+        start_time = time.perf_counter()
+        decisions = await super().request_decisions(updates)
+        self.request_time += time.perf_counter() - start_time
+        self.requests += 1
+        return decisions
+
+
+def time_per_call(function: Callable, number: int, repeat: int = 5) -> float:
+    # the best of `repeat` runs is the least disturbed by the rest of the machine
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def bench_run_game(games: int) -> float:
+    seeds = iter(range(10 ** 9))
+
+    def run_game():
+        seed = next(seeds)
+        GameEngine(engine_interface=RandomDecisionInterface(seed), seed=seed).run_game()
+    return time_per_call(run_game, games, 3)
+
+
+def bench_generate_deck(number: int) -> float:
+    exclusions = [Card("Trap", "Snake"), Card("Relic", 5)]
+    return time_per_call(lambda: generate_deck(exclusions), number)
+
+
+def bench_deck_init(number: int) -> float:
+    exclusions = [Card("Trap", "Snake"), Card("Trap", "Lava"), Card("Relic", 5), Card("Relic", 5)]
+    rng = np.random.default_rng(0)
+    return time_per_call(lambda: Deck(exclusions, rng), number)
+
+
+def bench_next_path(number: int) -> float:
+    # the deck of the next path after a relic and a triggered trap, the deck is refilled before every call
+    rng = np.random.default_rng(0)
+    deck_manager = DeckManager(Deck(rng=rng))
+    codes, counts = deck_manager.deck.codes.copy(), deck_manager.counts.copy()
+    board = Board()
+    for card in (Card("Relic", 5), Card("Trap", "Snake"), Card("Trap", "Snake")):
+        board.add_card(card, MatchHistory())
+
+    def next_path():
+        deck_manager.deck.codes, deck_manager.counts[:], deck_manager.applied_exclusions = codes.copy(), counts, 0
+        deck_manager.next_path(board, rng)
+    return time_per_call(next_path, number)
+
+
+def bench_add_card(number: int) -> float:
+    # a whole path per call, so the result is divided by the number of cards on it
+    cards = [Card("Treasure", value) for value in (5, 9, 14, 3, 17, 2, 7, 1, 11, 4, 15, 13)] + \
+        [Card("Relic", 5), Card("Trap", "Spider"), Card("Trap", "Snake"), Card("Trap", "Spider")]
+
+    def add_path():
+        board = Board()
+        match_history = MatchHistory()
+        for card in cards:
+            board.add_card(card, match_history)
+    return time_per_call(add_path, number) / len(cards)
+
+
+def bench_handle_leaving_players(number: int) -> float:
+    engine = GameEngine(engine_interface=RandomDecisionInterface(0))
+    board = Board()
+    for card in [Card("Treasure", value) for value in (5, 9, 14, 3, 17, 2, 7, 1)] + [Card("Relic", 5)]:
+        board.add_card(card, engine.match_history)
+    values = [card.value for card in board.route]
+
+    def leave(leaving_players):
+        for card, value in zip(board.route, values):
+            card.value = value
+        engine.handle_leaving_players(len(leaving_players), leaving_players, board)
+        engine.match_history.get_updates()
+
+    pair = [Player(0), Player(1)]
+    alone = [Player(2)]
+    return time_per_call(lambda: (leave(pair), leave(alone)), number) / 2
+
+
+def turn_history(match_history: MatchHistory = None) -> MatchHistory:
+    # the events of a typical turn, recorded into match_history or a new history
+    match_history = match_history if match_history is not None else MatchHistory()
+    match_history.record(MatchEvent.ADD_CARD, "Treasure", 9)
+    match_history.record(MatchEvent.CHANGE_CARD, 3, "Treasure", 1)
+    for player_id in range(4):
+        match_history.record(MatchEvent.PICKUP_LOOT, player_id, 10, 2)
+    match_history.record(MatchEvent.LEAVE_CAVE, 5, 7, 20)
+    return match_history
+
+
+def bench_get_updates(number: int) -> float:
+    # a typical turn exported the way the offline interfaces receive it
+    match_history = MatchHistory()
+    return time_per_call(lambda: turn_history(match_history).get_updates().to_list(), number)
+
+
+def bench_json_codec(number: int) -> float:
+    # one turn of updates and the decisions of six players through the json protocol, both directions
+    updates = turn_history().get_updates()
+    decisions = {player_id: {"decision": 1} for player_id in range(6)}
+
+    def round_trip():
+        json.loads(JsonProtocol.encode_updates(updates))
+        {int(player_id): decision for player_id, decision in json.loads(json.dumps(decisions)).items()}
+    return time_per_call(round_trip, number)
+
+
+def bench_binary_codec(number: int) -> float:
+    updates = turn_history().get_updates()
+    decisions = {player_id: {"decision": 1} for player_id in range(6)}
+
+    def round_trip():
+        decode_updates(encode_updates(updates))
+        decode_decisions(encode_decisions(decisions))
+    return time_per_call(round_trip, number)
+
+
+def bench_decision_round_trip(games: int, protocols=("json",)) -> float:
+    async def play():
+        server = FakeGameServer(seed=0)
+        address = await server.start()
+        requests, request_time = 0, 0.0
+        for seed in range(games):
+            engine_interface = SocketEngineInterface(address, protocols=protocols)
+            await AsyncGameEngine(engine_interface=engine_interface, seed=seed).start()
+            engine_interface.close()
+            requests += engine_interface.requests
+            request_time += engine_interface.request_time
+        await server.stop()
+        return request_time / requests
+
+    loop = asyncio.new_event_loop()  # leaves the default loop of a synchronous GameEngine alone
+    try:
+        return loop.run_until_complete(play())
+    finally:
+        loop.close()
+
+
+def bench_oracle_rollouts(number: int) -> float:
+    # an uncached query late in a path that is too large to enumerate, so it is answered by rollouts
+    counts = tuple(int(count) for count in TEMPLATE_COUNTS[:-5]) + (2, 2, 3, 3, 3)
+    state = OracleState(counts, 0b11, 10, 3, 5, 3, 2)
+    diamant_oracle = DiamantOracle(exact_limit=1, seed=0)
+
+    def query():
+        diamant_oracle.cache.clear()
+        diamant_oracle.evaluate(state, horizon=5)
+    return time_per_call(query, number)
+
+
+BENCHMARKS = {  # name: (function, iterations, quick iterations), every result is seconds per operation
+    "run_game": (bench_run_game, 200, 20),
+    "generate_deck": (bench_generate_deck, 5000, 200),
+    "deck_init": (bench_deck_init, 5000, 200),
+    "next_path_deck": (bench_next_path, 5000, 200),
+    "board_add_card": (bench_add_card, 2000, 100),
+    "handle_leaving_players": (bench_handle_leaving_players, 5000, 200),
+    "match_history_get_updates": (bench_get_updates, 5000, 200),
+    "decision_round_trip": (bench_decision_round_trip, 20, 2),
+    "binary_decision_round_trip": (lambda games: bench_decision_round_trip(games, ("binary",)), 20, 2),
+    "json_codec": (bench_json_codec, 5000, 200),
+    "binary_codec": (bench_binary_codec, 5000, 200),
+    "oracle_rollouts": (bench_oracle_rollouts, 2000, 100),
+}
+
+
+def run_benchmarks(names: list = None, quick: bool = False) -> dict:
+    results = {}
+    for name in names or BENCHMARKS:
+        function, iterations, quick_iterations = BENCHMARKS[name]
+        results[name] = function(quick_iterations if quick else iterations)
+        logging.info(name + ": " + format(results[name] * 1e6, ".2f") + " us")
+    return results
+
+
+def compare_results(results: dict, baseline: dict, tolerance: float = 0.25) -> list:
+    # benchmarks that got more than `tolerance` slower than the baseline, as (name, baseline, result)
+    return [(name, baseline[name], result) for name, result in results.items()
+            if name in baseline and result > baseline[name] * (1 + tolerance)]
+
+
+def save_results(path: str, results: dict):
+    with open(path, "w") as results_file:
+        json.dump({"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                   "results": results}, results_file, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as results_file:
+        return json.load(results_file)["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the engine hot paths and compare them with a baseline")
+    parser.add_argument("benchmarks", nargs="*", help="any of " + ", ".join(BENCHMARKS) + ", defaults to all")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 is 25%%")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke test")
+    args = parser.parse_args()
+
+    unknown_benchmarks = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown_benchmarks:
+        parser.error("unknown benchmarks: " + ", ".join(sorted(unknown_benchmarks)))
+
+    results = run_benchmarks(args.benchmarks, args.quick)
+    if "run_game" in results:
+        logging.info("games per second: " + format(1 / results["run_game"], ".0f"))
+    save_results(args.output, results)
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        return
+
+    try:
+        baseline = load_results(args.baseline)
+    except FileNotFoundError:
+        logging.warning("no baseline at " + args.baseline + ", run with --save-baseline to create one")
+        return
+
+    regressions = compare_results(results, baseline, args.tolerance)
+    for name, baseline_result, result in regressions:
+        logging.error(name + " regressed: " + format(baseline_result * 1e6, ".2f") + " us -> "
+                      + format(result * 1e6, ".2f") + " us")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+from collections import Counter
+import itertools
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+
+from game_engine import AsyncGameEngine, MatchHistory
+from tournament import create_bot, load_bot, round_robin
+
+
+def bot_worker(worker_id: int, bot_spec: str, requests: multiprocessing.Queue, responses: multiprocessing.Queue):
+    # loads the bot once, then answers batches of [(request_id, seat, encoded updates)] until it gets None
+    # every seat, a (game id, player id) pair, is played by its own bot (see create_bot), a request id of None
+    # ends the game of that seat
+    load_bot(bot_spec)
+    bots = {}
+    while True:
+        batch = requests.get()
+        if batch is None:
+            break
+        results = []
+        for request_id, seat, encoded_updates in batch:
+            if request_id is None:
+                bots.pop(seat, None)
+                continue
+            try:
+                if seat not in bots:
+                    bots[seat] = create_bot(bot_spec)
+                results.append((request_id, int(bots[seat](MatchHistory.from_bytes(encoded_updates))), None))
+            except Exception as error:  # a crashing bot fails its own request, not the worker
+                results.append((request_id, None, repr(error)))
+        responses.put((worker_id, results))
+
+
+class BotPool:
+    """
+        pre-forked worker processes that keep their bot loaded between games
+        every bot spec gets workers_per_bot workers, and every worker has at most one batch in flight:
+        the requests of all games on the event loop pile up while it is busy and go out together once it is done,
+        so the more games run concurrently the fewer IPC round-trips each decision costs
+        the updates travel as MatchHistory records (EventSequence.to_bytes) instead of pickled dicts
+        a seat sticks to one worker for the whole game, so a bot class keeps its state per game and seat
+        a worker that dies fails its requests instead of leaving them waiting, it is checked every liveness_interval
+    """
+    def __init__(self, bot_specs: list, workers_per_bot: int = 1, liveness_interval: float = 0.1):
+        self.bot_specs = sorted(set(bot_specs))
+        self.workers_per_bot = workers_per_bot
+        self.responses = multiprocessing.Queue()
+        self.processes = []
+        self.request_queues = []  # per worker id
+        self.next_worker = {}  # bot_spec: cycle of its worker ids
+        self.liveness_interval = liveness_interval
+
+        self.pending = {}  # worker id: [(request_id, seat, encoded updates)] waiting for the worker
+        self.busy = set()  # worker ids with a batch in flight
+        self.in_flight = {}  # worker id: request ids of its batch in flight
+        self.dead = set()
+        self.busy_lock = threading.Lock()
+        self.flush_scheduled = False
+        self.futures = {}
+        self.request_ids = itertools.count()
+        self.game_ids = itertools.count()
+        self.seat_workers = {}  # seat: worker id playing it
+        self.closing = False
+        self.loop = None
+        self.reader = None
+        self.requests_sent = 0
+        self.batches_sent = 0
+
+    def start(self):
+        for bot_spec in self.bot_specs:
+            worker_ids = []
+            for _ in range(self.workers_per_bot):
+                worker_id, requests = len(self.processes), multiprocessing.Queue()
+                process = multiprocessing.Process(target=bot_worker, daemon=True,
+                                                  args=(worker_id, bot_spec, requests, self.responses))
+                process.start()
+                self.processes.append(process)
+                self.request_queues.append(requests)
+                worker_ids.append(worker_id)
+            self.next_worker[bot_spec] = itertools.cycle(worker_ids)
+        self.reader = threading.Thread(target=self.read_responses, daemon=True)
+        self.reader.start()
+        return self
+
+    def close(self):
+        self.closing = True  # the workers exit now, they are not dead
+        for requests in self.request_queues:
+            requests.put(None)
+        for process in self.processes:
+            process.join()
+        self.responses.put(None)
+        self.reader.join()
+        self.processes, self.request_queues = [], []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.close()
+
+    def new_game(self) -> int:
+        return next(self.game_ids)
+
+    def request_decision(self, bot_spec: str, encoded_updates: bytes, seat=None) -> asyncio.Future:
+        # called from the event loop the games run on, one pool can serve several asyncio.run calls in turn
+        self.loop = asyncio.get_running_loop()
+        request_id = next(self.request_ids)
+        future = self.loop.create_future()
+        self.futures[request_id] = future
+
+        worker_id = self.seat_workers.get(seat)
+        if worker_id is None:
+            worker_id = self.next_live_worker(bot_spec)
+            if seat is not None:
+                self.seat_workers[seat] = worker_id
+        self.pending.setdefault(worker_id, []).append((request_id, seat, encoded_updates))
+        self.requests_sent += 1
+        self.schedule_flush()
+        return future
+
+    def next_live_worker(self, bot_spec: str) -> int:
+        for _ in range(self.workers_per_bot):
+            worker_id = next(self.next_worker[bot_spec])
+            if worker_id not in self.dead:
+                break
+        return worker_id  # a dead one if they all are, flush fails its requests
+
+    def end_game(self, game_id: int, players):
+        # the workers forget the bots of the game's seats
+        self.loop = asyncio.get_running_loop()
+        for player_id in players:
+            worker_id = self.seat_workers.pop((game_id, player_id), None)
+            if worker_id is not None:
+                self.pending.setdefault(worker_id, []).append((None, (game_id, player_id), None))
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if not self.flush_scheduled:  # the requests of this loop iteration go out together
+            self.flush_scheduled = True
+            self.loop.call_soon(self.flush)
+
+    def flush(self):  # sends the waiting requests of every idle worker, runs on the event loop
+        self.flush_scheduled = False
+        with self.busy_lock:
+            for worker_id in [worker_id for worker_id in self.pending if worker_id not in self.busy]:
+                batch = self.pending.pop(worker_id)
+                request_ids = [request_id for request_id, _, _ in batch if request_id is not None]
+                if worker_id in self.dead:
+                    self.fail(request_ids, worker_id)
+                    continue
+                self.request_queues[worker_id].put(batch)
+                self.busy.add(worker_id)
+                self.in_flight[worker_id] = request_ids
+                self.batches_sent += 1
+
+    def read_responses(self):  # runs in its own thread, queue reads would block the event loop
+        while True:
+            try:
+                response = self.responses.get(timeout=self.liveness_interval)
+            except queue.Empty:
+                self.check_workers()
+                continue
+            if response is None:
+                break
+            worker_id, results = response
+            for request_id, decision, error in results:
+                future = self.futures.pop(request_id, None)
+                if future is None:  # already failed, its worker was taken for dead
+                    continue
+                try:
+                    future.get_loop().call_soon_threadsafe(self.resolve, future, decision, error)
+                except RuntimeError:  # the games of that loop are over
+                    pass
+            with self.busy_lock:
+                self.busy.discard(worker_id)
+                self.in_flight.pop(worker_id, None)
+            self.flush_threadsafe()
+
+    def check_workers(self):
+        for worker_id, process in enumerate(self.processes):
+            if self.closing or worker_id in self.dead or process.is_alive():
+                continue
+            logging.error("bot worker " + str(worker_id) + " died with exit code " + str(process.exitcode))
+            with self.busy_lock:
+                self.dead.add(worker_id)
+                self.busy.discard(worker_id)
+                self.fail(self.in_flight.pop(worker_id, []), worker_id)
+            self.flush_threadsafe()  # fails the requests still waiting for it
+
+    def fail(self, request_ids: list, worker_id: int):
+        for request_id in request_ids:
+            future = self.futures.pop(request_id, None)
+            if future is None:
+                continue
+            try:
+                future.get_loop().call_soon_threadsafe(self.resolve, future, None,
+                                                       "bot worker " + str(worker_id) + " died")
+            except RuntimeError:
+                pass
+
+    def flush_threadsafe(self):
+        try:
+            self.loop.call_soon_threadsafe(self.flush)
+        except (AttributeError, RuntimeError):  # no loop yet, or it is closed
+            pass
+
+    @staticmethod
+    def resolve(future: asyncio.Future, decision: int, error: str):
+        if future.cancelled():  # e.g. the decision deadline passed
+            return
+        if error is None:
+            future.set_result(decision)
+        else:
+            future.set_exception(RuntimeError("bot failed: " + error))
+
+
+class PooledEngineInterface:
+    # engine interface of one game whose seats are played by the bots of a BotPool, asked one player at a time
+    # so a decision_timeout covers every bot separately
+    accepts_history_views = True
+    per_player_decisions = True
+
+    def __init__(self, pool: BotPool, bot_specs: list):
+        self.pool = pool
+        self.bot_specs = bot_specs
+        self.players = range(len(bot_specs))
+        self.game_id = pool.new_game()
+        self.encoded_range = None
+        self.encoded_updates = None
+
+    def init_players(self):
+        pass
+
+    async def request_player_decision(self, player_id, updates):
+        # every player gets the events since its own last request, players asked together share them, encode once
+        if (updates.start, updates.stop) != self.encoded_range:
+            self.encoded_range, self.encoded_updates = (updates.start, updates.stop), updates.to_bytes()
+        return {"decision": await self.pool.request_decision(self.bot_specs[player_id], self.encoded_updates,
+                                                             (self.game_id, player_id))}
+
+    def report_outcome(self, winners, match_history):
+        pass
+
+
+async def evaluate(pool: BotPool, pairings: list, seed: int = 0, concurrency: int = 256,
+                   decision_timeout: float = None) -> list:
+    """
+        plays every pairing on the pool, at most `concurrency` games at once, and returns the results in order
+        match i is seeded with seed + i like run_tournament, so the two agree on every match
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def play(match_id, pairing):
+        async with slots:
+            engine_interface = PooledEngineInterface(pool, pairing)
+            engine = AsyncGameEngine(engine_interface=engine_interface, seed=seed + match_id,
+                                     decision_timeout=decision_timeout)
+            try:
+                winners = await engine.run_game()
+            finally:
+                pool.end_game(engine_interface.game_id, engine_interface.players)
+        return {"match_id": match_id, "pairing": list(pairing), "seed": seed + match_id,
+                "winners": winners, "winning_bots": [pairing[player_id] for player_id in winners]}
+
+    return await asyncio.gather(*(play(match_id, pairing) for match_id, pairing in enumerate(pairings)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate offline bots on a pool of warm worker processes")
+    parser.add_argument("bots", nargs="+", help="bot modules as module or module:function (or class)")
+    parser.add_argument("--players-per-match", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--workers-per-bot", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=256, help="games played at once")
+    parser.add_argument("--decision-timeout", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pairings = round_robin(args.bots, args.players_per_match, args.rounds)
+    with BotPool(args.bots, args.workers_per_bot) as pool:
+        results = asyncio.run(evaluate(pool, pairings, args.seed, args.concurrency, args.decision_timeout))
+
+    wins = Counter()
+    for result in results:
+        print(json.dumps(result))
+        wins.update(result["winning_bots"])
+    logging.info("pool wins: " + str(dict(wins)) + " in " + str(pool.batches_sent) + " batches")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,112 @@
+"""
+    exact outcome of one path when every player follows the same leave threshold
+
+    all players in the cave hold the same pocket, as every treasure is split evenly between them,
+    so with one shared threshold they all leave on the same turn, splitting the route loot, and relics
+    only go to a player alone in the cave. A path ends with a double trap, with everybody leaving once
+    their pocket reaches the threshold, or with everybody leaving when the deck runs out
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from batch_engine import IS_TREASURE, KIND_VALUES, TRAP_INDEX
+from game_engine import deck_counts
+from oracle import leave_value, OracleState
+
+
+TRAP_KINDS = tuple(int(kind) for kind in (TRAP_INDEX >= 0).nonzero()[0])  # in TRAP_INDEX order, like the bitmask
+LOOT_KINDS = tuple(int(kind) for kind in (TRAP_INDEX < 0).nonzero()[0])  # treasures and the relic
+
+# double_trap: probability the path ends with a double trap, expected_loot: loot every player takes home,
+# expected_cards: cards drawn from here to the end of the path
+PathOutcome = namedtuple("PathOutcome", ["double_trap", "expected_loot", "expected_cards"])
+
+
+def trap_signature(state: OracleState) -> tuple:
+    # trap kinds only differ by whether one is on the route and how many are left, so the solver keeps
+    # the sorted (on_route, left) pairs and every relabelling of the traps shares one cache entry
+    return tuple(sorted(((state.route_traps >> bit) & 1, state.counts[kind]) for bit, kind in enumerate(TRAP_KINDS)))
+
+
+class PathSolver:
+    """
+        memoized recursion over the remaining deck composition, the traps on the route and the loot so far
+        a state is (loot card counts in LOOT_KINDS order, trap signature, shared pocket, route loot, route relics,
+        relics picked), cache_size bounds the LRU of solved states, and a solved state is a dictionary lookup away
+        so reference bots can ask every turn
+    """
+    def __init__(self, n_players: int, threshold: int, cache_size: int = 1 << 20):
+        self.n_players = n_players
+        self.threshold = threshold
+        # (pocket gain, route loot gain) of every loot kind, relics are handled apart
+        self.splits = tuple((int(KIND_VALUES[kind]) // n_players, int(KIND_VALUES[kind]) % n_players)
+                            if IS_TREASURE[kind] else None for kind in LOOT_KINDS)
+        self.solve = lru_cache(maxsize=cache_size)(self.solve_state)
+
+    def leave(self, pocket: int, route_loot: int, route_relics: int) -> PathOutcome:
+        return PathOutcome(0.0, leave_value(pocket, route_loot, route_relics, self.n_players), 0.0)
+
+    def solve_state(self, counts: tuple, traps: tuple, pocket: int, route_loot: int, route_relics: int,
+                    relics_picked: int) -> PathOutcome:
+        # PathOutcome before the next card is drawn, everybody leaves in the decision phase after the card
+        # that brings their pocket to the threshold
+        total = sum(counts) + sum(left for _, left in traps)
+        if total == 0:
+            return self.leave(pocket, route_loot, route_relics)
+
+        double_trap, expected_loot, expected_cards = 0.0, 0.0, 1.0
+        outcomes = []  # (probability, PathOutcome after the draw)
+        for index, count in enumerate(counts):
+            if count == 0:
+                continue
+            next_counts = counts[:index] + (count - 1,) + counts[index + 1:]
+            split = self.splits[index]
+            if split is None:  # the relic
+                relic_value = 10 if relics_picked >= 3 else 5
+                outcome = self.next_outcome(next_counts, traps, pocket, route_loot, route_relics + relic_value,
+                                            relics_picked + 1)
+            else:
+                outcome = self.next_outcome(next_counts, traps, pocket + split[0], route_loot + split[1],
+                                            route_relics, relics_picked)
+            outcomes.append((count / total, outcome))
+
+        for position, (on_route, left) in enumerate(traps):
+            if left == 0 or traps.index((on_route, left)) != position:  # equal pairs are drawn as one
+                continue
+            probability = traps.count((on_route, left)) * left / total
+            if on_route:
+                double_trap += probability
+                continue
+            next_traps = tuple(sorted(traps[:position] + ((1, left - 1),) + traps[position + 1:]))
+            outcomes.append((probability, self.next_outcome(counts, next_traps, pocket, route_loot, route_relics,
+                                                            relics_picked)))
+
+        for probability, outcome in outcomes:
+            double_trap += probability * outcome.double_trap
+            expected_loot += probability * outcome.expected_loot
+            expected_cards += probability * outcome.expected_cards
+        return PathOutcome(double_trap, expected_loot, expected_cards)
+
+    def next_outcome(self, counts, traps, pocket, route_loot, route_relics, relics_picked) -> PathOutcome:
+        if pocket >= self.threshold:
+            return self.leave(pocket, route_loot, route_relics)
+        return self.solve(counts, traps, pocket, route_loot, route_relics, relics_picked)
+
+    def outcome(self, state: OracleState) -> PathOutcome:
+        # the rest of the path from a game state, e.g. oracle.state_from_game, its n_players is ignored
+        return self.solve(tuple(state.counts[kind] for kind in LOOT_KINDS), trap_signature(state), state.pocket,
+                          state.route_loot, state.route_relics, state.relics_picked)
+
+    def path_outcome(self, exclusions: list = None, relics_picked: int = 0) -> PathOutcome:
+        # a fresh path on the deck generate_deck builds from these exclusions
+        counts = tuple(int(count) for count in deck_counts(exclusions))
+        return self.outcome(OracleState(counts, 0, 0, 0, 0, self.n_players, relics_picked))
+
+    def cache_info(self):
+        return self.solve.cache_info()
+
+
+def solve_thresholds(n_players: int, thresholds, exclusions: list = None, relics_picked: int = 0) -> dict:
+    # threshold: PathOutcome of a fresh path, e.g. to pick the threshold with the most expected loot
+    return {threshold: PathSolver(n_players, threshold).path_outcome(exclusions, relics_picked)
+            for threshold in thresholds}
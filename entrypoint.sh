@@ -1,6 +1,11 @@
 #!/bin/bash
 
 # requirements should already be satisfied with the container image
-python3 game_engine.py
+if [ "$GAME_RUNNER_MODE" = "server" ]; then
+    # long lived mode, plays the matches it is assigned until the container is stopped
+    python3 game_server.py
+else
+    python3 game_engine.py
+fi
 
 # when game is done, container exits
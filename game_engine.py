@@ -1,47 +1,104 @@
+from array import array
 import asyncio
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
 from enum import Enum
+import inspect
+import json
 import logging
 import numpy as np
 import os
+import struct
 from typing import Union
 
 
+# base deck composition as (card_type, value, count), in the order cards are laid out before shuffling
+DECK_TEMPLATE = (
+    ("Treasure", 5,  2),
+    ("Treasure", 9,  1),
+    ("Treasure", 14, 1),
+    ("Treasure", 3,  1),
+    ("Treasure", 17, 1),
+    ("Treasure", 2,  1),
+    ("Treasure", 7,  2),
+    ("Treasure", 1,  1),
+    ("Treasure", 11, 2),
+    ("Treasure", 4,  1),
+    ("Treasure", 15, 1),
+    ("Treasure", 13, 1),
+
+    ("Relic", 5, 5),
+
+    ("Trap", "Spider",  3),
+    ("Trap", "Snake",   3),
+    ("Trap", "Lava",    3),
+    ("Trap", "Boulder", 3),
+    ("Trap", "Ram",     3),
+)
+
+
+# cards are encoded as small integers: the index of their (card_type, value) kind in DECK_TEMPLATE
+CARD_KINDS = tuple((card_type, value) for card_type, value, _ in DECK_TEMPLATE)
+CARD_CODES = {card_kind: code for code, card_kind in enumerate(CARD_KINDS)}
+RELIC_CODE = CARD_CODES[("Relic", 5)]
+TEMPLATE_COUNTS = np.array([count for _, _, count in DECK_TEMPLATE], dtype=np.int64)
+TEMPLATE_CODES = np.repeat(np.arange(len(CARD_KINDS), dtype=np.int8), TEMPLATE_COUNTS)  # the unshuffled base deck
+
+
+def card_code(card) -> Union[int, None]:
+    # None for cards outside the base deck, e.g. a treasure whose value was already split
+    return CARD_CODES.get((card.card_type, card.value))
+
+
+def exclusion_code(card) -> Union[int, None]:
+    # a relic card can be worth 10 or already picked up by now, any relic removes one relic card
+    return RELIC_CODE if card.card_type == "Relic" else card_code(card)
+
+
+def deck_counts(exclusions: Union[list, None]) -> np.ndarray:
+    # how many cards of every kind remain, each exclusion removes one matching card while any are left
+    if not exclusions:
+        return TEMPLATE_COUNTS.copy()
+
+    excluded_codes = [code for code in map(exclusion_code, exclusions) if code is not None]
+    excluded_counts = np.bincount(excluded_codes, minlength=len(CARD_KINDS))
+    return np.maximum(TEMPLATE_COUNTS - excluded_counts, 0)
+
+
+def generate_deck_codes(exclusions: Union[list, None]) -> np.ndarray:
+    if not exclusions:
+        return TEMPLATE_CODES.copy()
+    return np.repeat(np.arange(len(CARD_KINDS), dtype=np.int8), deck_counts(exclusions))
+
+
 def generate_deck(exclusions: Union[list, None]) -> list:
-    card_deck = {
-        Card("Treasure", 5):  2,
-        Card("Treasure", 9):  1,
-        Card("Treasure", 14): 1,
-        Card("Treasure", 3):  1,
-        Card("Treasure", 17): 1,
-        Card("Treasure", 2):  1,
-        Card("Treasure", 7):  2,
-        Card("Treasure", 1):  1,
-        Card("Treasure", 11): 2,
-        Card("Treasure", 4):  1,
-        Card("Treasure", 15): 1,
-        Card("Treasure", 13): 1,
-
-        Card("Relic", 5): 5,
-
-        Card("Trap", "Spider"):  3,
-        Card("Trap", "Snake"):   3,
-        Card("Trap", "Lava"):    3,
-        Card("Trap", "Boulder"): 3,
-        Card("Trap", "Ram"):     3,
-    }
-
-    card_deck = [elem for card, count in card_deck.items() for elem in [card] * count]
-
-    if exclusions is None:
-        return card_deck
-
-    for excluded_card in exclusions:
-        for card in card_deck:
-            if card.card_type == excluded_card.card_type and card.value == excluded_card.value:
-                card_deck.remove(card)
-                break  # find a matching card, remove it once, and immediately break
-    return card_deck
+    # every card is its own Card, splitting one treasure or upgrading one relic leaves its duplicates alone
+    return [Card.from_code(code) for code in generate_deck_codes(exclusions)]
+
+
+def remove_cards(codes: np.ndarray, removed_codes) -> np.ndarray:
+    # removes one card of every code in place, the last card takes the place of the removed one,
+    # and returns the shortened view, codes that are not left are skipped
+    cards = codes.tolist()  # list lookups beat numpy calls on a deck this small
+    length = len(cards)
+    for code in removed_codes:
+        try:
+            position = cards.index(code, 0, length)
+        except ValueError:
+            continue
+        length -= 1
+        cards[position] = codes[position] = cards[length]
+    return codes[:length]
+
+
+def derive_rngs(rng: np.random.Generator, count: int) -> list:
+    # independent child streams of a game's generator, e.g. one per path deck
+    return [np.random.default_rng(seed_sequence)
+            for seed_sequence in np.random.SeedSequence(rng.integers(2 ** 63)).spawn(count)]
+
+
+def shuffled_decks(count: int, exclusions: Union[list, None] = None, rng=None) -> np.ndarray:
+    # count independently shuffled copies of the same deck in one call, one deck of card codes per row
+    return np.random.default_rng(rng).permuted(np.tile(generate_deck_codes(exclusions), (count, 1)), axis=1)
 
 
 class MatchEvent(Enum):
@@ -60,6 +117,9 @@ class MatchEvent(Enum):
 
         board_trap_trigger.keys() = [card_type, value]
         new_path.keys() = [path_num]
+
+        player_timeout.keys() = [player_id, decision]
+        NOTE: decision = the default decision the player got for missing the deadline or failing to answer
     """
     LEAVE_CAVE = "player_leaves"
     KILL_PLAYER = "player_death"
@@ -68,26 +128,246 @@ class MatchEvent(Enum):
     ADD_CARD = "board_add_card"
     CHANGE_CARD = "board_change_card"
     NEW_PATH = "new_path"
-
-
-class MatchHistory(list):
-    def __init__(self):
-        super().__init__()
+    PLAYER_TIMEOUT = "player_timeout"
+
+
+# event log layout: every event is an event code plus up to three integer fields, in this order
+EVENT_FIELDS = {
+    MatchEvent.LEAVE_CAVE: ("player_id", "pocket", "chest"),
+    MatchEvent.KILL_PLAYER: ("player_id", "pocket"),
+    MatchEvent.PICKUP_LOOT: ("player_id", "pocket", "amount"),
+    MatchEvent.TRIGGER_TRAP: ("card_type", "value"),
+    MatchEvent.ADD_CARD: ("card_type", "value"),
+    MatchEvent.CHANGE_CARD: ("card_index", "card_type", "value"),
+    MatchEvent.NEW_PATH: ("path_num",),
+    MatchEvent.PLAYER_TIMEOUT: ("player_id", "decision"),
+}
+EVENT_TYPES = tuple(MatchEvent)
+EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+CARD_TYPES = ("Treasure", "Relic", "Trap")
+CARD_TYPE_CODES = {card_type: code for code, card_type in enumerate(CARD_TYPES)}
+TRAP_NAMES = tuple(value for card_type, value in CARD_KINDS if card_type == "Trap")
+TRAP_CODES = {trap_name: code for code, trap_name in enumerate(TRAP_NAMES)}
+TRAP_MASKS = {trap_name: 1 << code for trap_name, code in TRAP_CODES.items()}  # bit of every trap in a trap bitmask
+EVENT_RECORD = struct.Struct("<Bqqq")  # the fields are as wide as the int64 columns they come from
+EXTRA_EVENT_FLAG = 0x80  # binary records with this flag carry a length prefixed json content instead of fields
+
+
+def encode_card(card_type, value) -> tuple:
+    card_type_code = CARD_TYPE_CODES[card_type]
+    if card_type_code == 2:
+        return card_type_code, TRAP_CODES[value]
+    if type(value) is not int:
+        raise TypeError("card value " + repr(value) + " is not an integer")
+    return card_type_code, value
+
+
+def decode_card(card_type_code: int, value: int) -> tuple:
+    return CARD_TYPES[card_type_code], TRAP_NAMES[value] if card_type_code == 2 else value
+
+
+# per event code: values in EVENT_FIELDS order -> three integer fields, raising if the event does not fit the layout
+EVENT_ENCODERS = (
+    lambda player_id, pocket, chest: (player_id, pocket, chest),
+    lambda player_id, pocket: (player_id, pocket, 0),
+    lambda player_id, pocket, amount: (player_id, pocket, amount),
+    lambda card_type, value: encode_card(card_type, value) + (0,),
+    lambda card_type, value: encode_card(card_type, value) + (0,),
+    lambda card_index, card_type, value: (card_index,) + encode_card(card_type, value),
+    lambda path_num: (path_num, 0, 0),
+    lambda player_id, decision: (player_id, decision, 0),
+)
+# per event code: three integer fields -> values in EVENT_FIELDS order
+EVENT_DECODERS = (
+    lambda first, second, third: (first, second, third),
+    lambda first, second, third: (first, second),
+    lambda first, second, third: (first, second, third),
+    lambda first, second, third: decode_card(first, second),
+    lambda first, second, third: decode_card(first, second),
+    lambda first, second, third: (first,) + decode_card(second, third),
+    lambda first, second, third: (first,),
+    lambda first, second, third: (first, second),
+)
+EVENT_KEYS = tuple(EVENT_FIELDS[event_type] for event_type in EVENT_TYPES)
+EVENT_NAMES = tuple(event_type.value for event_type in EVENT_TYPES)
+
+
+class EventSequence(Sequence):
+    # read-only sequence of {"event_type": ..., "content": {...}} dicts, decoded from the columns on access
+    history = None
+    start = 0
+
+    @property
+    def stop(self):
+        return len(self.history.event_codes)
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.history.event(position) for position in range(self.start, self.stop)[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("event index out of range")
+        return self.history.event(self.start + index)
+
+    def __iter__(self):
+        event = self.history.event
+        for position in range(self.start, self.stop):
+            yield event(position)
+
+    def __eq__(self, other):
+        if not isinstance(other, (Sequence, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(event == other_event for event, other_event in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.to_list())
+
+    def to_list(self) -> list:
+        return [self.history.event(position) for position in range(self.start, self.stop)]
+
+    def to_jsonl(self) -> bytes:
+        return "".join(self.history.event_json(position) + "\n" for position in range(self.start, self.stop)).encode()
+
+    def to_bytes(self) -> bytes:
+        return b"".join(self.history.event_bytes(position) for position in range(self.start, self.stop))
+
+
+class MatchHistoryView(EventSequence):
+    # a fixed range of a MatchHistory, shares its columns instead of copying events
+    def __init__(self, history, start: int, stop: int):
+        self.history = history
+        self.start = start
+        self.fixed_stop = stop
+
+    @property
+    def stop(self):
+        return self.fixed_stop
+
+
+class MatchHistory(EventSequence):
+    """
+        columnar event log: one event code and three integer fields per event, see EVENT_FIELDS
+        card types and trap names are stored as their index in CARD_TYPES and TRAP_NAMES
+        events that do not fit the layout keep their content dict in extra_content
+        every new event is also handed to the sink, if there is one (see history_sink.HistorySink)
+    """
+    def __init__(self, sink=None):
+        self.history = self
+        self.event_codes = array("B")
+        self.fields = (array("q"), array("q"), array("q"))
+        self.extra_content = {}
         self.update_pointer = 0
+        self.player_pointers = {}  # player id: update pointer of that player, see get_updates
+        self.sink = sink
+
+    def record(self, event_type: MatchEvent, *values):
+        # add_event without building the content dict, values follow EVENT_FIELDS[event_type]
+        code = EVENT_CODES[event_type]
+        first, second, third = self.fields
+        try:
+            fields = EVENT_ENCODERS[code](*values)
+            first.append(fields[0])
+            second.append(fields[1])
+            third.append(fields[2])
+        except (KeyError, TypeError, OverflowError):  # keep the event as is, e.g. player ids that are not integers
+            position = len(self.event_codes)
+            for column in self.fields:
+                del column[position:]
+                column.append(0)
+            self.extra_content[position] = dict(zip(EVENT_KEYS[code], values))
+        self.event_codes.append(code)
+        if self.sink is not None:
+            self.sink.write(self, len(self.event_codes) - 1)
 
     def add_event(self, event_type: MatchEvent, event_data: dict):  # couldn't find a best practices document for this
-        self.append({"event_type": event_type.value, "content": event_data})
-
-    def get_updates(self):
-        if self.update_pointer >= len(self):  # should never happen, events must happen between decision requests
-            return []
-
-        start_of_updates = self.update_pointer
-        self.update_pointer = len(self)
-        return self[start_of_updates:]
+        if tuple(event_data) == EVENT_FIELDS[event_type]:
+            self.record(event_type, *event_data.values())
+            return
+        self.extra_content[len(self.event_codes)] = dict(event_data)
+        self.event_codes.append(EVENT_CODES[event_type])
+        for column in self.fields:
+            column.append(0)
+        if self.sink is not None:
+            self.sink.write(self, len(self.event_codes) - 1)
+
+    def event_values(self, position: int) -> tuple:
+        return EVENT_DECODERS[self.event_codes[position]](
+            self.fields[0][position], self.fields[1][position], self.fields[2][position])
+
+    def event_content(self, position: int) -> dict:
+        if position in self.extra_content:
+            return dict(self.extra_content[position])
+        return dict(zip(EVENT_KEYS[self.event_codes[position]], self.event_values(position)))
+
+    def event(self, position: int) -> dict:
+        code = self.event_codes[position]
+        if position in self.extra_content:
+            return {"event_type": EVENT_NAMES[code], "content": dict(self.extra_content[position])}
+        values = EVENT_DECODERS[code](self.fields[0][position], self.fields[1][position], self.fields[2][position])
+        return {"event_type": EVENT_NAMES[code], "content": dict(zip(EVENT_KEYS[code], values))}
+
+    def event_json(self, position: int) -> str:
+        if position in self.extra_content:
+            return json.dumps(self.event(position))
+        code = self.event_codes[position]
+        content = ", ".join('"' + field + '": ' + (str(value) if type(value) is int else json.dumps(value))
+                            for field, value in zip(EVENT_KEYS[code], self.event_values(position)))
+        return '{"event_type": "' + EVENT_NAMES[code] + '", "content": {' + content + '}}'
+
+    def event_bytes(self, position: int) -> bytes:
+        if position in self.extra_content:
+            content = json.dumps(self.extra_content[position]).encode()
+            return struct.pack("<BI", self.event_codes[position] | EXTRA_EVENT_FLAG, len(content)) + content
+        return EVENT_RECORD.pack(self.event_codes[position], self.fields[0][position], self.fields[1][position],
+                                 self.fields[2][position])
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        history = cls()
+        offset = 0
+        while offset < len(data):
+            code = data[offset]
+            if code & EXTRA_EVENT_FLAG:
+                length, = struct.unpack_from("<I", data, offset + 1)
+                content = json.loads(data[offset + 5:offset + 5 + length])
+                history.add_event(EVENT_TYPES[code & ~EXTRA_EVENT_FLAG], content)
+                offset += 5 + length
+                continue
+            history.event_codes.append(code)
+            for column, value in zip(history.fields, EVENT_RECORD.unpack_from(data, offset)[1:]):
+                column.append(value)
+            offset += EVENT_RECORD.size
+        return history
+
+    @classmethod
+    def from_events(cls, events):  # e.g. json.loads of every line written by to_jsonl
+        history = cls()
+        for event in events:
+            history.add_event(MatchEvent(event["event_type"]), event["content"])
+        return history
+
+    def get_updates(self, player_id=None):
+        # a view of the events since the last call, nothing is copied
+        # with a player_id, the events since the last call for that player, players that are not asked every turn
+        # still get every event once they are asked again
+        if player_id is None:
+            start_of_updates = min(self.update_pointer, len(self))
+            self.update_pointer = len(self)
+        else:
+            start_of_updates = min(self.player_pointers.get(player_id, 0), len(self))
+            self.player_pointers[player_id] = len(self)
+        return MatchHistoryView(self, start_of_updates, len(self))
 
 
 class Card:
+    __slots__ = ("card_type", "value")
+
     def __init__(self, card_type, value):
         self.card_type = card_type
         self.value = value
@@ -95,79 +375,283 @@ class Card:
     def __str__(self):
         return str(self.card_type + " " + str(self.value))
 
+    @classmethod
+    def from_code(cls, code: int):
+        # a new card every time, the value of a card on the route changes as its loot is taken
+        return cls(*CARD_KINDS[code])
+
+
+class DeckCards(Sequence):
+    # list-like view of the cards left in a deck, backed by the deck's array of card codes
+    def __init__(self, deck):
+        self.deck = deck
+
+    def __len__(self):
+        return len(self.deck.codes) - self.deck.position
+
+    def buffer_index(self, index):  # position in deck.codes of the index-th card left
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("deck index out of range")
+        return self.deck.position + index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Card.from_code(code) for code in self.deck.codes[self.deck.position:][index]]
+        return Card.from_code(self.deck.codes[self.buffer_index(index)])
+
+    def __setitem__(self, index, card):
+        code = card_code(card)
+        if code is None:
+            raise ValueError(str(card) + " is not part of the base deck")
+        self.deck.codes[self.buffer_index(index)] = code
+
 
 class Deck:
-    def __init__(self, exclusions=None):  # generate a full deck and shuffle it
-        self.cards = generate_deck(exclusions)
+    def __init__(self, exclusions=None, rng=None):  # generate a full deck and shuffle it
+        self.rng = np.random.default_rng(rng)  # rng can be a seed or an existing numpy Generator
+        self.codes = generate_deck_codes(exclusions)
+        self.position = 0  # cards before position have already been picked
         self.shuffle_deck()
 
     def __str__(self):
         # iterate over all cards and make a list of names and values
         return str([(card_name.card_type + " " + str(card_name.value)) for card_name in self.cards])
 
-    def shuffle_deck(self):
-        np.random.shuffle(self.cards)
+    @property
+    def cards(self):
+        return DeckCards(self)
 
-    def pick_card(self):  # pick a card from the first element and remove it from the deck
-        picked_card = self.cards[0]
-        self.cards.pop(0)
+    def shuffle_deck(self):  # shuffles the cards that are left
+        self.rng.shuffle(self.codes[self.position:])
+
+    def pick_card(self):  # pick the next card and move past it
+        picked_card = Card.from_code(self.codes[self.position])
+        self.position += 1
         return picked_card
 
+    def reset(self, rng=None):  # puts the picked cards back and shuffles the whole deck for a new path
+        if rng is not None:
+            self.rng = np.random.default_rng(rng)
+        self.position = 0
+        self.shuffle_deck()
+
+
+class DeckManager:
+    """
+        the cards left in the game, carried from path to path instead of rebuilding the deck from the exclusions
+        counts is the multiset of card kinds left in DECK_TEMPLATE order, kept up to date for analytics
+        every path only removes what the board excluded during it, one card of a triggered trap and every relic
+        that was laid, from the deck's array and reshuffles it in place
+    """
+    def __init__(self, deck: Deck):
+        self.deck = deck
+        self.counts = np.bincount(deck.codes, minlength=len(CARD_KINDS)).astype(np.int64)
+        self.applied_exclusions = 0  # board.excluded_cards already taken out of the deck
+
+    def new_exclusions(self, board) -> list:
+        codes = [exclusion_code(card) for card in board.excluded_cards[self.applied_exclusions:]]
+        self.applied_exclusions = len(board.excluded_cards)
+        return codes
+
+    def next_path(self, board, rng=None) -> Deck:
+        removed_codes = []
+        for code in self.new_exclusions(board):
+            if code is not None and self.counts[code] > 0:
+                self.counts[code] -= 1
+                removed_codes.append(code)
+        self.deck.codes = remove_cards(self.deck.codes, removed_codes)
+        self.deck.reset(rng)
+        return self.deck
+
+
+class PlayerTable:
+    """
+        the players of one game stored column by column instead of one object each
+        chests and pockets are lists by player position, in_cave and continuing are bitmasks with bit i
+        set for the player at position i, so the sets of active and leaving players are single integers
+    """
+    __slots__ = ("player_ids", "chests", "pockets", "in_cave", "continuing")
+
+    def __init__(self, player_ids):
+        self.player_ids = list(player_ids)
+        self.chests = [0] * len(self.player_ids)
+        self.pockets = [0] * len(self.player_ids)  # how much a player has on hand mid exploration
+        self.in_cave = (1 << len(self.player_ids)) - 1  # whether a player is currently in the cave
+        self.continuing = self.in_cave  # the players decision to continue
+
 
 class Player:
-    def __init__(self, player_id: int):
-        self.player_id = player_id
-        self.chest = 0
-        self.pocket = 0  # how much a player has on hand mid exploration
-        self.in_cave = True  # whether a player is currently in the cave
-        self.continuing = True  # the players decision to continue
+    # one row of a PlayerTable, a player created on its own gets a table of its own
+    __slots__ = ("table", "index", "bit")
+
+    def __init__(self, player_id: int, table: PlayerTable = None, index: int = 0):
+        self.table = PlayerTable([player_id]) if table is None else table
+        self.index = index
+        self.bit = 1 << index
+
+    @property
+    def player_id(self):
+        return self.table.player_ids[self.index]
+
+    @property
+    def chest(self):
+        return self.table.chests[self.index]
+
+    @chest.setter
+    def chest(self, chest):
+        self.table.chests[self.index] = chest
+
+    @property
+    def pocket(self):
+        return self.table.pockets[self.index]
+
+    @pocket.setter
+    def pocket(self, pocket):
+        self.table.pockets[self.index] = pocket
+
+    @property
+    def in_cave(self):
+        return self.table.in_cave & self.bit != 0
+
+    @in_cave.setter
+    def in_cave(self, in_cave):
+        if in_cave:
+            self.table.in_cave |= self.bit
+        else:
+            self.table.in_cave &= ~self.bit
+
+    @property
+    def continuing(self):
+        return self.table.continuing & self.bit != 0
+
+    @continuing.setter
+    def continuing(self, continuing):
+        if continuing:
+            self.table.continuing |= self.bit
+        else:
+            self.table.continuing &= ~self.bit
 
     def leave_cave(self, match_history: MatchHistory):  # player leaves cave safely and stores their loot
-        match_history.add_event(MatchEvent.LEAVE_CAVE,
-                                {"player_id": self.player_id, "pocket": self.pocket, "chest": self.chest})
-        self.in_cave = False
-        self.continuing = False
-        self.chest += self.pocket
-        self.pocket = 0
+        table, index = self.table, self.index
+        match_history.record(MatchEvent.LEAVE_CAVE, table.player_ids[index], table.pockets[index], table.chests[index])
+        table.in_cave &= ~self.bit
+        table.continuing &= ~self.bit
+        table.chests[index] += table.pockets[index]
+        table.pockets[index] = 0
 
     def kill_player(self, match_history: MatchHistory):
         # player dies in the cave, loot is lost, and values reset to normal
-        match_history.add_event(MatchEvent.KILL_PLAYER, {"player_id": self.player_id, "pocket": self.pocket})
-        self.pocket = 0
-        self.in_cave = False
-        self.continuing = False
+        table, index = self.table, self.index
+        match_history.record(MatchEvent.KILL_PLAYER, table.player_ids[index], table.pockets[index])
+        table.pockets[index] = 0
+        table.in_cave &= ~self.bit
+        table.continuing &= ~self.bit
 
     def pickup_loot(self, amount, match_history: MatchHistory):  # player picks up some loot
-        match_history.add_event(MatchEvent.PICKUP_LOOT, {"player_id": self.player_id, "pocket": self.pocket,
-                                                         "amount": amount})
-        self.pocket += amount
+        table, index = self.table, self.index
+        match_history.record(MatchEvent.PICKUP_LOOT, table.player_ids[index], table.pockets[index], amount)
+        table.pockets[index] += amount
 
     def reset_player(self):  # reset a player for the next path
-        self.pocket = 0
-        self.in_cave = True
-        self.continuing = True
+        self.table.pockets[self.index] = 0
+        self.table.in_cave |= self.bit
+        self.table.continuing |= self.bit
+
+
+class Players(list):
+    """
+        the players of a game as rows of one shared PlayerTable, what run_game plays with
+        the players in a bitmask set are handed out as a tuple that is built once per set, so the engine
+        does not allocate a list of active or leaving players every turn
+    """
+    __slots__ = ("table", "subsets")
+
+    def __init__(self, player_ids):
+        self.table = PlayerTable(player_ids)
+        super().__init__(Player(player_id, self.table, index) for index, player_id in enumerate(player_ids))
+        self.subsets = {}  # bitmask: (players, their ids)
+
+    def subset(self, mask: int) -> tuple:
+        subset = self.subsets.get(mask)
+        if subset is None:
+            players = tuple(player for player in self if mask & player.bit)
+            subset = self.subsets[mask] = (players, tuple(player.player_id for player in players))
+        return subset
+
+
+def players_in_cave(players) -> Sequence:
+    # any list of players works, a Players list answers from its bitmask without building a new list
+    if isinstance(players, Players):
+        return players.subset(players.table.in_cave)[0]
+    return [player for player in players if player.in_cave]
+
+
+def player_ids_in_cave(players) -> Sequence:
+    if isinstance(players, Players):
+        return players.subset(players.table.in_cave)[1]
+    return [player.player_id for player in players if player.in_cave]
+
+
+def players_leaving(players) -> Sequence:
+    if isinstance(players, Players):
+        table = players.table
+        return players.subset(table.in_cave & ~table.continuing)[0]
+    return [player for player in players if player.in_cave and not player.continuing]
+
+
+def anybody_in_cave(players) -> bool:
+    if isinstance(players, Players):
+        return players.table.in_cave != 0
+    return any(player.in_cave for player in players)
+
+
+class Route(list):
+    # the cards of a path in order, remembering where treasures and relics are so they never need to be searched for
+    # traps is the bitmask of the traps on the route, bit TRAP_CODES[name] for every trap name
+    # the bitmasks are internal to the engines and the oracle, bots see the same traps in the board_add_card events
+    __slots__ = ("treasure_indices", "relic_indices", "traps")
+
+    def __init__(self):
+        super().__init__()
+        self.treasure_indices = []
+        self.relic_indices = []
+        self.traps = 0
+
+    def append(self, card):
+        if card.card_type == "Treasure":
+            self.treasure_indices.append(len(self))
+        elif card.card_type == "Relic":
+            self.relic_indices.append(len(self))
+        else:
+            self.traps |= TRAP_MASKS[card.value]
+        super().append(card)
+
+    def has_trap(self, trap_name) -> bool:
+        return self.traps & TRAP_MASKS[trap_name] != 0
 
 
 class Board:
+    __slots__ = ("route", "double_trap", "excluded_cards", "relics_picked", "removed_traps")
+
     def __init__(self):
-        self.route = []
+        self.route = Route()
         self.double_trap = False
         self.excluded_cards = []
         self.relics_picked = 0  # note: relics are counted when placed in the route
+        self.removed_traps = 0  # bitmask of the traps that lost a card to a double trap in any path so far
 
     def __str__(self):
         return str(self.route)
 
     # pick a card, if its another trap card, set double_trap to the trap card and kill the players at some point
     def add_card(self, card, match_history: MatchHistory):
-        if card.card_type == "Trap":  # Traps need to checked before being added for logic reasons
-            for board_card in self.route:
-                if card.value == board_card.value:
-                    self.double_trap = True
-                    match_history.add_event(MatchEvent.TRIGGER_TRAP, {"card_type": card.card_type,
-                                                                      "value": card.value})
-                    self.excluded_cards.append(card)
-                    break
+        if card.card_type == "Trap" and self.route.has_trap(card.value):  # checked before the card is added
+            self.double_trap = True
+            self.removed_traps |= TRAP_MASKS[card.value]
+            match_history.record(MatchEvent.TRIGGER_TRAP, card.card_type, card.value)
+            self.excluded_cards.append(card)
 
         self.route.append(card)
 
@@ -177,44 +661,145 @@ class Board:
             if self.relics_picked > 3:  # 4th and 5th relic have 10 value
                 self.route[-1].value = 10
 
-        match_history.add_event(MatchEvent.ADD_CARD, {"card_type": card.card_type, "value": card.value})
+        match_history.record(MatchEvent.ADD_CARD, card.card_type, card.value)
 
     def reset_path(self):  # intentionally left out triggered doubles so it carries between paths
-        self.route = []
+        self.route = Route()
         self.double_trap = False
 
 
 class GameEngine:
-    def __init__(self, offline_decision_maker: Callable = None):
+    def __init__(self, offline_decision_maker: Callable = None, engine_interface=None, seed=None, history_sink=None,
+                 instrumentation=None, decision_timeout: float = None, default_decision: int = 0,
+                 outcome_reporter=None, match_id=None):
 
-        self.match_history = MatchHistory()
-        self.offline = offline_decision_maker is not None
+        self.setup_engine(offline_decision_maker is not None or engine_interface is not None, seed, history_sink,
+                          instrumentation, decision_timeout, default_decision, outcome_reporter, match_id)
+
+        if engine_interface is not None:  # an already constructed offline interface, e.g. from the tournament runner
+            self.engine_interface = engine_interface
+            self.engine_interface.init_players()
+            return
 
         if offline_decision_maker is None:
-            from diamant_game_interface import EngineInterface
             self.event_loop = asyncio.get_event_loop()
-            self.engine_interface = EngineInterface(os.environ.get("GAMESERVER_HOST"),
-                                                    os.environ.get("GAMESERVER_PORT"))
-
-            self.engine_interface.init_game()
+            self.engine_interface = self.create_engine_interface()
             self.event_loop.run_until_complete(self.engine_interface.init_players())
             return
 
-        from diamant_game_interface import OfflineEngineInterface
-        self.engine_interface = OfflineEngineInterface(offline_decision_maker)
+        self.engine_interface = self.create_engine_interface(offline_decision_maker)
         self.engine_interface.init_players()
 
+    def setup_engine(self, offline: bool, seed, history_sink, instrumentation, decision_timeout: float,
+                     default_decision: int, outcome_reporter, match_id):
+        # the state of a new game, shared by GameEngine and AsyncGameEngine, which set up the engine interface
+        self.match_history = MatchHistory(history_sink)
+        # see outcome_reporter.OutcomeReporter, reports through it instead of the engine interface without waiting
+        self.outcome_reporter = outcome_reporter
+        self.match_id = match_id  # reported with the outcome, e.g. the match_id of a game_server assignment
+        self.rng = np.random.default_rng(seed)  # every game owns its generator, seed it to replay a game exactly
+        self.offline = offline
+        # seconds the players get per turn, late or failing players get the default decision (0 is leave)
+        self.decision_timeout = decision_timeout
+        self.default_decision = default_decision
+        self.decision_requests = 0  # decisions asked for, and decisions not asked for as the player was out
+        self.skipped_decision_requests = 0
+        self.deck_manager = None  # set up by run_game, its counts are the cards left in the game
+        self.instrumentation = None
+        if instrumentation is not None:  # see instrumentation.py, without it the phases are not wrapped at all
+            instrumentation.instrument(self)
+
+    @staticmethod
+    def create_engine_interface(offline_decision_maker: Callable = None):
+        if offline_decision_maker is None:
+            from diamant_game_interface import EngineInterface
+            engine_interface = EngineInterface(os.environ.get("GAMESERVER_HOST"), os.environ.get("GAMESERVER_PORT"))
+            engine_interface.init_game()
+            return engine_interface
+
+        from diamant_game_interface import OfflineEngineInterface
+        return OfflineEngineInterface(offline_decision_maker)
+
     @staticmethod
-    def setup_game():
-        initial_deck = Deck()
+    def setup_game(rng=None):
+        initial_deck = Deck(rng=rng)
         empty_board = Board()
         return initial_deck, empty_board
 
-    def get_decisions(self):
-        if self.offline:
-            return self.engine_interface.request_decisions(self.match_history.get_updates())
-        return self.event_loop.run_until_complete(
-            self.engine_interface.request_decisions(self.match_history.get_updates()))
+    def export_events(self, events: EventSequence):
+        # interfaces from this repo read history views directly, any other interface gets the list of dicts
+        if getattr(self.engine_interface, "accepts_history_views", False):
+            return events
+        return events.to_list()
+
+    def asks_player_subsets(self) -> bool:
+        # interfaces that only want the players in the cave, either one by one or as a subset of request_decisions
+        return getattr(self.engine_interface, "per_player_decisions", False) is True or \
+            getattr(self.engine_interface, "accepts_player_subsets", False) is True
+
+    def count_decision_requests(self, player_ids):
+        if player_ids is None or not self.asks_player_subsets():
+            self.decision_requests += len(self.engine_interface.players)
+        else:
+            self.decision_requests += len(player_ids)
+            self.skipped_decision_requests += len(self.engine_interface.players) - len(player_ids)
+
+    def player_updates(self, player_ids) -> dict:
+        # every asked player gets the events since its own last request, including the turns it was not asked
+        return {player_id: self.export_events(self.match_history.get_updates(player_id)) for player_id in player_ids}
+
+    def get_decisions(self, player_ids=None):
+        # player_ids are the players in the cave, by default everybody is asked
+        if self.offline:  # a synchronous offline interface cannot be interrupted, so it has no deadline
+            self.count_decision_requests(player_ids)
+            if player_ids is not None and getattr(self.engine_interface, "accepts_player_subsets", False) is True:
+                return self.engine_interface.request_decisions(self.player_updates(player_ids), player_ids)
+            return self.engine_interface.request_decisions(self.export_events(self.match_history.get_updates()))
+        return self.event_loop.run_until_complete(self.collect_decisions(player_ids))
+
+    async def collect_decisions(self, player_ids):
+        """
+            interfaces with per_player_decisions = True are asked for every player concurrently through
+            request_player_decision(player_id, updates), any other interface gets one request_decisions call,
+            with accepts_player_subsets = True as request_decisions({player_id: updates}, player_ids)
+            players asked one by one or in subsets get the updates since their own last request, see player_updates
+            the decision_timeout only bounds per player requests: late or failing players get the default decision.
+            One request for everybody is waited for, a deadline on it would hand every player the default for one
+            slow bot, but with a decision_timeout players missing from its reply get the default decision too
+        """
+        self.count_decision_requests(player_ids)
+        interface = self.engine_interface
+        subset = player_ids is not None and getattr(interface, "accepts_player_subsets", False) is True
+        player_ids = interface.players if player_ids is None else player_ids
+        deadline = self.decision_timeout
+
+        if getattr(interface, "per_player_decisions", False) is True:
+            requests = {player_id: asyncio.ensure_future(resolve(
+                interface.request_player_decision(player_id, updates)))
+                for player_id, updates in self.player_updates(player_ids).items()}
+            if not requests:
+                return {}
+            finished, late = await asyncio.wait(requests.values(), timeout=deadline)
+            for request in late:
+                request.cancel()
+            if deadline is None:  # nobody is late, and without a deadline failures are not covered up
+                return {player_id: request.result() for player_id, request in requests.items()}
+            decisions = {player_id: request.result() for player_id, request in requests.items()
+                         if request in finished and request.exception() is None}
+        else:
+            decisions = await resolve(
+                interface.request_decisions(self.player_updates(player_ids), player_ids) if subset
+                else interface.request_decisions(self.export_events(self.match_history.get_updates())))
+            if deadline is None:
+                return decisions
+            decisions = dict(decisions)
+
+        for player_id in player_ids:
+            if player_id not in decisions:
+                logging.warning("player " + str(player_id) + " missed the decision deadline")
+                self.match_history.record(MatchEvent.PLAYER_TIMEOUT, player_id, self.default_decision)
+                decisions[player_id] = {"decision": self.default_decision}
+        return decisions
 
     def handle_treasure_loot(self, board_card, card_index, players):
 
@@ -223,17 +808,16 @@ class GameEngine:
         no_players = len(players)
         obtained_loot = board_card.value // no_players  # do integer division of the loot
         board_card.value = board_card.value % no_players  # set new value to reflect taken loot
-        self.match_history.add_event(MatchEvent.CHANGE_CARD, {"card_index": card_index,
-                                                              "card_type": board_card.card_type,
-                                                              "value": board_card.value})
+        self.match_history.record(MatchEvent.CHANGE_CARD, card_index, board_card.card_type, board_card.value)
 
         for player in players:  # go through the provided player list and give them the divided loot
             player.pickup_loot(obtained_loot, self.match_history)
 
-    def advancement_phase(self, path_deck, path_player_list, path_board):
-        path_board.add_card(path_deck.pick_card(), self.match_history)
+    def advancement_phase(self, path_deck, path_player_list, path_board, next_card=None):
+        # next_card is a card already picked from path_deck, see AsyncGameEngine.run_path
+        path_board.add_card(path_deck.pick_card() if next_card is None else next_card, self.match_history)
 
-        active_players = [player for player in path_player_list if player.in_cave]
+        active_players = players_in_cave(path_player_list)
         no_active_players = len(active_players)
         if no_active_players == 0:
             return True  # return immediately to move to the next expedition
@@ -241,7 +825,7 @@ class GameEngine:
         last_route = path_board.route[-1]
 
         if last_route.card_type == "Treasure":
-            self.handle_treasure_loot(last_route, path_board.route.index(last_route), active_players)
+            self.handle_treasure_loot(last_route, len(path_board.route) - 1, active_players)
 
         if last_route.card_type == "Relic":  # this IF is here for sheer readability and does nothing
             pass
@@ -260,37 +844,37 @@ class GameEngine:
         # player_decisions = self.event_loop.run_until_complete(
         #     self.engine_interface.request_decisions(self.match_history.get_updates()))
 
-        player_decisions = self.get_decisions()
+        player_decisions = self.get_decisions(player_ids_in_cave(path_player_list))
+        self.apply_decisions(path_player_list, player_decisions)
 
-        for player in path_player_list:
+    @staticmethod
+    def apply_decisions(path_player_list, player_decisions):
+        for player in players_in_cave(path_player_list):  # players who left or died already stopped continuing
             player.continuing = player_decisions[player.player_id]["decision"]
 
     def handle_leaving_players(self, no_leaving_players, leaving_players, path_board):
         # function that handles card values and loot distribution upon leaving
         if no_leaving_players > 0:
-            for board_card in path_board.route:
-                if board_card.card_type == "Treasure":  # split loot evenly between players on treasure cards
-                    self.handle_treasure_loot(board_card, path_board.route.index(board_card), leaving_players)
-
-                # check if there is a relic to pick up (maybe pointless but it saves running the extra code 9/10 times)
-                if board_card.card_type == "Relic" and board_card.value != 0:
-                    if no_leaving_players == 1:
-                        for player in leaving_players:
-                            player.pickup_loot(board_card.value, self.match_history)
-                            board_card.value = 0
-                            self.match_history.add_event(MatchEvent.CHANGE_CARD,
-                                                         {"card_index": path_board.route.index(board_card),
-                                                          "card_type": board_card.card_type,
-                                                          "value": board_card.value})
-
-                if board_card.card_type == "Trap":  # dont care about traps
-                    pass
+            route = path_board.route
+            for card_index in route.treasure_indices:  # split loot evenly between players on treasure cards
+                self.handle_treasure_loot(route[card_index], card_index, leaving_players)
+
+            if no_leaving_players == 1:  # relics can only be picked up by a player leaving alone
+                for card_index in route.relic_indices:
+                    board_card = route[card_index]
+                    if board_card.value != 0:
+                        leaving_players[0].pickup_loot(board_card.value, self.match_history)
+                        board_card.value = 0
+                        self.match_history.record(MatchEvent.CHANGE_CARD, card_index, board_card.card_type,
+                                                  board_card.value)
 
     def decision_phase(self, path_player_list, path_board):
         self.make_decisions(path_player_list)
+        self.resolve_decisions(path_player_list, path_board)
 
+    def resolve_decisions(self, path_player_list, path_board):
         # leaving players leaving and number of leaving players
-        leaving_players = [player for player in path_player_list if player.in_cave and not player.continuing]
+        leaving_players = players_leaving(path_player_list)
         no_leaving_players = len(leaving_players)
 
         # split the loot evenly between all leaving players, if one player is leaving, collect the relics
@@ -307,7 +891,7 @@ class GameEngine:
             return True
         # decision phase
         self.decision_phase(path_player_list, path_board)
-        return False
+        return not anybody_in_cave(path_player_list)  # nobody is left to draw the next card for
 
     def run_path(self, deck, player_list, board):
         # runs through a path until all players leave or the run dies
@@ -319,17 +903,26 @@ class GameEngine:
             player.reset_player()
 
     def run_game(self):  # run a full game of diamant
-        deck, board = self.setup_game()
-        player_list = [Player(player_id) for player_id in self.engine_interface.players]
+        path_rngs = derive_rngs(self.rng, 5)  # each path reshuffles from its own stream
+        deck, board = self.setup_game(path_rngs[0])
+        self.deck_manager = DeckManager(deck)
+        player_list = Players(self.engine_interface.players)
 
         for path_num in range(5):  # do 5 paths
-            self.match_history.add_event(MatchEvent.NEW_PATH, {"path_num": path_num})
+            self.match_history.record(MatchEvent.NEW_PATH, path_num)
             self.run_path(deck, player_list, board)
-            excluded_cards = board.excluded_cards
-            for relic_count in range(board.relics_picked):  # add an exclusion for every picked relic
-                excluded_cards.append(Card("Relic", 5))
-            deck = Deck(excluded_cards)
+            deck = self.next_path_deck(board, path_num, path_rngs)
+
+        return self.get_winners(player_list)
+
+    def next_path_deck(self, board, path_num, path_rngs):
+        # the deck of the last path without the trap and relics this path excluded, see DeckManager
+        if path_num + 1 < len(path_rngs):
+            return self.deck_manager.next_path(board, path_rngs[path_num + 1])
+        return None  # no paths left
 
+    @staticmethod
+    def get_winners(player_list):
         winner_list = []
         for player in player_list:
             # if there is a draw, players share the win
@@ -340,12 +933,131 @@ class GameEngine:
 
         return [player.player_id for player in winner_list]
 
+    def report_outcome(self, winners):
+        if self.outcome_reporter is not None:  # only queued, the reporter uploads it in the background
+            return self.outcome_reporter.report(winners, self.match_history, self.match_id,
+                                                list(self.engine_interface.players))
+        return self.engine_interface.report_outcome(winners, self.export_events(self.match_history))
+
+    def log_instrumentation(self):
+        if self.instrumentation is not None:
+            self.instrumentation.finish_match(self)
+            if self.instrumentation.log_summary:
+                logging.info("match instrumentation: " + json.dumps(self.instrumentation.summary()))
+
     def start(self):
         winners = self.run_game()
         logging.info(str(winners) + " winner winner chicken dinner!")
-        self.engine_interface.report_outcome(winners, self.match_history)
+        if self.match_history.sink is not None:  # the streamed record is complete before the outcome is reported
+            self.match_history.sink.flush()
+        self.report_outcome(winners)
+        self.log_instrumentation()
+
+
+async def resolve(result):
+    # the online engine interface is async and the offline one is not, accept both
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+class AsyncGameEngine(GameEngine):
+    """
+        GameEngine that runs inside an already running event loop instead of driving its own one every turn
+        players are set up by `await start()`, so many engines can share one loop with start_games
+    """
+    def __init__(self, offline_decision_maker: Callable = None, engine_interface=None, seed=None, history_sink=None,
+                 instrumentation=None, decision_timeout: float = None, default_decision: int = 0,
+                 outcome_reporter=None, match_id=None):
+        self.setup_engine(offline_decision_maker is not None or engine_interface is not None, seed, history_sink,
+                          instrumentation, decision_timeout, default_decision, outcome_reporter, match_id)
+        self.engine_interface = engine_interface or self.create_engine_interface(offline_decision_maker)
+
+    async def init_players(self):
+        await resolve(self.engine_interface.init_players())
+
+    async def get_decisions(self, player_ids=None):
+        return await self.collect_decisions(player_ids)
+
+    async def make_decisions(self, path_player_list):
+        player_ids = player_ids_in_cave(path_player_list)
+        self.apply_decisions(path_player_list, await self.get_decisions(player_ids))
+
+    async def decision_phase(self, path_player_list, path_board):
+        await self.make_decisions(path_player_list)
+        self.resolve_decisions(path_player_list, path_board)
+
+    async def run_path(self, deck, player_list, board):
+        next_card = deck.pick_card()
+        while not self.advancement_phase(deck, player_list, board, next_card):
+            # every turn draws a card, so the next one is prepared while the decision phase waits for the players
+            decision_phase = asyncio.ensure_future(self.decision_phase(player_list, board))
+            await asyncio.sleep(0)  # lets the decision phase send its request before the card is drawn
+            next_card = deck.pick_card()
+            await decision_phase
+            if not anybody_in_cave(player_list):  # the prepared card is never laid
+                break
+
+        board.reset_path()  # reset board for a new path
+        for player in player_list:  # reset all players so they are able to participate in the next path
+            player.reset_player()
+
+    async def run_game(self):
+        path_rngs = derive_rngs(self.rng, 5)  # each path reshuffles from its own stream
+        deck, board = self.setup_game(path_rngs[0])
+        self.deck_manager = DeckManager(deck)
+        player_list = Players(self.engine_interface.players)
+
+        for path_num in range(5):  # do 5 paths
+            self.match_history.record(MatchEvent.NEW_PATH, path_num)
+            await self.run_path(deck, player_list, board)
+            deck = self.next_path_deck(board, path_num, path_rngs)
+
+        return self.get_winners(player_list)
+
+    async def start(self):
+        await self.init_players()
+        winners = await self.run_game()
+        logging.info(str(winners) + " winner winner chicken dinner!")
+        if self.match_history.sink is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.match_history.sink.flush)
+        if self.outcome_reporter is not None:
+            self.report_outcome(winners)
+        else:  # reporting may block on the network, keep the loop free for other games meanwhile
+            await resolve(await asyncio.get_running_loop().run_in_executor(None, self.report_outcome, winners))
+        self.log_instrumentation()
+        return winners
+
+
+async def start_games(engines: list) -> list:
+    # play several AsyncGameEngines concurrently on the running loop and return their winners in order
+    return await asyncio.gather(*(engine.start() for engine in engines))
 
 
 if __name__ == '__main__':
-    game_engine = GameEngine()
-    game_engine.start()
+    from history_sink import file_sink
+    history_path = os.environ.get("MATCH_HISTORY_PATH")  # optional json lines copy of the match, written as it goes
+    match_sink = file_sink(history_path) if history_path else None
+
+    # optional per-turn deadline in seconds, for interfaces that are asked player by player, see collect_decisions
+    decision_timeout = os.environ.get("DECISION_TIMEOUT")
+    decision_timeout = float(decision_timeout) if decision_timeout else None
+    protocols = os.environ.get("GAMESERVER_PROTOCOLS")  # e.g. "binary,json" to negotiate wire_protocol.py
+    if protocols:
+        from wire_protocol import WireEngineInterface
+        wire_interface = WireEngineInterface(
+            (os.environ.get("GAMESERVER_HOST"), int(os.environ.get("GAMESERVER_PORT"))),
+            json.loads(os.environ.get("GAMESERVER_PLAYERS")), tuple(protocols.split(",")))
+
+        async def play_wire_match():
+            try:
+                await AsyncGameEngine(engine_interface=wire_interface, history_sink=match_sink,
+                                      decision_timeout=decision_timeout).start()
+            finally:
+                wire_interface.close()
+        asyncio.run(play_wire_match())
+    else:
+        game_engine = GameEngine(history_sink=match_sink, decision_timeout=decision_timeout)
+        game_engine.start()
+    if match_sink is not None:
+        match_sink.close()
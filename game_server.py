@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+from collections import deque
+import json
+import logging
+import os
+
+from game_engine import AsyncGameEngine
+from instrumentation import Instrumentation
+from outcome_reporter import OutcomeReporter
+from wire_protocol import WireEngineInterface
+
+
+class MatchServer:
+    """
+        long lived game server that plays many matches at once as tasks on a single event loop
+        a match assignment is a dict: {"match_id": ..., "host": ..., "port": ..., "seed": ..., "decision_timeout": ...}
+        host and port are the gameserver of that match, like GAMESERVER_HOST and GAMESERVER_PORT for game_engine.py
+        decision_timeout is optional, see GameEngine.collect_decisions
+        "protocols": ["binary", "json"] opts a match into wire_protocol.py, negotiated with the gameserver at
+        init_players and json lines if it does not pick one, the gameserver's player ids are then "players": [...]
+
+        at most max_concurrent_matches run at a time, and at most max_pending_matches wait for a slot
+        submit blocks while the queue is full, which stops reading assignments from the control connection
+        with an Instrumentation every match is instrumented into it, and {"command": "metrics"} returns its summary
+        with an OutcomeReporter the matches report through it, so a slot is free again as soon as its game ends
+    """
+    def __init__(self, max_concurrent_matches: int = 64, max_pending_matches: int = 256, engine_factory=None,
+                 result_history: int = 1000, instrumentation: Instrumentation = None,
+                 outcome_reporter: OutcomeReporter = None):
+        self.max_concurrent_matches = max_concurrent_matches
+        self.max_pending_matches = max_pending_matches
+        self.engine_factory = engine_factory or self.create_engine
+        self.recent_results = deque(maxlen=result_history)
+        self.instrumentation = instrumentation
+        self.outcome_reporter = outcome_reporter
+
+        self.active_matches = 0
+        self.completed_matches = 0
+        self.failed_matches = 0
+
+        self.pending = None  # created by start, so it belongs to the running loop
+        self.workers = []
+
+    def create_engine(self, assignment: dict) -> AsyncGameEngine:
+        if assignment.get("protocols"):
+            engine_interface = WireEngineInterface((assignment["host"], assignment["port"]), assignment["players"],
+                                                   tuple(assignment["protocols"]))
+        else:
+            from diamant_game_interface import EngineInterface
+            engine_interface = EngineInterface(assignment["host"], assignment["port"])
+            engine_interface.init_game()
+        return AsyncGameEngine(engine_interface=engine_interface, seed=assignment.get("seed"),
+                               decision_timeout=assignment.get("decision_timeout"),
+                               outcome_reporter=self.outcome_reporter, match_id=assignment.get("match_id"))
+
+    async def start(self):
+        self.pending = asyncio.Queue(maxsize=self.max_pending_matches)
+        self.workers = [asyncio.ensure_future(self.match_worker()) for _ in range(self.max_concurrent_matches)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        if self.outcome_reporter is not None:  # sends or spools the outcomes still queued
+            await asyncio.get_running_loop().run_in_executor(None, self.outcome_reporter.close)
+
+    async def submit(self, assignment: dict):
+        await self.pending.put(assignment)
+
+    async def join(self):  # wait until every submitted match has finished
+        await self.pending.join()
+
+    def stats(self) -> dict:
+        return {"active_matches": self.active_matches, "pending_matches": self.pending.qsize(),
+                "completed_matches": self.completed_matches, "failed_matches": self.failed_matches}
+
+    def metrics(self) -> dict:
+        if self.instrumentation is None:
+            return {"status": "error", "reason": "instrumentation is disabled"}
+        return self.instrumentation.summary()
+
+    async def match_worker(self):
+        while True:
+            assignment = await self.pending.get()
+            self.active_matches += 1
+            try:
+                await self.play_match(assignment)
+            finally:
+                self.active_matches -= 1
+                self.pending.task_done()
+
+    async def play_match(self, assignment: dict):
+        # every match gets its own engine, and with it its own MatchHistory and player connections
+        engine = None
+        try:
+            engine = self.engine_factory(assignment)
+            if self.instrumentation is not None:
+                self.instrumentation.instrument(engine)
+            winners = await engine.start()
+        except Exception:  # one broken match must not take the other matches down with it
+            self.failed_matches += 1
+            logging.exception("match " + str(assignment.get("match_id")) + " failed")
+            return
+        finally:
+            if engine is not None and isinstance(engine.engine_interface, WireEngineInterface):
+                engine.engine_interface.close()
+
+        self.completed_matches += 1
+        self.recent_results.append({"match_id": assignment.get("match_id"), "winners": winners})
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # one JSON object per line: a match assignment, {"command": "stats"} or {"command": "metrics"}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    reply = {"status": "error", "reason": "invalid json"}
+                else:
+                    if not isinstance(request, dict):  # valid json, but not a request, e.g. [1]
+                        reply = {"status": "error", "reason": "expected a json object"}
+                    elif request.get("command") == "stats":
+                        reply = self.stats()
+                    elif request.get("command") == "metrics":
+                        reply = self.metrics()
+                    else:
+                        await self.submit(request)
+                        reply = {"match_id": request.get("match_id"), "status": "queued"}
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        await self.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logging.info("game server listening on " + str(host) + ":" + str(port))
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many matches concurrently in one game runner process")
+    parser.add_argument("--host", default=os.environ.get("GAMERUNNER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("GAMERUNNER_PORT", 9000)))
+    parser.add_argument("--max-concurrent-matches", type=int, default=64)
+    parser.add_argument("--max-pending-matches", type=int, default=256)
+    parser.add_argument("--metrics", action="store_true", help="time the match phases, see the metrics command")
+    parser.add_argument("--report-url", default=os.environ.get("RESULTS_URL"),
+                        help="post outcomes to this results service in the background instead of the gameserver")
+    parser.add_argument("--spool-dir", default=None, help="where outcomes wait while the results service is down")
+    args = parser.parse_args()
+
+    instrumentation = Instrumentation(log_summary=False) if args.metrics else None
+    outcome_reporter = OutcomeReporter(args.report_url, args.spool_dir) if args.report_url else None
+    server = MatchServer(args.max_concurrent_matches, args.max_pending_matches, instrumentation=instrumentation,
+                         outcome_reporter=outcome_reporter)
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,97 @@
+import logging
+import socket
+import threading
+
+
+class JsonLinesEncoder:
+    # one json object per line, the same dicts MatchHistory hands out
+    @staticmethod
+    def encode(history, position: int) -> bytes:
+        return (history.event_json(position) + "\n").encode()
+
+
+class BinaryEncoder:
+    # fixed-width MatchHistory records, read them back with MatchHistory.from_bytes
+    @staticmethod
+    def encode(history, position: int) -> bytes:
+        return history.event_bytes(position)
+
+
+class HistorySink:
+    """
+        streams MatchHistory events to a writable binary stream (file, pipe or socket file) as they happen
+        events are queued by MatchHistory and encoded and written in batches by a background thread,
+        at the latest every flush_interval seconds, so a crashed match still leaves everything up to then
+        the records carry no match id, so a sink is for one game at a time: games played one after the other
+        can share it, each game starts with its new_path 0 event, but the events of concurrent games would mix
+        a batch that fails to encode or write stays queued and is tried again, the failure is logged by the
+        background thread and raised by the next write and by close until a flush succeeds
+    """
+    def __init__(self, stream, encoder=None, batch_size: int = 256, flush_interval: float = 1.0,
+                 owns_stream: bool = False):
+        self.stream = stream
+        self.encoder = encoder or JsonLinesEncoder()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.owns_stream = owns_stream  # close the stream together with the sink
+
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.write_lock = threading.Lock()  # batches reach the stream whole and in order
+        self.batch_ready = threading.Event()
+        self.closed = False
+        self.error = None  # the last failed flush of the background thread
+        self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+
+    def write(self, history, position: int):
+        # called by MatchHistory for every new event, only queues it so the engine is not slowed down by encoding
+        if self.error is not None:
+            raise self.error
+        with self.pending_lock:
+            self.pending.append((history, position))
+            batch_full = len(self.pending) >= self.batch_size
+        if batch_full:
+            self.batch_ready.set()
+
+    def flush(self):
+        # the batch leaves pending only once it was written
+        with self.write_lock:
+            with self.pending_lock:
+                batch = self.pending[:]
+            if batch:
+                self.stream.write(b"".join(self.encoder.encode(history, position) for history, position in batch))
+            self.stream.flush()
+            with self.pending_lock:
+                del self.pending[:len(batch)]
+            self.error = None
+
+    def flush_loop(self):
+        while not self.closed:
+            self.batch_ready.wait(self.flush_interval)
+            self.batch_ready.clear()
+            try:
+                self.flush()
+            except Exception as error:  # the thread keeps going, the engine hears of it at its next write
+                logging.exception("writing the match history failed")
+                self.error = error
+
+    def close(self):
+        self.closed = True
+        self.batch_ready.set()
+        self.flusher.join()
+        try:
+            self.flush()  # raises if the events still cannot be written
+        finally:
+            if self.owns_stream:
+                self.stream.close()
+
+
+def file_sink(path: str, encoder=None, **kwargs) -> HistorySink:
+    # appends, so several runs can share one file
+    return HistorySink(open(path, "ab"), encoder, owns_stream=True, **kwargs)
+
+
+def socket_sink(address: tuple, encoder=None, **kwargs) -> HistorySink:
+    connection = socket.create_connection(address)
+    return HistorySink(connection.makefile("wb"), encoder, owns_stream=True, **kwargs)
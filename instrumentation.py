@@ -0,0 +1,131 @@
+from collections import Counter
+import functools
+import inspect
+import math
+import time
+
+from game_engine import EVENT_TYPES
+
+
+PHASES = ("advancement_phase", "decision_phase", "make_decisions", "get_decisions", "handle_leaving_players",
+          "report_outcome")
+
+
+class LatencyHistogram:
+    """
+        fixed log-spaced buckets from min_latency up, every bucket is `growth` times wider than the previous one
+        recording is a bucket increment, so percentiles are approximate to within one bucket
+    """
+    def __init__(self, min_latency: float = 1e-6, growth: float = 1.25, n_buckets: int = 100):
+        self.min_latency = min_latency
+        self.log_growth = math.log(growth)
+        self.buckets = [0] * n_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        index = int(math.log(seconds / self.min_latency) / self.log_growth) + 1 if seconds > self.min_latency else 0
+        self.buckets[min(index, len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        # upper bound of the bucket holding the percentile, never more than the slowest call
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets[:-1]):  # the last bucket is unbounded
+            seen += bucket_count
+            if seen >= rank and seen > 0:
+                return min(self.min_latency * math.exp(index * self.log_growth), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(50), "p99": self.percentile(99), "max": self.max}
+
+
+class Instrumentation:
+    """
+        per-phase latency histograms, per-player decision latency and event counts of one or many matches
+        instrument(engine) wraps the PHASES methods of that engine instance, an engine without instrumentation
+        keeps its plain methods and pays nothing. One Instrumentation can be shared by all matches of a MatchServer,
+        which pulls the summary instead of logging it after every match
+    """
+    def __init__(self, log_summary: bool = True):
+        self.log_summary = log_summary  # log the summary at the end of every instrumented GameEngine.start
+        self.phases = {}
+        self.players = {}
+        self.event_counts = Counter()
+        self.matches = 0
+        self.decision_requests = 0
+        self.skipped_decision_requests = 0  # not sent as the player had already left the cave or died
+
+    def histogram(self, histograms: dict, key) -> LatencyHistogram:
+        if key not in histograms:
+            histograms[key] = LatencyHistogram()
+        return histograms[key]
+
+    def instrument(self, engine):
+        engine.instrumentation = self
+        for phase in PHASES:
+            method = getattr(engine, phase)
+            if inspect.iscoroutinefunction(method):
+                setattr(engine, phase, self.time_async(phase, method))
+            else:
+                setattr(engine, phase, self.time_sync(phase, method))
+        return engine
+
+    def time_sync(self, phase: str, method):
+        histogram = self.histogram(self.phases, phase)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                histogram.record(elapsed)
+            if phase == "get_decisions":
+                self.record_decisions(elapsed, result)
+            return result
+        return timed
+
+    def time_async(self, phase: str, method):
+        histogram = self.histogram(self.phases, phase)
+
+        @functools.wraps(method)
+        async def timed(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                result = await method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                histogram.record(elapsed)
+            if phase == "get_decisions":
+                self.record_decisions(elapsed, result)
+            return result
+        return timed
+
+    def record_decisions(self, elapsed: float, decisions: dict):
+        # interfaces that time each player put a "latency" next to the decision, otherwise every player
+        # is charged the whole request
+        for player_id, decision in decisions.items():
+            latency = decision.get("latency", elapsed) if isinstance(decision, dict) else elapsed
+            self.histogram(self.players, player_id).record(latency)
+
+    def finish_match(self, engine):
+        self.matches += 1
+        self.event_counts.update(EVENT_TYPES[code].value for code in engine.match_history.event_codes)
+        self.decision_requests += engine.decision_requests
+        self.skipped_decision_requests += engine.skipped_decision_requests
+
+    def summary(self) -> dict:
+        return {"matches": self.matches,
+                "phases": {phase: histogram.summary() for phase, histogram in self.phases.items()},
+                "players": {str(player_id): histogram.summary() for player_id, histogram in self.players.items()},
+                "events": dict(self.event_counts), "decision_requests": self.decision_requests,
+                "skipped_decision_requests": self.skipped_decision_requests}
@@ -0,0 +1,180 @@
+"""
+    expected value of "continue" and "leave" for one player in the cave
+
+    leaving ends the path for the player with their pocket plus their share of the loot left on the route
+    continuing draws `horizon` more cards, the player takes their share of every treasure like the engine does,
+    and then leaves, a second trap of a kind already on the route kills them and their pocket is lost
+    the other players in the cave are assumed to stay, and n_leaving players leave together at the end,
+    relics are only collected by a player leaving alone
+"""
+from collections import namedtuple, OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from batch_engine import IS_TREASURE, KIND_VALUES, RELIC_KIND, TRAP_INDEX, TRAP_MASKS
+from game_engine import CARD_KINDS
+
+
+# canonical state key, every field is hashable
+# counts: remaining cards of every kind in DECK_TEMPLATE order, route_traps: bitmask of the trap kinds on the route
+# pocket: loot of the player, route_loot: treasure left on the route, route_relics: value of the relics on the route
+# n_players: players in the cave, relics_picked: relics drawn so far in the game, the 4th and 5th are worth 10
+OracleState = namedtuple("OracleState", ["counts", "route_traps", "pocket", "route_loot", "route_relics",
+                                         "n_players", "relics_picked"])
+
+Estimate = namedtuple("Estimate", ["continue_value", "leave_value", "exact"])
+
+TRAP_BITS = np.where(TRAP_INDEX >= 0, 1 << np.maximum(TRAP_INDEX, 0), 0)
+KINDS = tuple(range(len(CARD_KINDS)))
+TRAP_KINDS = (TRAP_INDEX[:, None] == np.arange(len(TRAP_MASKS))).astype(np.int64)  # card kind -> trap one-hot
+
+
+def state_from_game(deck, board, player, players) -> OracleState:
+    # the state of `player` in a running game, from the Deck, Board and Player objects of the GameEngine
+    counts = np.bincount(deck.codes[deck.position:], minlength=len(CARD_KINDS))
+    route = board.route
+    route_loot = sum(route[index].value for index in route.treasure_indices)
+    route_relics = sum(route[index].value for index in route.relic_indices)
+    return OracleState(tuple(int(count) for count in counts), route.traps, player.pocket, route_loot, route_relics,
+                       sum(1 for other in players if other.in_cave), board.relics_picked)
+
+
+def leave_value(pocket: int, route_loot: int, route_relics: int, n_leaving: int = 1) -> int:
+    return pocket + route_loot // n_leaving + (route_relics if n_leaving == 1 else 0)
+
+
+def outcome_key(state: OracleState, horizon: int) -> tuple:
+    # leaving alone is linear in pocket, route_loot and route_relics, so they are not part of the outcome
+    return state.counts, state.route_traps, state.n_players, state.relics_picked, min(horizon, sum(state.counts))
+
+
+def next_states(state: OracleState):
+    # (probability, next state, card gain) for every kind of card the next draw can be, None for a fatal trap
+    counts, route_traps, pocket, route_loot, route_relics, n_players, relics_picked = state
+    total = sum(counts)
+    for kind in KINDS:
+        count = counts[kind]
+        if count == 0:
+            continue
+        next_counts = counts[:kind] + (count - 1,) + counts[kind + 1:]
+        if IS_TREASURE[kind]:
+            card_value = int(KIND_VALUES[kind])
+            yield count / total, OracleState(next_counts, route_traps, pocket + card_value // n_players,
+                                             route_loot + card_value % n_players, route_relics, n_players,
+                                             relics_picked), card_value // n_players + card_value % n_players
+        elif kind == RELIC_KIND:
+            relic_value = 10 if relics_picked >= 3 else 5
+            yield count / total, OracleState(next_counts, route_traps, pocket, route_loot, route_relics + relic_value,
+                                             n_players, relics_picked + 1), relic_value
+        elif route_traps & int(TRAP_BITS[kind]):
+            yield count / total, None, 0  # the second trap of a kind, the player dies with nothing
+        else:
+            yield count / total, OracleState(next_counts, route_traps | int(TRAP_BITS[kind]), pocket, route_loot,
+                                             route_relics, n_players, relics_picked), 0
+
+
+@lru_cache(maxsize=1 << 18)
+def exact_outcome(counts: tuple, route_traps: int, n_players: int, relics_picked: int, horizon: int) -> tuple:
+    # (probability to survive the next `horizon` cards, expected loot they bring a surviving lone leaver)
+    # memoized on the outcome key, by recursion over every next card kind
+    if horizon == 0:
+        return 1.0, 0.0
+    survival, gain = 0.0, 0.0
+    for probability, next_state, card_gain in next_states(OracleState(counts, route_traps, 0, 0, 0, n_players,
+                                                                      relics_picked)):
+        if next_state is None:
+            continue
+        next_survival, next_gain = exact_outcome(*outcome_key(next_state, horizon - 1))
+        survival += probability * next_survival
+        gain += probability * (next_survival * card_gain + next_gain)
+    return survival, gain
+
+
+@lru_cache(maxsize=1 << 16)
+def exact_continue_value(state: OracleState, horizon: int, n_leaving: int) -> float:
+    # leaving together splits the route loot with a floor, which is not linear, so the whole state is the key
+    if horizon == 0 or sum(state.counts) == 0:
+        return leave_value(state.pocket, state.route_loot, state.route_relics, n_leaving)
+    return sum(probability * exact_continue_value(next_state, horizon - 1, n_leaving)
+               for probability, next_state, _ in next_states(state) if next_state is not None)
+
+
+def rollout_draws(counts: tuple, horizon: int, rollouts: int, rng) -> np.ndarray:
+    # how many cards of every kind the next `horizon` cards hold, for `rollouts` random orders of the remaining deck
+    # the outcome does not depend on the order of the drawn cards, so only their counts are sampled
+    return rng.multivariate_hypergeometric(np.array(counts, dtype=np.int64), horizon, size=rollouts, method="count")
+
+
+def rollout_outcome(state: OracleState, horizon: int, n_leaving: int, rollouts: int, rng) -> tuple:
+    # (survival probability, expected loot of a surviving lone leaver, expected value) over vectorized rollouts
+    horizon = min(horizon, sum(state.counts))
+    drawn = rollout_draws(state.counts, horizon, rollouts, rng)
+
+    # one product gives the pocket gain, the loot left on the route and the traps of every rollout
+    # in floats, which go through BLAS unlike int64, the counts and values are small enough to stay exact
+    values = np.where(IS_TREASURE, KIND_VALUES, 0)
+    totals = drawn.astype(np.float64) @ np.column_stack((values // state.n_players, values % state.n_players,
+                                                         TRAP_KINDS))
+    pocket_gain, loot_gain = totals[:, 0], totals[:, 1]
+    relics = drawn[:, RELIC_KIND]
+    relic_gain = 5 * relics + 5 * np.maximum(state.relics_picked + relics - max(state.relics_picked, 3), 0)
+
+    alive = (totals[:, 2:] + ((state.route_traps & TRAP_MASKS) > 0) <= 1).all(axis=1)
+
+    final = state.pocket + pocket_gain + (state.route_loot + loot_gain) // n_leaving
+    if n_leaving == 1:
+        final = final + state.route_relics + relic_gain
+    return (float(alive.mean()), float(np.where(alive, pocket_gain + loot_gain + relic_gain, 0).mean()),
+            float(np.where(alive, final, 0).mean()))
+
+
+class DiamantOracle:
+    """
+        answers expected value queries for continue and leave, see the module docstring for the model
+        queries whose draws can be enumerated in at most exact_limit sequences are exact,
+        larger ones are estimated by rollouts, and every answer is cached in an LRU of cache_size
+        for a lone leaver the cache key leaves out pocket and route loot, so one entry answers every such state
+        1000 rollouts keep uncached queries in the thousands per second, with a spread of about half a point
+    """
+    def __init__(self, rollouts: int = 1000, exact_limit: int = 5000, cache_size: int = 65536, seed=None):
+        self.rollouts = rollouts
+        self.exact_limit = exact_limit
+        self.cache_size = cache_size
+        self.rng = np.random.default_rng(seed)
+        self.cache = OrderedDict()
+
+    def is_exact(self, state: OracleState, horizon: int) -> bool:
+        kinds_left = sum(1 for count in state.counts if count)
+        return kinds_left ** min(horizon, sum(state.counts)) <= self.exact_limit
+
+    def cached(self, key, compute):
+        result = self.cache.get(key)
+        if result is None:
+            result = self.cache[key] = compute()
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return result
+
+    def evaluate(self, state: OracleState, horizon: int = 1, n_leaving: int = 1) -> Estimate:
+        exact = self.is_exact(state, horizon)
+        if n_leaving == 1:
+            key = outcome_key(state, horizon)
+            survival, gain = self.cached(key, lambda: exact_outcome(*key) if exact else
+                                         rollout_outcome(state, horizon, 1, self.rollouts, self.rng)[:2])
+            continue_value = survival * (state.pocket + state.route_loot + state.route_relics) + gain
+        else:
+            continue_value = self.cached((state, horizon, n_leaving), lambda: (
+                exact_continue_value(state, horizon, n_leaving) if exact else
+                rollout_outcome(state, horizon, n_leaving, self.rollouts, self.rng)[2]))
+        return Estimate(continue_value, leave_value(state.pocket, state.route_loot, state.route_relics, n_leaving),
+                        exact)
+
+    def evaluate_game(self, deck, board, player, players, horizon: int = 1, n_leaving: int = 1) -> Estimate:
+        return self.evaluate(state_from_game(deck, board, player, players), horizon, n_leaving)
+
+    def should_continue(self, state: OracleState, horizon: int = 1) -> bool:
+        estimate = self.evaluate(state, horizon)
+        return estimate.continue_value > estimate.leave_value
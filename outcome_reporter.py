@@ -0,0 +1,187 @@
+import gzip
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class OutcomeReporter:
+    """
+        reports match outcomes to a results service in the background, so a finished match never waits for the upload
+        report only queues the outcome, a background thread posts the queued outcomes as one json list per request
+        over a keep-alive requests.Session, at the latest every flush_interval seconds
+
+        bodies larger than compress_threshold bytes are gzipped, failed posts are retried max_retries times
+        with exponential backoff, and a batch that still fails is written to spool_dir and sent again before
+        any new batch once the service answers. Outcomes beyond max_pending are handed to the background thread
+        to be spooled instead of piling up in memory while the service is slow. Without a spool_dir a failed batch
+        is logged and dropped, and so are the oldest outcomes beyond max_pending
+        details are added to every outcome, e.g. {"runner": hostname}
+    """
+    def __init__(self, url: str, spool_dir: str = None, batch_size: int = 64, flush_interval: float = 1.0,
+                 max_pending: int = 1024, max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 30.0,
+                 timeout: float = 10.0, compress_threshold: int = 1024, details: dict = None, session=None):
+        self.url = url
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.compress_threshold = compress_threshold
+        self.details = details or {}
+        self.session = session or self.create_session()
+        if spool_dir is not None:
+            os.makedirs(spool_dir, exist_ok=True)
+
+        self.reported = 0  # outcomes the service accepted
+        self.spooled = 0  # outcomes written to the spool, including the ones sent from there later
+        self.failed_posts = 0
+        self.dropped = 0  # outcomes beyond max_pending without a spool_dir
+
+        self.pending = []
+        self.overflow = []  # outcomes beyond max_pending, spooled by the background thread
+        self.pending_lock = threading.Lock()
+        self.send_lock = threading.Lock()  # batches and spool files are sent by one thread at a time, in order
+        self.batch_ready = threading.Event()
+        self.spool_names = itertools.count()
+        self.closed = False
+        self.sender = threading.Thread(target=self.send_loop, daemon=True)
+        self.sender.start()
+
+    @staticmethod
+    def create_session() -> requests.Session:
+        # keep-alive connections are reused by every post, retries are done by the reporter with its own backoff
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+        return session
+
+    def report(self, winners: list, match_history, match_id=None, player_ids=None):
+        # called by GameEngine.report_outcome, the history is encoded later by the background thread
+        outcome = (winners, match_history, time.time(), match_id, player_ids)
+        dropped = None
+        with self.pending_lock:
+            self.pending.append(outcome)
+            wake_sender = len(self.pending) >= self.batch_size
+            if len(self.pending) > self.max_pending and self.spool_dir is None:  # nowhere to keep the oldest one
+                dropped = self.pending.pop(0)
+                self.dropped += 1
+            elif len(self.pending) > self.max_pending:  # spooling it would block the caller, e.g. the event loop
+                self.overflow += self.pending
+                self.pending = []
+                wake_sender = True
+        if dropped is not None:
+            logging.error("dropped the outcome of match " + str(dropped[3]) + ", more than "
+                          + str(self.max_pending) + " outcomes are waiting and there is no spool_dir")
+        if wake_sender:
+            self.batch_ready.set()
+
+    def outcome(self, winners: list, match_history, finished_at: float, match_id=None, player_ids=None) -> dict:
+        events = match_history.to_list() if hasattr(match_history, "to_list") else list(match_history)
+        return dict(self.details, match_id=match_id, player_ids=player_ids, winners=winners,
+                    finished_at=finished_at, match_history=events)
+
+    def encode(self, outcomes: list) -> bytes:
+        return json.dumps([self.outcome(*outcome) for outcome in outcomes]).encode()
+
+    def post(self, body: bytes, compressed: bool = False) -> bool:
+        # True once the service accepted the body, backs off between the attempts
+        if not compressed and len(body) > self.compress_threshold:
+            body, compressed = gzip.compress(body), True
+        headers = {"Content-Type": "application/json"}
+        if compressed:
+            headers["Content-Encoding"] = "gzip"
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self.spool_overflow()  # a slow service does not hold the overflow in memory until it answers
+                time.sleep(min(self.backoff * 2 ** (attempt - 1), self.max_backoff))
+            try:
+                response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+                if response.status_code < 300:
+                    return True
+                if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    logging.error("results service rejected " + str(len(body)) + " bytes: "
+                                  + str(response.status_code))
+                    return True  # sending it again would not change the answer
+                logging.warning("results service answered " + str(response.status_code))
+            except requests.RequestException as error:
+                logging.warning("posting outcomes failed: " + str(error))
+            self.failed_posts += 1
+        return False
+
+    def spool(self, body: bytes, count: int):
+        # one gzipped file per batch, named so they sort in the order they were written
+        if self.spool_dir is None:
+            logging.error("dropped " + str(count) + " outcomes, there is no spool_dir")
+            return
+        name = format(time.time_ns(), "020d") + "-" + format(next(self.spool_names), "06d") + "-" + str(count)
+        path = os.path.join(self.spool_dir, name + ".json.gz")
+        with open(path + ".tmp", "wb") as spool_file:
+            spool_file.write(gzip.compress(body))
+        os.replace(path + ".tmp", path)
+        self.spooled += count
+        logging.warning("spooled " + str(count) + " outcomes to " + path)
+
+    def spool_overflow(self):
+        with self.pending_lock:
+            overflow, self.overflow = self.overflow, []
+        if overflow:
+            self.spool(self.encode(overflow), len(overflow))
+
+    def spool_files(self) -> list:
+        if self.spool_dir is None:
+            return []
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".json.gz"))
+
+    def send_spool(self) -> bool:
+        # oldest first, stops at the first file the service does not take
+        for name in self.spool_files():
+            path = os.path.join(self.spool_dir, name)
+            with open(path, "rb") as spool_file:
+                body = spool_file.read()
+            if not self.post(body, compressed=True):
+                return False
+            os.remove(path)
+            self.reported += int(name[:-len(".json.gz")].rsplit("-", 1)[1])
+        return True
+
+    def flush(self):
+        with self.send_lock:
+            self.spool_overflow()
+            with self.pending_lock:
+                batch, self.pending = self.pending, []
+            service_up = self.send_spool()
+            for start in range(0, len(batch), self.batch_size):
+                outcomes = batch[start:start + self.batch_size]
+                body = self.encode(outcomes)
+                if service_up and self.post(body):
+                    self.reported += len(outcomes)
+                else:  # later batches are not tried against a service that is down, they keep their order
+                    service_up = False
+                    self.spool(body, len(outcomes))
+
+    def send_loop(self):
+        while not self.closed:
+            self.batch_ready.wait(self.flush_interval)
+            self.batch_ready.clear()
+            try:
+                self.flush()
+            except Exception:  # the reporter must outlive a broken batch, the next flush tries again
+                logging.exception("reporting outcomes failed")
+
+    def close(self):
+        # sends what is queued, or spools it if the service is down
+        self.closed = True
+        self.batch_ready.set()
+        self.sender.join()
+        self.flush()
+        self.session.close()
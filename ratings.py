@@ -0,0 +1,287 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+from game_engine import MatchHistory
+from replay import MatchReplay
+
+
+def winner_ranks(n_players: int, winners: list) -> list:
+    # run_game only tells the winners apart, they share rank 0 and everybody else shares rank 1
+    return [0 if player_id in winners else 1 for player_id in range(n_players)]
+
+
+def chest_ranks(chests: list) -> list:
+    # 0 for the richest, equal chests share a rank
+    return [sum(other > chest for other in chests) for chest in chests]
+
+
+def history_ranks(match_history, n_players: int) -> list:
+    # ranks from the final chests of a stored match, MatchHistory or its to_bytes() records
+    if isinstance(match_history, (bytes, bytearray)):
+        match_history = MatchHistory.from_bytes(match_history)
+    state = MatchReplay(match_history, list(range(n_players))).seek(len(match_history))
+    return chest_ranks([state.players[player_id].chest for player_id in range(n_players)])
+
+
+def pair_outcomes(ranks: np.ndarray, seats: np.ndarray) -> tuple:
+    # (score of seat i against seat j: 1 win, 0.5 tie, 0 loss, mask of the pairs that played), both (m, s, s)
+    score = (ranks[:, :, None] < ranks[:, None, :]) + 0.5 * (ranks[:, :, None] == ranks[:, None, :])
+    played = seats[:, :, None] & seats[:, None, :] & ~np.eye(seats.shape[1], dtype=bool)
+    return score, played
+
+
+class Elo:
+    """
+        multiplayer Elo: every match counts as a game against each opponent, a tie scores half
+        and the k_factor is spread over the opponents so bigger matches do not move ratings faster
+        values are [rating]
+    """
+    name = "elo"
+
+    def __init__(self, initial_rating: float = 1500.0, k_factor: float = 32.0, scale: float = 400.0):
+        self.initial_rating = initial_rating
+        self.k_factor = k_factor
+        self.scale = scale
+
+    def parameters(self) -> dict:
+        return {"initial_rating": self.initial_rating, "k_factor": self.k_factor, "scale": self.scale}
+
+    def initial(self) -> list:
+        return [self.initial_rating]
+
+    def update(self, values: np.ndarray, ranks: np.ndarray, seats: np.ndarray) -> np.ndarray:
+        # values (m, s, 1) of m matches with up to s seats, seats marks the seats that are taken
+        ratings = values[:, :, 0]
+        score, played = pair_outcomes(ranks, seats)
+        expected = 1 / (1 + 10 ** ((ratings[:, None, :] - ratings[:, :, None]) / self.scale))
+        opponents = np.maximum(played.sum(axis=2), 1)
+        change = self.k_factor * np.where(played, score - expected, 0).sum(axis=2) / opponents
+        return (ratings + change)[:, :, None]
+
+    @staticmethod
+    def score(values: np.ndarray) -> np.ndarray:
+        return values[:, 0]
+
+
+class TrueSkill:
+    """
+        TrueSkill-like Gaussian skill (mu, sigma), updated with the Bradley-Terry full pair approximation
+        of Weng and Lin, which handles any number of players and ties in closed form
+        values are [mu, sigma], the leaderboard uses the conservative mu - 3 sigma
+    """
+    name = "trueskill"
+
+    def __init__(self, mu: float = 25.0, sigma: float = 25 / 3, beta: float = 25 / 6, kappa: float = 1e-4):
+        self.mu = mu
+        self.sigma = sigma
+        self.beta = beta
+        self.kappa = kappa  # lower bound of the variance shrink factor, keeps sigma positive
+
+    def parameters(self) -> dict:
+        return {"mu": self.mu, "sigma": self.sigma, "beta": self.beta, "kappa": self.kappa}
+
+    def initial(self) -> list:
+        return [self.mu, self.sigma]
+
+    def update(self, values: np.ndarray, ranks: np.ndarray, seats: np.ndarray) -> np.ndarray:
+        mu, variance = values[:, :, 0], values[:, :, 1] ** 2
+        score, played = pair_outcomes(ranks, seats)
+        c = np.sqrt(variance[:, :, None] + variance[:, None, :] + 2 * self.beta ** 2)
+        p = 1 / (1 + np.exp((mu[:, None, :] - mu[:, :, None]) / c))  # chance seat i beats seat j
+        omega = np.where(played, variance[:, :, None] / c * (score - p), 0).sum(axis=2)
+        gamma = np.sqrt(variance)[:, :, None] / c
+        delta = np.where(played, gamma * variance[:, :, None] / c ** 2 * p * (1 - p), 0).sum(axis=2)
+        shrink = np.maximum(1 - delta, self.kappa)
+        return np.stack([mu + omega, np.sqrt(variance * shrink)], axis=2)
+
+    @staticmethod
+    def score(values: np.ndarray) -> np.ndarray:
+        return values[:, 0] - 3 * values[:, 1]
+
+
+MODELS = {model.name: model for model in (Elo, TrueSkill)}
+
+
+def match_waves(matches: list) -> list:
+    # wave of every match: one more than the last wave of any of its players, so a wave never holds a player
+    # twice and every player still sees their matches in order, which makes a wave safe to update at once
+    last_wave = {}
+    waves = []
+    for players, _ in matches:
+        wave = 1 + max((last_wave.get(player, -1) for player in players), default=-1)
+        for player in players:
+            last_wave[player] = wave
+        waves.append(wave)
+    return waves
+
+
+class RatingBook:
+    """
+        ratings of every player seen so far under one model, updated match by match or in bulk
+        a match is (players, ranks) where rank 0 is the best and equal ranks are ties, any number of players
+        bulk updates give the same ratings as recording the matches one by one, but update every wave of
+        matches without a common player with one vectorized model update
+        a match that lists a player twice, e.g. a bot playing itself, says nothing about its rating and is skipped
+    """
+    def __init__(self, model=None):
+        self.model = model or Elo()
+        self.index = {}  # player: row of values
+        self.values = np.zeros((0, len(self.model.initial())))
+        self.matches_played = np.zeros(0, dtype=np.int64)
+        self.matches = 0
+
+    def rows(self, players: list) -> list:
+        new_players = [player for player in dict.fromkeys(players) if player not in self.index]
+        if new_players:
+            for player in new_players:
+                self.index[player] = len(self.index)
+            self.values = np.concatenate([self.values, np.tile(self.model.initial(), (len(new_players), 1))])
+            self.matches_played = np.concatenate([self.matches_played, np.zeros(len(new_players), dtype=np.int64)])
+        return [self.index[player] for player in players]
+
+    def record(self, players: list, ranks: list):
+        self.record_many([(players, ranks)])
+
+    def record_result(self, result: dict):
+        # a result of tournament.run_match or bot_pool.evaluate
+        self.record(result["pairing"], winner_ranks(len(result["pairing"]), result["winners"]))
+
+    def record_results(self, results):
+        self.record_many([(result["pairing"], winner_ranks(len(result["pairing"]), result["winners"]))
+                          for result in results])
+
+    def record_histories(self, histories: list, pairings: list):
+        # bulk recompute from stored matches, chests tell the losers apart too
+        self.record_many([(pairing, history_ranks(history, len(pairing)))
+                          for history, pairing in zip(histories, pairings)])
+
+    def record_many(self, matches: list):
+        matches = [(list(players), list(ranks)) for players, ranks in matches]
+        for players, ranks in matches:
+            if len(ranks) != len(players):
+                raise ValueError("a match needs one rank per player")
+        self_play = [players for players, _ in matches if len(set(players)) != len(players)]
+        if self_play:
+            logging.warning("skipped " + str(len(self_play)) + " matches that list the same player twice, e.g. "
+                            + str(self_play[0]))
+            matches = [(players, ranks) for players, ranks in matches if len(set(players)) == len(players)]
+        if not matches:
+            return
+
+        waves = match_waves(matches)
+        n_seats = max(len(players) for players, _ in matches)
+        order = np.argsort(waves, kind="stable")
+        for wave_matches in np.split(order, np.flatnonzero(np.diff(np.asarray(waves)[order])) + 1):
+            rows = np.zeros((len(wave_matches), n_seats), dtype=np.int64)
+            ranks = np.zeros((len(wave_matches), n_seats), dtype=np.int64)
+            seats = np.zeros((len(wave_matches), n_seats), dtype=bool)
+            for match, match_index in enumerate(wave_matches):
+                players, match_ranks = matches[match_index]
+                rows[match, :len(players)] = self.rows(players)
+                ranks[match, :len(players)] = match_ranks
+                seats[match, :len(players)] = True
+
+            values = self.model.update(self.values[rows], ranks, seats)
+            self.values[rows[seats]] = values[seats]
+            self.matches_played[rows[seats]] += 1
+        self.matches += len(matches)
+
+    def rating(self, player) -> list:
+        return self.values[self.index[player]].tolist()
+
+    def leaderboard(self, top: int = None) -> list:
+        # [(player, score, values, matches played)], best first
+        players = list(self.index)
+        scores = self.model.score(self.values)
+        order = np.argsort(-scores, kind="stable")[:top]
+        return [(players[row], float(scores[row]), self.values[row].tolist(), int(self.matches_played[row]))
+                for row in order]
+
+    def to_dict(self) -> dict:
+        # players as a list, json object keys would turn integer player ids into strings
+        return {"model": self.model.name, "parameters": self.model.parameters(), "matches": self.matches,
+                "players": [{"player": player, "values": self.values[row].tolist(),
+                             "matches": int(self.matches_played[row])} for player, row in self.index.items()]}
+
+    @classmethod
+    def from_dict(cls, checkpoint: dict):
+        book = cls(MODELS[checkpoint["model"]](**checkpoint["parameters"]))
+        players = checkpoint["players"]
+        if isinstance(players, dict):  # checkpoints keyed by player name
+            players = [dict(entry, player=player) for player, entry in players.items()]
+        book.rows([entry["player"] for entry in players])
+        book.values[:] = [entry["values"] for entry in players]
+        book.matches_played[:] = [entry["matches"] for entry in players]
+        book.matches = checkpoint["matches"]
+        return book
+
+    def save(self, path: str):
+        # written next to the old checkpoint and moved over it, a crash never leaves half a checkpoint
+        with open(path + ".tmp", "w") as checkpoint_file:
+            json.dump(self.to_dict(), checkpoint_file)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path) as checkpoint_file:
+            return cls.from_dict(json.load(checkpoint_file))
+
+
+def read_results(lines) -> list:
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate bots from match results, e.g. the output of tournament.py")
+    parser.add_argument("results", nargs="*", help="JSON lines files of match results, defaults to stdin")
+    parser.add_argument("--model", choices=sorted(MODELS), default="elo")
+    parser.add_argument("--checkpoint", default=None, help="ratings to start from, updated after every batch")
+    parser.add_argument("--batch-size", type=int, default=1000, help="results per bulk update when following stdin")
+    parser.add_argument("--top", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        book = RatingBook.load(args.checkpoint)
+        if book.model.name != args.model:
+            parser.error("the checkpoint holds " + book.model.name + " ratings")
+    else:
+        book = RatingBook(MODELS[args.model]())
+
+    def update(results):
+        book.record_results(results)
+        if args.checkpoint:
+            book.save(args.checkpoint)
+
+    def print_leaderboard():
+        for position, (player, score, values, matches) in enumerate(book.leaderboard(args.top), 1):
+            print(position, player, format(score, ".2f"), matches, sep="\t")
+
+    if args.results:
+        for path in args.results:
+            with open(path) as results_file:
+                update(read_results(results_file))
+        print_leaderboard()
+    else:  # a running tournament piped in, the leaderboard follows every batch, separated by an empty line
+        batch, batches = [], 0
+        for line in sys.stdin:
+            if line.strip():
+                batch.append(json.loads(line))
+            if len(batch) >= args.batch_size:
+                update(batch)
+                print_leaderboard()
+                print(flush=True)
+                batch, batches = [], batches + 1
+        if batch or not batches:
+            update(batch)
+            print_leaderboard()
+    logging.info("rated " + str(book.matches) + " matches of " + str(len(book.index)) + " players")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,219 @@
+from collections import Counter
+import copy
+import multiprocessing
+
+from game_engine import (Board, Card, CARD_CODES, deck_counts, EVENT_FIELDS, EVENT_TYPES, MatchEvent, MatchHistory,
+                         Player, TEMPLATE_COUNTS, TRAP_MASKS)
+
+
+PLAYER_EVENTS = (MatchEvent.LEAVE_CAVE, MatchEvent.KILL_PLAYER, MatchEvent.PICKUP_LOOT)
+
+
+def event_values(match_history: MatchHistory, position: int) -> tuple:
+    # the values of an event in EVENT_FIELDS order, without building its dict unless it was stored as one
+    if position in match_history.extra_content:
+        content = match_history.extra_content[position]
+        return tuple(content.get(field) for field in EVENT_FIELDS[EVENT_TYPES[match_history.event_codes[position]]])
+    return match_history.event_values(position)
+
+
+def find_player_ids(match_history: MatchHistory) -> list:
+    player_ids = []
+    for position, code in enumerate(match_history.event_codes):
+        if EVENT_TYPES[code] in PLAYER_EVENTS:
+            player_id = event_values(match_history, position)[0]
+            if player_id not in player_ids:
+                player_ids.append(player_id)
+    return sorted(player_ids, key=str)
+
+
+class ReplayState:
+    # board and players after the first `position` events of a match
+    def __init__(self, player_ids):
+        self.position = 0
+        self.path_num = None
+        self.board = Board()
+        self.players = {player_id: Player(player_id) for player_id in player_ids}
+
+    def apply(self, event_type: MatchEvent, values: tuple):
+        if event_type == MatchEvent.NEW_PATH:
+            self.path_num = values[0]
+            self.board.reset_path()
+            for player in self.players.values():
+                player.reset_player()
+
+        elif event_type == MatchEvent.ADD_CARD:
+            card = Card(*values)
+            self.board.route.append(card)
+            if card.card_type == "Relic":
+                self.board.relics_picked += 1
+                self.board.excluded_cards.append(card)
+
+        elif event_type == MatchEvent.TRIGGER_TRAP:
+            self.board.double_trap = True
+            self.board.removed_traps |= TRAP_MASKS[values[1]]
+            self.board.excluded_cards.append(Card(*values))
+
+        elif event_type == MatchEvent.CHANGE_CARD:
+            self.board.route[values[0]].value = values[2]
+
+        elif event_type == MatchEvent.PICKUP_LOOT:
+            self.players[values[0]].pocket = values[1] + values[2]
+
+        elif event_type == MatchEvent.LEAVE_CAVE:
+            player = self.players[values[0]]
+            player.chest = values[2] + values[1]
+            player.pocket = 0
+            player.in_cave = False
+            player.continuing = False
+
+        elif event_type == MatchEvent.KILL_PLAYER:
+            player = self.players[values[0]]
+            player.pocket = 0
+            player.in_cave = False
+            player.continuing = False
+
+        self.position += 1
+
+
+class MatchReplay:
+    """
+        rebuilds Board and Player state at any event of a stored MatchHistory
+        a snapshot is kept every snapshot_interval events, so seek only replays the events since the last one
+    """
+    def __init__(self, match_history: MatchHistory, player_ids: list = None, snapshot_interval: int = 64):
+        self.match_history = match_history
+        self.player_ids = find_player_ids(match_history) if player_ids is None else list(player_ids)
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = [ReplayState(self.player_ids)]  # snapshots[i] is the state after i * snapshot_interval events
+
+    def replay(self, state: ReplayState, stop: int):
+        for position in range(state.position, stop):
+            event_type = EVENT_TYPES[self.match_history.event_codes[position]]
+            state.apply(event_type, event_values(self.match_history, position))
+
+    def seek(self, position: int) -> ReplayState:
+        # the state after the first `position` events, len(match_history) gives the final state
+        position = max(0, min(position, len(self.match_history)))
+        while len(self.snapshots) <= position // self.snapshot_interval:
+            snapshot = copy.deepcopy(self.snapshots[-1])
+            self.replay(snapshot, len(self.snapshots) * self.snapshot_interval)
+            self.snapshots.append(snapshot)
+
+        state = copy.deepcopy(self.snapshots[position // self.snapshot_interval])
+        self.replay(state, position)
+        return state
+
+    def event_positions(self, event_type: MatchEvent) -> list:
+        # e.g. the positions of every add_card event, to seek to the turns of a match
+        code = EVENT_TYPES.index(event_type)
+        return [position for position, event_code in enumerate(self.match_history.event_codes) if event_code == code]
+
+
+def verify_history(match_history: MatchHistory) -> list:
+    """
+        checks a stored match against the engine rules and returns a description of every violation
+        the pocket and chest snapshots of player events must match the replayed state, treasure splits must
+        hand every sharing player the same amount, relic and trap cards must follow the board rules,
+        and every path may only draw as many cards of a kind as are left in the game, the base deck without the
+        relics laid and the trap cards triggered on earlier paths like DeckManager
+    """
+    problems = []
+    state = ReplayState(find_player_ids(match_history))
+    board = state.board
+    drawn = Counter()
+    remaining = TEMPLATE_COUNTS  # cards of every kind left for the current path
+    split = None  # [position, taken loot, remainder, pickup amounts] of the last treasure split
+
+    def finish_split():
+        if split is not None:
+            position, taken, remainder, amounts = split
+            if len(set(amounts)) > 1 or sum(amounts) != taken or remainder >= max(len(amounts), 1):
+                problems.append(str(position) + ": treasure split " + str(taken) + " with remainder " + str(remainder)
+                                + " handed out as " + str(amounts))
+
+    for position in range(len(match_history)):
+        event_type = EVENT_TYPES[match_history.event_codes[position]]
+        values = event_values(match_history, position)
+
+        if event_type != MatchEvent.PICKUP_LOOT:
+            if split is not None and event_type == MatchEvent.CHANGE_CARD and values[1] == "Relic":
+                split[3].pop()  # a lone leaver picks up the relics right after their share of the treasures
+            finish_split()
+            split = None
+
+        if event_type in PLAYER_EVENTS and values[0] not in state.players:
+            problems.append(str(position) + ": unknown player " + str(values[0]))
+        elif event_type in PLAYER_EVENTS:
+            player = state.players[values[0]]
+            if values[1] != player.pocket or not player.in_cave:
+                problems.append(str(position) + ": player " + str(values[0]) + " is not in the cave with pocket "
+                                + str(values[1]))
+            if event_type == MatchEvent.LEAVE_CAVE and values[2] != player.chest:
+                problems.append(str(position) + ": player " + str(values[0]) + " leaves with chest " + str(values[2])
+                                + " instead of " + str(player.chest))
+            if event_type == MatchEvent.PICKUP_LOOT and split is not None:
+                split[3].append(values[2])
+
+        if event_type == MatchEvent.NEW_PATH:
+            drawn.clear()
+            remaining = deck_counts(board.excluded_cards)
+
+        elif event_type == MatchEvent.ADD_CARD:
+            card_type, value = values
+            repeated_trap = card_type == "Trap" and board.route.has_trap(value)
+            if repeated_trap != (position > 0 and match_history.event_codes[position - 1] ==
+                                 EVENT_TYPES.index(MatchEvent.TRIGGER_TRAP)):
+                problems.append(str(position) + ": trap " + str(value) + " does not match the trap trigger")
+            if card_type == "Relic":
+                expected_value = 10 if board.relics_picked >= 3 else 5
+                if value != expected_value:
+                    problems.append(str(position) + ": relic added with value " + str(value) + " instead of "
+                                    + str(expected_value))
+                value = 5
+            code = CARD_CODES.get((card_type, value))
+            if code is None:
+                problems.append(str(position) + ": " + str(card_type) + " " + str(value)
+                                + " is not a card of the deck")
+            else:
+                drawn[code] += 1
+                if drawn[code] > remaining[code]:
+                    problems.append(str(position) + ": too many " + str(card_type) + " " + str(value) + " cards")
+
+        elif event_type == MatchEvent.CHANGE_CARD:
+            card_index, card_type, value = values
+            if card_index >= len(board.route) or board.route[card_index].card_type != card_type:
+                problems.append(str(position) + ": no " + str(card_type) + " at route index " + str(card_index))
+            elif card_type == "Treasure":
+                split = [position, board.route[card_index].value - value, value, []]
+            elif card_type == "Relic":
+                previous_event = EVENT_TYPES[match_history.event_codes[position - 1]] if position > 0 else None
+                picked_up = previous_event == MatchEvent.PICKUP_LOOT and \
+                    event_values(match_history, position - 1)[2] == board.route[card_index].value
+                if value != 0 or not picked_up:
+                    problems.append(str(position) + ": relic at route index " + str(card_index)
+                                    + " changed without being picked up")
+
+        if event_type == MatchEvent.NEW_PATH and any(player.in_cave for player in state.players.values()) \
+                and position > 0:
+            problems.append(str(position) + ": a new path starts while players are still in the cave")
+
+        state.apply(event_type, values)
+
+    finish_split()
+    return problems
+
+
+def verify_stored_history(stored) -> list:
+    # stored histories are MatchHistory objects or their to_bytes() records
+    if isinstance(stored, (bytes, bytearray)):
+        stored = MatchHistory.from_bytes(stored)
+    return verify_history(stored)
+
+
+def verify_histories(histories: list, processes: int = 1, chunksize: int = 64) -> list:
+    # problems of every history, in order, checked by a pool of worker processes when processes > 1
+    if processes <= 1:
+        return [verify_stored_history(stored) for stored in histories]
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(verify_stored_history, histories, chunksize)
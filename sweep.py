@@ -0,0 +1,200 @@
+import argparse
+from collections import namedtuple
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+from statistics import NormalDist
+
+import numpy as np
+
+from batch_engine import BatchGameEngine
+
+
+# a house bot with one parameter, e.g. Strategy("pocket", 10) leaves once its pocket reaches 10
+Strategy = namedtuple("Strategy", ["kind", "parameter"])
+
+# kind: continue decisions of every game for the player in column `seat` of a BatchState
+STRATEGY_KINDS = {
+    "pocket": lambda state, seat, parameter: state.pockets[:, seat] < parameter,  # leave when pocket >= k
+    "traps": lambda state, seat, parameter: state.traps_seen.sum(axis=1) < parameter,  # leave after n traps
+}
+
+
+def strategy_name(strategy: Strategy) -> str:
+    return strategy.kind + ":" + str(strategy.parameter)
+
+
+def parse_strategy(name: str) -> Strategy:
+    kind, _, parameter = name.partition(":")
+    if kind not in STRATEGY_KINDS:
+        raise ValueError("unknown strategy kind: " + kind)
+    return Strategy(kind, int(parameter))
+
+
+def strategy_grid(**parameters) -> list:
+    # strategy_grid(pocket=range(5, 30, 5), traps=[1, 2]), in the order of the keyword arguments
+    return [Strategy(kind, parameter) for kind, kind_parameters in parameters.items() for parameter in kind_parameters]
+
+
+class StrategyTable:
+    # BatchGameEngine decision maker where every column is played by one strategy
+    def __init__(self, strategies: tuple):
+        self.strategies = strategies
+
+    def __call__(self, state):
+        decisions = np.empty(state.pockets.shape, dtype=bool)
+        for seat, (kind, parameter) in enumerate(self.strategies):
+            decisions[:, seat] = STRATEGY_KINDS[kind](state, seat, parameter)
+        return decisions
+
+
+def batch_seeds(seed: int, matchup_id: int, batch: int, games: int) -> list:
+    # independent streams for every game, batch `batch` of matchup `matchup_id` always plays the same games
+    return np.random.SeedSequence(seed, spawn_key=(matchup_id, batch)).spawn(games)
+
+
+def play_batch(job: tuple) -> tuple:
+    # (matchup_id, wins of every seat, games), a shared win counts as a fraction for every winner
+    matchup_id, strategies, seeds = job
+    wins = np.zeros(len(strategies))
+    for winners in BatchGameEngine(StrategyTable(strategies), n_players=len(strategies)).run_games(seeds):
+        wins[winners] += 1 / len(winners)
+    return matchup_id, wins, len(seeds)
+
+
+def wilson_interval(wins: float, games: int, z: float) -> tuple:
+    # score interval of a win rate, sane for rates near 0 or 1 and for small samples unlike the normal one
+    if games == 0:
+        return 0.0, 1.0
+    rate = wins / games
+    denominator = 1 + z * z / games
+    centre = (rate + z * z / (2 * games)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / denominator
+    return max(centre - half_width, 0.0), min(centre + half_width, 1.0)
+
+
+class MatchupStats:
+    # running totals of one matchup, decided once the interval of the best seat is clear of every other seat
+    def __init__(self, matchup_id: int, strategies: tuple):
+        self.matchup_id = matchup_id
+        self.strategies = strategies
+        self.wins = np.zeros(len(strategies))
+        self.games = 0
+        self.batches_sent = 0
+
+    def add(self, wins: np.ndarray, games: int):
+        self.wins += wins
+        self.games += games
+
+    def intervals(self, z: float) -> list:
+        return [wilson_interval(wins, self.games, z) for wins in self.wins]
+
+    def decided(self, z: float) -> bool:
+        intervals = self.intervals(z)
+        leader = int(np.argmax(self.wins))
+        return all(intervals[leader][0] > upper for seat, (_, upper) in enumerate(intervals) if seat != leader)
+
+    def summary(self, z: float) -> dict:
+        return {"matchup_id": self.matchup_id, "strategies": [strategy_name(strategy) for strategy in self.strategies],
+                "games": self.games, "win_rates": (self.wins / max(self.games, 1)).tolist(),
+                "intervals": self.intervals(z), "decided": self.decided(z)}
+
+
+def run_sweep(matchups: list, processes: int = None, batch_size: int = 1000, min_games: int = 2000,
+              max_games: int = 100000, confidence: float = 0.99, seed: int = 0):
+    """
+        plays every matchup in batches of batch_size games on the batch engine, in a pool of worker processes,
+        and yields the summary of a matchup every time one of its batches finishes
+        a matchup gets no more batches once it played max_games, or min_games and its result is clear at
+        `confidence`, the summary then has "done": True. Checking after every batch makes the stopping rule
+        a little optimistic, pick the confidence with that in mind
+    """
+    processes = processes or os.cpu_count() or 1
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    stats = [MatchupStats(matchup_id, tuple(matchup)) for matchup_id, matchup in enumerate(matchups)]
+    finished_batches = queue.Queue()
+
+    def is_done(matchup: MatchupStats) -> bool:
+        return matchup.games >= max_games or (matchup.games >= min_games and matchup.decided(z))
+
+    with multiprocessing.Pool(processes) as pool:
+        in_flight = {}  # matchup_id: batches in flight
+
+        def submit(matchup: MatchupStats):
+            seeds = batch_seeds(seed, matchup.matchup_id, matchup.batches_sent, batch_size)
+            matchup.batches_sent += 1
+            in_flight[matchup.matchup_id] = in_flight.get(matchup.matchup_id, 0) + 1
+            pool.apply_async(play_batch, ((matchup.matchup_id, matchup.strategies, seeds),),
+                             callback=finished_batches.put, error_callback=finished_batches.put)
+
+        # a couple of batches per worker are queued, so workers never wait for the parent to decide
+        waiting = itertools.cycle(stats)
+        for _ in range(min(processes * 2, len(stats) * max(1, min_games // batch_size))):
+            submit(next(waiting))
+
+        while in_flight:
+            result = finished_batches.get()
+            if isinstance(result, BaseException):
+                raise result
+            matchup_id, wins, games = result
+            matchup = stats[matchup_id]
+            matchup.add(wins, games)
+            in_flight[matchup_id] -= 1
+            if in_flight[matchup_id] == 0:
+                del in_flight[matchup_id]
+
+            done = is_done(matchup)
+            yield dict(matchup.summary(z), done=done and matchup_id not in in_flight)
+
+            # keep the pool busy with the undecided matchups that have the fewest games so far
+            open_matchups = [other for other in stats
+                             if not is_done(other) and other.games + in_flight.get(other.matchup_id, 0) *
+                             batch_size < max_games]
+            while open_matchups and sum(in_flight.values()) < processes * 2:
+                submit(min(open_matchups, key=lambda other: other.games + in_flight.get(other.matchup_id, 0) *
+                           batch_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep threshold strategies against each other on the batch engine")
+    parser.add_argument("strategies", nargs="*", help="strategies as kind:parameter, kinds are "
+                        + ", ".join(STRATEGY_KINDS))
+    parser.add_argument("--pocket", type=int, nargs=3, metavar=("START", "STOP", "STEP"),
+                        help="add pocket:k for every k in range(START, STOP, STEP)")
+    parser.add_argument("--traps", type=int, nargs="+", default=[], help="add traps:n for these n")
+    parser.add_argument("--players-per-match", type=int, default=2)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--min-games", type=int, default=2000)
+    parser.add_argument("--max-games", type=int, default=100000)
+    parser.add_argument("--confidence", type=float, default=0.99)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    strategies = [parse_strategy(name) for name in args.strategies] + \
+        strategy_grid(pocket=range(*args.pocket) if args.pocket else [], traps=args.traps)
+    if len(strategies) < args.players_per_match:
+        parser.error("not enough strategies for one match")
+
+    matchups = list(itertools.combinations(strategies, args.players_per_match))
+    wins, games = {}, {}
+    for summary in run_sweep(matchups, args.processes, args.batch_size, args.min_games, args.max_games,
+                             args.confidence, args.seed):
+        print(json.dumps(summary), flush=True)
+        if summary["done"]:
+            for name, win_rate in zip(summary["strategies"], summary["win_rates"]):
+                wins[name] = wins.get(name, 0) + win_rate * summary["games"]
+                games[name] = games.get(name, 0) + summary["games"]
+
+    ranking = sorted(wins, key=lambda name: wins[name] / games[name], reverse=True)
+    logging.info("sweep win rates: " + ", ".join(name + " " + format(wins[name] / games[name], ".3f")
+                                                 for name in ranking))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
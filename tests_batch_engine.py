@@ -0,0 +1,113 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import batch_engine
+import game_engine
+from game_engine import MatchEvent
+
+
+THRESHOLDS = [1, 4, 8, 12, 20, 1000]
+
+
+class ThresholdEngineInterface:
+    # offline interface whose players keep exploring until their pocket reaches their threshold
+    def __init__(self, thresholds):
+        self.thresholds = thresholds
+        self.players = range(len(thresholds))
+        self.pockets = [0 for _ in self.players]
+
+    def init_players(self):
+        pass
+
+    def request_decisions(self, updates):
+        for event in updates:
+            content = event["content"]
+            if event["event_type"] == MatchEvent.PICKUP_LOOT.value:
+                self.pockets[content["player_id"]] = content["pocket"] + content["amount"]
+            elif event["event_type"] in (MatchEvent.LEAVE_CAVE.value, MatchEvent.KILL_PLAYER.value):
+                self.pockets[content["player_id"]] = 0
+        return {player_id: {"decision": int(self.pockets[player_id] < self.thresholds[player_id])}
+                for player_id in self.players}
+
+
+def threshold_decisions(state):
+    return state.pockets < np.array(THRESHOLDS)
+
+
+def final_chests(match_history, n_players):
+    chests = [0] * n_players
+    for event in match_history:
+        if event["event_type"] == MatchEvent.LEAVE_CAVE.value:
+            content = event["content"]
+            chests[content["player_id"]] = content["chest"] + content["pocket"]
+    return chests
+
+
+class BatchStateTestCase(unittest.TestCase):
+    def test_state_shapes(self):
+        state = batch_engine.BatchState(4, 3)
+
+        self.assertEqual(state.n_games, 4)
+        self.assertEqual(state.pockets.shape, (4, 3))
+        self.assertEqual(state.route.shape, (4, 35))
+        self.assertTrue(state.in_cave.all())
+
+    def test_deal_decks_exclusions(self):
+        state = batch_engine.BatchState(2, 3)
+        batch_engine.BatchGameEngine.deal_decks(state, [np.random.default_rng(0), np.random.default_rng(1)])
+        first_deck = state.decks[1].copy()
+
+        # game 1 laid two relics and ended on a second snake
+        snake = game_engine.CARD_CODES[("Trap", "Snake")]
+        state.path_relics[1] = 2
+        state.double_trap[1] = True
+        state.route[1, :4] = [batch_engine.RELIC_KIND, snake, batch_engine.RELIC_KIND, snake]
+        state.route_length[1] = 4
+        batch_engine.BatchGameEngine.remove_path_exclusions(state)
+        batch_engine.BatchGameEngine.deal_decks(state, [np.random.default_rng(0), np.random.default_rng(1)])
+
+        self.assertEqual(state.deck_length.tolist(), [35, 32])
+        self.assertEqual((state.decks[0] >= 0).sum(), 35)
+        self.assertEqual((state.decks[1] >= 0).sum(), 32)
+        self.assertEqual((state.decks[1] == batch_engine.RELIC_KIND).sum(), 3)
+        self.assertEqual(state.remaining[1, batch_engine.RELIC_KIND], 3)
+        self.assertEqual(state.remaining[1, snake], 2)
+        self.assertEqual(state.removed_traps.tolist(), [0, game_engine.TRAP_MASKS["Snake"]])
+        np.testing.assert_array_equal(np.bincount(state.decks[1, :32], minlength=len(game_engine.CARD_KINDS)),
+                                      state.remaining[1])
+        self.assertFalse(np.array_equal(state.decks[1, :32], first_deck[:32]))
+
+
+class BatchGameEngineTestCase(unittest.TestCase):
+    def test_run_games_return_type(self):
+        engine = batch_engine.BatchGameEngine(lambda state: np.ones((state.n_games, 6), dtype=bool))
+        winner_lists = engine.run_games(range(8))
+
+        self.assertEqual(len(winner_lists), 8)
+        for winner_list in winner_lists:
+            for winner in winner_list:
+                self.assertEqual(type(winner), int)
+
+    @mock.patch('diamant_game_interface.OfflineEngineInterface', ThresholdEngineInterface)
+    def test_matches_scalar_engine(self):
+        seeds = list(range(50))
+        engine = batch_engine.BatchGameEngine(threshold_decisions, n_players=len(THRESHOLDS))
+        batch_winners = engine.run_games(seeds)
+
+        for game, seed in enumerate(seeds):
+            scalar_engine = game_engine.GameEngine(offline_decision_maker=THRESHOLDS, seed=seed)
+            winners = scalar_engine.run_game()
+
+            self.assertEqual(winners, batch_winners[game])
+            self.assertEqual(final_chests(scalar_engine.match_history, len(THRESHOLDS)),
+                             engine.state.chests[game].tolist())
+            triggered_traps = [event["content"]["value"] for event in scalar_engine.match_history
+                               if event["event_type"] == MatchEvent.TRIGGER_TRAP.value]
+            self.assertEqual(sum(game_engine.TRAP_MASKS[trap] for trap in set(triggered_traps)),
+                             engine.state.removed_traps[game])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import os
+import tempfile
+import unittest
+
+import benchmarks
+
+
+class BenchmarksTestCase(unittest.TestCase):
+    def test_run_benchmarks(self):
+        names = ["generate_deck", "board_add_card", "match_history_get_updates"]
+        results = benchmarks.run_benchmarks(names, quick=True)
+
+        self.assertEqual(list(results), names)
+        self.assertTrue(all(result > 0 for result in results.values()))
+
+    def test_games(self):
+        self.assertGreater(benchmarks.bench_run_game(2), 0)
+        self.assertGreater(benchmarks.bench_handle_leaving_players(10), 0)
+        self.assertGreater(benchmarks.bench_oracle_rollouts(10), 0)
+
+    def test_decision_round_trip(self):
+        self.assertGreater(benchmarks.bench_decision_round_trip(1), 0)
+        self.assertGreater(benchmarks.bench_decision_round_trip(1, ("binary",)), 0)
+        self.assertGreater(benchmarks.bench_binary_codec(10), 0)
+
+    def test_compare_results(self):
+        baseline = {"run_game": 1e-3, "deck_init": 1e-5}
+        results = {"run_game": 1.2e-3, "deck_init": 2e-5, "generate_deck": 1.0}
+
+        self.assertEqual(benchmarks.compare_results(results, baseline), [("deck_init", 1e-5, 2e-5)])
+        self.assertEqual(benchmarks.compare_results(results, baseline, tolerance=1.5), [])
+
+    def test_results_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+            benchmarks.save_results(path, {"run_game": 1e-3})
+
+            self.assertEqual(benchmarks.load_results(path), {"run_game": 1e-3})
+            with open(path) as results_file:
+                self.assertIn("python", json.load(results_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
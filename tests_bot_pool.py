@@ -0,0 +1,91 @@
+import asyncio
+import os
+import unittest
+
+import bot_pool
+from game_engine import MatchHistory
+import tournament
+
+
+def cautious(updates):  # continues until a turn brings more than four events
+    return int(len(updates) <= 4)
+
+
+def crashing(_):
+    raise ValueError("bot bug")
+
+
+class Calls:
+    # answers how often its seat was asked
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, _):
+        self.calls += 1
+        return self.calls
+
+
+def dying(_):
+    os._exit(1)
+
+
+def run(coroutine):
+    # asyncio.run would leave no default loop behind for the synchronous GameEngine tests
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+BOTS = ["tests_bot_pool:cautious", "tests_tournament:always_continue", "tests_tournament:always_leave"]
+
+
+class BotPoolTestCase(unittest.TestCase):
+    def test_matches_tournament(self):
+        pairings = tournament.round_robin(BOTS, players_per_match=2, rounds=10)
+        with bot_pool.BotPool(BOTS) as pool:
+            results = run(bot_pool.evaluate(pool, pairings, seed=11, concurrency=32))
+
+        expected_results = [tournament.run_match((match_id, pairing, 11 + match_id))
+                            for match_id, pairing in enumerate(pairings)]
+        self.assertEqual(results, expected_results)
+        self.assertEqual(pool.futures, {})
+        self.assertLess(pool.batches_sent, pool.requests_sent / 4)  # concurrent games share their batches
+
+    def test_bot_state_per_seat(self):
+        async def ask(pool, seats):
+            updates = MatchHistory().to_bytes()
+            decisions = [await pool.request_decision("tests_bot_pool:Calls", updates, seat) for seat in seats]
+            pool.end_game(0, range(2))
+            return decisions + [await pool.request_decision("tests_bot_pool:Calls", updates, (0, 0))]
+
+        with bot_pool.BotPool(["tests_bot_pool:Calls"], workers_per_bot=2) as pool:
+            decisions = run(ask(pool, [(0, 0), (0, 0), (0, 1), (1, 0), (0, 0)]))
+        self.assertEqual(decisions, [1, 2, 1, 1, 3, 1])  # a new game starts over
+
+    def test_dead_worker(self):
+        pairing = ("tests_bot_pool:dying", "tests_tournament:always_continue")
+        with bot_pool.BotPool(pairing) as pool:
+            with self.assertLogs(level="ERROR"), self.assertRaises(RuntimeError):
+                run(asyncio.wait_for(bot_pool.evaluate(pool, [pairing]), 10))
+            self.assertEqual(pool.futures, {})
+
+            # the next requests for its bot fail right away
+            with self.assertRaises(RuntimeError):
+                run(asyncio.wait_for(bot_pool.evaluate(pool, [pairing]), 10))
+
+    def test_crashing_bot(self):
+        pairing = ("tests_bot_pool:crashing", "tests_tournament:always_continue")
+        with bot_pool.BotPool(pairing) as pool:
+            with self.assertRaises(RuntimeError):
+                run(bot_pool.evaluate(pool, [pairing]))
+
+            with self.assertLogs(level="WARNING") as logs:
+                results = run(bot_pool.evaluate(pool, [pairing], decision_timeout=5))
+        self.assertEqual(len(results), 1)
+        self.assertTrue(all("player 0" in line for line in logs.output if "WARNING" in line))
+
+
+if __name__ == '__main__':
+    unittest.main()
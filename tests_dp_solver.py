@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+
+import dp_solver
+from game_engine import Card, CARD_KINDS, deck_counts
+from oracle import OracleState
+from tests_oracle import counts_of, SNAKE_BIT
+
+
+def simulate_path(counts, n_players, threshold, rng) -> tuple:
+    # one path with the same rules, for comparison: (double trap, loot of every player, cards drawn)
+    deck = rng.permutation(np.repeat(np.arange(len(counts)), counts))
+    pocket, route_loot, route_relics, relics, traps = 0, 0, 0, 0, set()
+    for drawn, kind in enumerate(deck, 1):
+        card_type, value = CARD_KINDS[kind]
+        if card_type == "Trap":
+            if value in traps:
+                return True, 0, drawn
+            traps.add(value)
+        elif card_type == "Relic":
+            route_relics += 10 if relics >= 3 else 5
+            relics += 1
+        else:
+            pocket += value // n_players
+            route_loot += value % n_players
+        if pocket >= threshold:
+            return False, pocket + route_loot // n_players + (route_relics if n_players == 1 else 0), drawn
+    return False, pocket + route_loot // n_players + (route_relics if n_players == 1 else 0), len(deck)
+
+
+class PathSolverTestCase(unittest.TestCase):
+    def test_small_decks(self):
+        solver = dp_solver.PathSolver(n_players=1, threshold=100)
+        self.assertEqual(solver.outcome(OracleState(counts_of(("Trap", "Snake", 2)), SNAKE_BIT, 4, 0, 0, 1, 0)),
+                         (1.0, 0.0, 1.0))
+        # a treasure and a second snake in either order, the snake always ends the path
+        self.assertEqual(solver.outcome(OracleState(counts_of(("Treasure", 11, 1), ("Trap", "Snake", 1)),
+                                                    SNAKE_BIT, 0, 0, 0, 1, 0)), (1.0, 0.0, 1.5))
+        # the deck runs out and the player walks out with everything
+        self.assertEqual(solver.outcome(OracleState(counts_of(("Treasure", 11, 1), ("Relic", 5, 1)),
+                                                    0, 2, 0, 0, 1, 0)), (0.0, 18.0, 2.0))
+
+    def test_threshold(self):
+        # 11 between two players is 5 each and 1 on the route, they leave right away and split it with a floor,
+        # after a 7 first they are at 3 and draw the 11 too
+        solver = dp_solver.PathSolver(n_players=2, threshold=5)
+        state = OracleState(counts_of(("Treasure", 11, 1), ("Treasure", 7, 1)), 0, 0, 0, 0, 2, 0)
+        self.assertEqual(solver.outcome(state), (0.0, 0.5 * 5 + 0.5 * 9, 1.5))
+
+    def test_trap_relabelling(self):
+        # which trap kind is on the route does not matter, both states share a cache entry
+        solver = dp_solver.PathSolver(n_players=3, threshold=6)
+        snake_counts = deck_counts([Card("Trap", "Snake"), Card("Trap", "Snake")])
+        spider_counts = deck_counts([Card("Trap", "Spider"), Card("Trap", "Spider")])
+        snake_outcome = solver.outcome(OracleState(tuple(map(int, snake_counts)), SNAKE_BIT, 0, 0, 0, 3, 0))
+        hits = solver.cache_info().hits
+        self.assertEqual(solver.outcome(OracleState(tuple(map(int, spider_counts)), 1, 0, 0, 0, 3, 0)), snake_outcome)
+        self.assertEqual(solver.cache_info().hits, hits + 1)
+
+    def test_matches_simulation(self):
+        rng = np.random.default_rng(0)
+        counts = deck_counts([Card("Trap", "Lava"), Card("Relic", 5)])
+        for n_players, threshold in ((1, 12), (3, 6)):
+            outcome = dp_solver.PathSolver(n_players, threshold).path_outcome([Card("Trap", "Lava"),
+                                                                               Card("Relic", 5)])
+            paths = np.array([simulate_path(counts, n_players, threshold, rng) for _ in range(20000)])
+            self.assertAlmostEqual(outcome.double_trap, paths[:, 0].mean(), delta=0.015)
+            self.assertAlmostEqual(outcome.expected_loot, paths[:, 1].mean(), delta=0.3)
+            self.assertAlmostEqual(outcome.expected_cards, paths[:, 2].mean(), delta=0.1)
+
+    def test_solve_thresholds(self):
+        outcomes = dp_solver.solve_thresholds(4, [1, 3])
+        self.assertLess(outcomes[1].double_trap, outcomes[3].double_trap)
+        self.assertLess(outcomes[1].expected_cards, outcomes[3].expected_cards)
@@ -1,4 +1,5 @@
 import asyncio
+import json
 import unittest
 import random
 from unittest import mock
@@ -35,6 +36,29 @@ class TestEngineInterface:
     #     pass
 
 
+def card_kind(card) -> tuple:
+    # cards are separate objects with their own value, tests compare what they show
+    return card.card_type, card.value
+
+
+class CountingEngineInterface(TestEngineInterface):
+    # deterministic decisions: player i leaves once i + 1 cards are on the route of the current path
+    def __init__(self, *_):
+        super().__init__()
+        self.route_length = 0
+
+    async def request_decisions(self, updates):
+        for event in updates:
+            if event["event_type"] == MatchEvent.NEW_PATH.value:
+                self.route_length = 0
+            elif event["event_type"] == MatchEvent.ADD_CARD.value:
+                self.route_length += 1
+        return {player_id: {"decision": int(self.route_length <= player_id)} for player_id in self.players}
+
+    def report_outcome(self, winners, match_history):
+        self.winners = winners
+
+
 class CardTestCase(unittest.TestCase):
     def test_card_constructor(self):
         treasure_card = game_engine.Card("Treasure", 100)
@@ -54,6 +78,29 @@ class CardTestCase(unittest.TestCase):
         card = game_engine.Card("Treasure", 100)
         self.assertEqual("Treasure 100", card.__str__())
 
+    def test_card_codes(self):
+        for code, (card_type, value) in enumerate(game_engine.CARD_KINDS):
+            card = game_engine.Card.from_code(code)
+            self.assertEqual((card.card_type, card.value), (card_type, value))
+            self.assertEqual(game_engine.card_code(card), code)
+
+        self.assertIsNone(game_engine.card_code(game_engine.Card("Treasure", 100)))
+
+    def test_duplicate_cards(self):
+        deck = game_engine.generate_deck(None)
+        relics = [card for card in deck if card.card_type == "Relic"]
+        relics[0].value = 10
+        self.assertEqual([relic.value for relic in relics], [10, 5, 5, 5, 5])
+
+        deck = game_engine.Deck([])
+        deck.codes[:2] = game_engine.CARD_CODES[("Treasure", 5)]
+        first_card = deck.pick_card()
+        first_card.value = 1
+        second_card = deck.pick_card()
+        self.assertIsNot(second_card, first_card)
+        self.assertEqual(second_card.value, 5)
+        self.assertEqual(card_kind(deck.cards[-1]), card_kind(game_engine.Card.from_code(deck.codes[-1])))
+
 
 class DeckTestCase(unittest.TestCase):
     def test_deck_constructor_clean(self):
@@ -89,8 +136,78 @@ class DeckTestCase(unittest.TestCase):
         second_card = deck.cards[1]
         picked_card = deck.pick_card()
 
-        self.assertEqual(first_card, picked_card)
-        self.assertEqual(second_card, deck.cards[0])
+        self.assertEqual(card_kind(first_card), card_kind(picked_card))
+        self.assertEqual(card_kind(second_card), card_kind(deck.cards[0]))
+        self.assertEqual(len(deck.cards), 34)
+
+    def test_deck_counts_exclusion(self):
+        counts = game_engine.deck_counts([game_engine.Card("Trap", "Snake")] * 4 + [game_engine.Card("Relic", 0)])
+
+        self.assertEqual(counts[game_engine.CARD_CODES[("Trap", "Snake")]], 0)
+        self.assertEqual(counts[game_engine.CARD_CODES[("Relic", 5)]], 4)  # a picked up relic is still a relic
+        self.assertEqual(counts.sum(), 31)
+
+    def test_deck_counts_match_deck_manager(self):
+        board = game_engine.Board()
+        match_history = game_engine.MatchHistory()
+        for card_type, value in [("Relic", 5)] * 4 + [("Trap", "Lava"), ("Trap", "Lava")]:
+            board.add_card(game_engine.Card(card_type, value), match_history)
+        board.route[0].value = 0  # picked up
+        deck_manager = game_engine.DeckManager(game_engine.Deck(rng=0))
+        deck_manager.next_path(board, 0)
+
+        self.assertEqual(list(game_engine.deck_counts(board.excluded_cards)), list(deck_manager.counts))
+
+    def test_deck_manager(self):
+        deck = game_engine.Deck(rng=0)
+        deck_manager = game_engine.DeckManager(deck)
+        board = game_engine.Board()
+        match_history = game_engine.MatchHistory()
+        for card in [game_engine.Card("Relic", 5), game_engine.Card("Trap", "Snake"), game_engine.Card("Relic", 5),
+                     game_engine.Card("Relic", 5), game_engine.Card("Relic", 5), game_engine.Card("Trap", "Snake")]:
+            board.add_card(card, match_history)
+        board.route[0].value = 0  # picked up
+        deck.pick_card()
+
+        self.assertIs(deck_manager.next_path(board, 1), deck)
+        self.assertEqual(deck.position, 0)
+        self.assertEqual(len(deck.cards), 30)
+        self.assertEqual(deck_manager.counts[game_engine.RELIC_CODE], 1)
+        self.assertEqual(deck_manager.counts[game_engine.CARD_CODES[("Trap", "Snake")]], 2)
+        self.assertEqual(game_engine.np.bincount(deck.codes, minlength=18).tolist(), deck_manager.counts.tolist())
+
+        # a path without exclusions only reshuffles, earlier exclusions are not applied again
+        order = list(deck.codes)
+        board.reset_path()
+        deck_manager.next_path(board, 2)
+        self.assertEqual(len(deck.cards), 30)
+        self.assertNotEqual(list(deck.codes), order)
+        self.assertEqual(sorted(deck.codes), sorted(order))
+
+    def test_remove_cards(self):
+        codes = game_engine.np.array([3, 1, 4, 1, 5, 9], dtype=game_engine.np.int8)
+        self.assertEqual(game_engine.remove_cards(codes, [1, 9, 7, 1]).tolist(), [3, 5, 4])
+
+    def test_deck_set_card(self):
+        deck = game_engine.Deck()
+        deck.cards[0] = game_engine.Card("Trap", "Ram")
+
+        self.assertEqual(str(deck.pick_card()), "Trap Ram")
+        with self.assertRaises(ValueError):
+            deck.cards[0] = game_engine.Card("Treasure", 100)
+
+    def test_deck_seeded(self):
+        first_deck = game_engine.Deck(rng=42)
+        second_deck = game_engine.Deck(rng=game_engine.np.random.default_rng(42))
+
+        self.assertEqual(str(first_deck), str(second_deck))
+
+    def test_shuffled_decks(self):
+        decks = game_engine.shuffled_decks(4, [game_engine.Card("Relic", 5)], rng=0)
+
+        self.assertEqual(decks.shape, (4, 34))
+        for deck in decks:
+            self.assertEqual((deck == game_engine.CARD_CODES[("Relic", 5)]).sum(), 4)
 
 
 class PlayerTestCase(unittest.TestCase):
@@ -149,6 +266,95 @@ class PlayerTestCase(unittest.TestCase):
         self.assertEqual(str(match_history[1]),
                          "{'event_type': 'player_death', 'content': {'player_id': 123, 'pocket': 10}}")
 
+    def test_players_table(self):
+        players = game_engine.Players([4, 7, 9])
+        match_history = game_engine.MatchHistory()
+        players[1].pickup_loot(6, match_history)
+        players[2].continuing = False
+        players[0].kill_player(match_history)
+
+        self.assertEqual(players.table.pockets, [0, 6, 0])
+        self.assertEqual(players.table.in_cave, 0b110)
+        self.assertEqual(players.table.continuing, 0b010)
+        self.assertEqual([player.player_id for player in game_engine.players_leaving(players)], [9])
+        self.assertEqual(game_engine.player_ids_in_cave(players), (7, 9))
+        # the same set of players is handed out as the same tuple, nothing is built per turn
+        self.assertIs(game_engine.players_in_cave(players), game_engine.players_in_cave(players))
+
+        # plain lists of players give the same answers
+        self.assertEqual(game_engine.players_in_cave(list(players)), list(game_engine.players_in_cave(players)))
+        self.assertEqual(game_engine.players_leaving(list(players)), list(game_engine.players_leaving(players)))
+        players[1].in_cave = players[2].in_cave = False
+        self.assertFalse(game_engine.anybody_in_cave(players))
+        self.assertFalse(game_engine.anybody_in_cave(list(players)))
+
+    def test_slots(self):
+        for state in (game_engine.Card("Trap", "Ram"), game_engine.Player(0), game_engine.Board()):
+            self.assertFalse(hasattr(state, "__dict__"))
+
+
+class MatchHistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.match_history = game_engine.MatchHistory()
+        self.match_history.record(MatchEvent.NEW_PATH, 0)
+        self.match_history.record(MatchEvent.ADD_CARD, "Treasure", 7)
+        self.match_history.record(MatchEvent.PICKUP_LOOT, 3, 0, 1)
+        self.match_history.record(MatchEvent.TRIGGER_TRAP, "Trap", "Lava")
+        self.match_history.add_event(MatchEvent.LEAVE_CAVE, {"player_id": "bot-3", "pocket": 1, "chest": 0})
+
+    def test_record_matches_add_event(self):
+        match_history = game_engine.MatchHistory()
+        match_history.add_event(MatchEvent.CHANGE_CARD, {"card_index": 2, "card_type": "Trap", "value": "Ram"})
+
+        self.assertEqual(match_history[0], {"event_type": "board_change_card",
+                                            "content": {"card_index": 2, "card_type": "Trap", "value": "Ram"}})
+        self.assertEqual(match_history.extra_content, {})
+
+    def test_unencodable_event(self):
+        self.assertEqual(self.match_history[-1]["content"], {"player_id": "bot-3", "pocket": 1, "chest": 0})
+        self.assertEqual(list(self.match_history.extra_content), [4])
+
+    def test_player_updates(self):
+        self.assertEqual(len(self.match_history.get_updates(0)), 5)
+        self.match_history.record(MatchEvent.ADD_CARD, "Treasure", 5)
+        self.assertEqual(len(self.match_history.get_updates(1)), 6)  # player 1 was not asked before
+        self.assertEqual(self.match_history.get_updates(0), [self.match_history[5]])
+        self.assertEqual(self.match_history.get_updates(0), [])
+        self.assertEqual(len(self.match_history.get_updates()), 6)  # the shared pointer is separate
+
+    def test_get_updates_view(self):
+        first_updates = self.match_history.get_updates()
+        self.match_history.record(MatchEvent.KILL_PLAYER, 1, 4)
+        second_updates = self.match_history.get_updates()
+
+        self.assertIs(first_updates.history, self.match_history)
+        self.assertEqual(len(first_updates), 5)
+        self.assertEqual(second_updates, [{"event_type": "player_death", "content": {"player_id": 1, "pocket": 4}}])
+        self.assertEqual(self.match_history.get_updates(), [])
+
+    def test_to_jsonl(self):
+        events = [json.loads(line) for line in self.match_history.to_jsonl().splitlines()]
+
+        self.assertEqual(events, self.match_history.to_list())
+        self.assertEqual(game_engine.MatchHistory.from_events(events), self.match_history)
+
+    def test_to_bytes(self):
+        data = self.match_history.to_bytes()
+
+        view = game_engine.MatchHistoryView(self.match_history, 1, 3)
+
+        self.assertEqual(game_engine.MatchHistory.from_bytes(data), self.match_history)
+        self.assertEqual(game_engine.MatchHistory.from_bytes(view.to_bytes()), self.match_history[1:3])
+
+    def test_to_bytes_wide_fields(self):
+        # anything record accepts fits the binary records too, e.g. player ids beyond int32
+        match_history = game_engine.MatchHistory()
+        match_history.record(MatchEvent.LEAVE_CAVE, 2 ** 40, 0, -2 ** 35)
+        match_history.record(MatchEvent.PICKUP_LOOT, 2 ** 31, 2 ** 62, 1)
+
+        self.assertEqual(match_history.extra_content, {})
+        self.assertEqual(game_engine.MatchHistory.from_bytes(match_history.to_bytes()), match_history)
+
 
 def create_test_board():
     board = game_engine.Board()
@@ -193,6 +399,12 @@ class BoardTestCase(unittest.TestCase):
         self.assertEqual(str(match_history[2]),
                          "{'event_type': 'board_add_card', 'content': {'card_type': 'Trap', 'value': 'Snake'}}")
 
+    def test_board_route_indices(self):
+        board, _ = create_test_board()
+
+        self.assertEqual(board.route.treasure_indices, [0])
+        self.assertEqual(board.route.relic_indices, [1])
+
     def test_board_add_relics(self):
         board = game_engine.Board()
         match_history = game_engine.MatchHistory()
@@ -217,6 +429,22 @@ class BoardTestCase(unittest.TestCase):
         self.assertEqual(board.relics_picked, 1)
         self.assertEqual(board.excluded_cards[0].value, 5)
 
+    def test_board_trap_masks(self):
+        board, match_history = create_test_board()
+        snake, ram = game_engine.TRAP_MASKS["Snake"], game_engine.TRAP_MASKS["Ram"]
+        self.assertEqual(board.route.traps, snake | ram)
+        self.assertTrue(board.route.has_trap("Ram"))
+        self.assertFalse(board.route.has_trap("Lava"))
+        self.assertEqual(board.removed_traps, snake)
+
+        # the route starts over with every path, the removed traps are kept for the whole game
+        board.reset_path()
+        board.add_card(game_engine.Card("Trap", "Lava"), match_history)
+        board.add_card(game_engine.Card("Trap", "Snake"), match_history)
+        self.assertFalse(board.double_trap)
+        self.assertEqual(board.route.traps, snake | game_engine.TRAP_MASKS["Lava"])
+        self.assertEqual(board.removed_traps, snake)
+
 
 def get_or_create_event_loop():
     # try:
@@ -270,7 +498,7 @@ class AdvancementPhaseTestCase(unittest.TestCase):
         outcome = self.game_engine.advancement_phase(self.deck, self.players, self.board)
 
         self.assertTrue(outcome)
-        self.assertEqual(self.first_card, self.board.route[0])
+        self.assertEqual(card_kind(self.first_card), card_kind(self.board.route[0]))
 
     def test_advance_trap_trigger(self):
         self.deck.cards[0] = game_engine.Card("Trap", "Snake")
@@ -330,6 +558,18 @@ class HandleLeavingPlayersTestCase(unittest.TestCase):
         for player in self.players:
             self.assertEqual(player.pocket, 1)
 
+    def test_handle_leaving_players_duplicate_treasure(self):
+        treasure = game_engine.Card("Treasure", 5)
+        self.board.add_card(game_engine.Card("Trap", "Ram"), self.match_history)
+        self.board.add_card(treasure, self.match_history)
+        self.board.add_card(treasure, self.match_history)
+
+        self.game_engine.handle_leaving_players(2, self.players[:2], self.board)
+
+        card_indices = [event["content"]["card_index"] for event in self.game_engine.match_history
+                        if event["event_type"] == MatchEvent.CHANGE_CARD.value]
+        self.assertEqual(card_indices, [1, 2])
+
     def test_handle_leaving_players_relic(self):
         self.board.add_card(game_engine.Card("Relic", 5), self.game_engine.match_history)
 
@@ -523,6 +763,225 @@ class RunGameTestCase(unittest.IsolatedAsyncioTestCase):
                          "{'event_type': 'new_path', "
                          "'content': {'path_num': 0}}")
 
+    @mock.patch('diamant_game_interface.EngineInterface', TestEngineInterface)
+    def test_run_game_seeded(self):
+        histories = []
+        for _ in range(2):
+            random.seed(0)
+            seeded_engine = game_engine.GameEngine(seed=1234)
+            seeded_engine.run_game()
+            histories.append(str(seeded_engine.match_history))
+
+        self.assertEqual(histories[0], histories[1])
+
+    @mock.patch('diamant_game_interface.EngineInterface', CountingEngineInterface)
+    def test_run_game_exclusions(self):
+        # the relics laid and the traps triggered before the last path left the game exactly once
+        for seed in range(20):
+            engine = game_engine.GameEngine(seed=seed)
+            engine.run_game()
+            events = list(engine.match_history)
+            last_path = max(position for position, event in enumerate(events)
+                            if event["event_type"] == MatchEvent.NEW_PATH.value)
+            relics = sum(1 for event in events[:last_path] if event["event_type"] == MatchEvent.ADD_CARD.value
+                         and event["content"]["card_type"] == "Relic")
+            triggers = sum(1 for event in events[:last_path] if event["event_type"] == MatchEvent.TRIGGER_TRAP.value)
+
+            counts = engine.deck_manager.counts
+            self.assertEqual(counts[game_engine.RELIC_CODE], 5 - relics)
+            self.assertEqual(counts.sum(), 35 - relics - triggers)
+            self.assertEqual(len(engine.deck_manager.deck.codes), counts.sum())
+
+
+class AsyncMatchesSyncTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = get_or_create_event_loop()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    @mock.patch('diamant_game_interface.EngineInterface', CountingEngineInterface)
+    def test_matches_sync_engine(self):
+        sync_engine = game_engine.GameEngine(seed=99)
+        sync_winners = sync_engine.run_game()
+
+        async_engine = game_engine.AsyncGameEngine(engine_interface=CountingEngineInterface(), seed=99)
+        async_winners = self.loop.run_until_complete(async_engine.start())
+
+        self.assertEqual(sync_winners, async_winners)
+        self.assertEqual(async_engine.engine_interface.winners, async_winners)
+        self.assertEqual(str(sync_engine.match_history), str(async_engine.match_history))
+
+
+class DrawWatchingEngineInterface(CountingEngineInterface):
+    # keeps the deck position before and after every request is answered
+    def __init__(self, *_):
+        super().__init__()
+        self.engine = None
+        self.draws = []
+
+    async def request_decisions(self, updates):
+        before = self.engine.deck_manager.deck.position
+        await asyncio.sleep(0)
+        self.draws.append((before, self.engine.deck_manager.deck.position))
+        return await super().request_decisions(updates)
+
+
+class AsyncGameEngineTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_start_games_concurrently(self):
+        engines = [game_engine.AsyncGameEngine(engine_interface=CountingEngineInterface(), seed=seed)
+                   for seed in range(4)]
+
+        winner_lists = await game_engine.start_games(engines)
+
+        self.assertEqual(len(winner_lists), 4)
+        for engine, winner_list in zip(engines, winner_lists):
+            self.assertEqual(engine.engine_interface.winners, winner_list)
+
+    async def test_next_card_drawn_while_waiting(self):
+        engine_interface = DrawWatchingEngineInterface()
+        ge = game_engine.AsyncGameEngine(engine_interface=engine_interface, seed=3)
+        engine_interface.engine = ge
+
+        await ge.start()
+
+        self.assertTrue(engine_interface.draws)
+        self.assertTrue(all(after == before + 1 for before, after in engine_interface.draws))
+
+    @mock.patch('diamant_game_interface.OfflineEngineInterface')
+    async def test_offline_decisions(self, patched: mock.MagicMock):
+        cls_inst = mock.MagicMock()
+        cls_inst.request_decisions.return_value = 'yep'
+        patched.return_value = cls_inst
+
+        ge = game_engine.AsyncGameEngine(offline_decision_maker=OfflineModeEngineTest.decision_maker)
+
+        self.assertEqual(await ge.get_decisions(), 'yep')
+        cls_inst.init_players.assert_not_called()
+
+
+class PerPlayerEngineInterface(CountingEngineInterface):
+    # answers every player separately, player 2 hangs and player 3 crashes
+    per_player_decisions = True
+
+    def __init__(self, *_):
+        super().__init__()
+        self.asked = []
+
+    async def request_player_decision(self, player_id, updates):
+        self.asked.append(player_id)
+        if player_id == 2:
+            await asyncio.sleep(10)
+        if player_id == 3:
+            raise ConnectionError("bot crashed")
+        return {"decision": 1}
+
+
+class DecisionTimeoutTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_per_player_deadline(self):
+        ge = game_engine.AsyncGameEngine(engine_interface=PerPlayerEngineInterface(), decision_timeout=0.05)
+        ge.match_history.record(MatchEvent.NEW_PATH, 0)
+
+        with self.assertLogs(level="WARNING"):
+            decisions = await asyncio.wait_for(ge.get_decisions([0, 2, 3, 5]), 1)
+
+        self.assertEqual(decisions, {0: {"decision": 1}, 2: {"decision": 0}, 3: {"decision": 0}, 5: {"decision": 1}})
+        self.assertEqual(ge.engine_interface.asked, [0, 2, 3, 5])
+        self.assertEqual(ge.match_history[1:], [
+            {"event_type": "player_timeout", "content": {"player_id": 2, "decision": 0}},
+            {"event_type": "player_timeout", "content": {"player_id": 3, "decision": 0}}])
+
+    async def test_whole_request_is_waited_for(self):
+        # one reply for everybody is not cut off at the deadline, that would make every player leave for one bot
+        class SlowEngineInterface(CountingEngineInterface):
+            async def request_decisions(self, updates):
+                await asyncio.sleep(0.1)
+                return await super().request_decisions(updates)
+
+        ge = game_engine.AsyncGameEngine(engine_interface=SlowEngineInterface(), decision_timeout=0.01,
+                                         default_decision=0)
+        decisions = await asyncio.wait_for(ge.get_decisions(), 1)
+
+        self.assertEqual(decisions, {player_id: {"decision": 1} for player_id in range(6)})
+        self.assertEqual(len(ge.match_history), 0)
+
+    async def test_missing_players(self):
+        ge = game_engine.AsyncGameEngine(engine_interface=CountingEngineInterface(), decision_timeout=1)
+        with self.assertLogs(level="WARNING"):
+            decisions = await ge.get_decisions([0, 6])  # the interface does not know player 6
+
+        self.assertEqual(decisions[6], {"decision": 0})
+        self.assertEqual(ge.match_history.event_values(0), (6, 0))
+
+    async def test_game_with_timeouts(self):
+        ge = game_engine.AsyncGameEngine(engine_interface=PerPlayerEngineInterface(), seed=4, decision_timeout=0.01)
+        with self.assertLogs(level="WARNING"):
+            await ge.start()
+
+        timeouts = [event["content"]["player_id"] for event in ge.match_history
+                    if event["event_type"] == MatchEvent.PLAYER_TIMEOUT.value]
+        self.assertEqual(set(timeouts), {2, 3})
+        self.assertEqual(game_engine.MatchHistory.from_bytes(ge.match_history.to_bytes()), ge.match_history)
+
+
+class SubsetEngineInterface(CountingEngineInterface):
+    # remembers which players it was asked about every turn
+    accepts_player_subsets = True
+
+    def __init__(self, *_):
+        super().__init__()
+        self.asked = []
+
+    async def request_decisions(self, updates, player_ids=None):
+        # the shortest updates are the events since the last request of anybody
+        decisions = await super().request_decisions(min(updates.values(), key=len))
+        self.asked.append(list(player_ids))
+        return {player_id: decisions[player_id] for player_id in player_ids}
+
+
+class PlayerSubsetTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_only_players_in_cave(self):
+        ge = game_engine.AsyncGameEngine(engine_interface=SubsetEngineInterface(), seed=1)
+        await ge.start()
+
+        # player i leaves once the route is longer than i, so the turns of a path ask fewer and fewer players
+        asked = ge.engine_interface.asked
+        self.assertEqual(asked[0], list(range(6)))
+        self.assertIn([2, 3, 4, 5], asked)
+        self.assertEqual(ge.decision_requests, sum(len(player_ids) for player_ids in asked))
+        self.assertEqual(ge.decision_requests + ge.skipped_decision_requests, 6 * len(asked))
+        self.assertGreater(ge.skipped_decision_requests, 0)
+
+    async def test_path_ends_when_everybody_left(self):
+        ge = game_engine.AsyncGameEngine(engine_interface=CountingEngineInterface(), seed=1)
+        await ge.start()
+
+        # without a double trap the last event of a path is the last player leaving, no card is drawn after it
+        path_ends = [position - 1 for position, event in enumerate(ge.match_history)
+                     if event["event_type"] == MatchEvent.NEW_PATH.value][1:] + [len(ge.match_history) - 1]
+        for position in path_ends:
+            self.assertIn(ge.match_history[position]["event_type"],
+                          (MatchEvent.LEAVE_CAVE.value, MatchEvent.KILL_PLAYER.value))
+        self.assertEqual(ge.skipped_decision_requests, 0)  # the interface does not take subsets
+
+    def test_sync_engine(self):
+        class SyncSubsetEngineInterface:
+            accepts_player_subsets = True
+            players = range(3)
+
+            def init_players(self):
+                pass
+
+            def request_decisions(self, updates, player_ids=None):
+                return {player_id: {"decision": 0} for player_id in player_ids}
+
+        ge = game_engine.GameEngine(engine_interface=SyncSubsetEngineInterface(), seed=3)
+        ge.run_game()
+
+        # everybody leaves on the first card of every path
+        self.assertEqual((ge.decision_requests, ge.skipped_decision_requests), (15, 0))
+        self.assertEqual(sum(event["event_type"] == MatchEvent.ADD_CARD.value for event in ge.match_history), 5)
+
 
 class OfflineModeEngineTest(unittest.TestCase):
     @staticmethod
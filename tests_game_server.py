@@ -0,0 +1,121 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from benchmarks import FakeGameServer
+import game_engine
+import game_server
+import instrumentation
+import wire_protocol
+from tests_game_engine import CountingEngineInterface
+
+
+def create_test_engine(assignment):
+    if assignment.get("broken"):
+        raise ValueError("no gameserver for this match")
+    return game_engine.AsyncGameEngine(engine_interface=CountingEngineInterface(), seed=assignment["seed"])
+
+
+class MatchServerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = game_server.MatchServer(max_concurrent_matches=4, max_pending_matches=2,
+                                              engine_factory=create_test_engine)
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def test_play_matches(self):
+        await self.server.start()
+        for match_id in range(10):
+            await self.server.submit({"match_id": match_id, "seed": match_id})
+        await self.server.join()
+
+        self.assertEqual(self.server.completed_matches, 10)
+        self.assertEqual(sorted(result["match_id"] for result in self.server.recent_results), list(range(10)))
+
+    async def test_failed_match(self):
+        await self.server.start()
+        await self.server.submit({"match_id": 0, "broken": True})
+        await self.server.submit({"match_id": 1, "seed": 1})
+        await self.server.join()
+
+        self.assertEqual(self.server.failed_matches, 1)
+        self.assertEqual(self.server.completed_matches, 1)
+
+    async def test_backpressure(self):
+        self.server.max_concurrent_matches = 0  # nothing takes matches off the queue
+        await self.server.start()
+        await self.server.submit({"match_id": 0, "seed": 0})
+        await self.server.submit({"match_id": 1, "seed": 1})
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(self.server.submit({"match_id": 2, "seed": 2}), 0.05)
+
+    async def test_control_connection(self):
+        await self.server.start()
+        listener = await asyncio.start_server(self.server.handle_connection, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b'{"match_id": 7, "seed": 7}\n')
+        self.assertEqual(json.loads(await reader.readline()), {"match_id": 7, "status": "queued"})
+        await self.server.join()
+
+        writer.write(b'{"command": "stats"}\n')
+        self.assertEqual(json.loads(await reader.readline())["completed_matches"], 1)
+
+        # requests that are not json objects get an error, the connection stays open
+        for line in (b'[1]\n', b'"stats"\n', b'nope\n'):
+            writer.write(line)
+            self.assertEqual(json.loads(await reader.readline())["status"], "error")
+        writer.write(b'{"command": "stats"}\n')
+        self.assertEqual(json.loads(await reader.readline())["completed_matches"], 1)
+
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+
+    async def test_metrics(self):
+        self.assertEqual(self.server.metrics()["status"], "error")
+
+        self.server.instrumentation = instrumentation.Instrumentation(log_summary=False)
+        await self.server.start()
+        for match_id in range(3):
+            await self.server.submit({"match_id": match_id, "seed": match_id})
+        await self.server.join()
+
+        metrics = self.server.metrics()
+        self.assertEqual(metrics["matches"], 3)
+        self.assertEqual(metrics["phases"]["report_outcome"]["count"], 3)
+
+    async def test_outcome_reporter(self):
+        self.server.outcome_reporter = mock.Mock()
+        with mock.patch.dict("sys.modules", diamant_game_interface=mock.Mock()):  # the default factory passes it on
+            engine = self.server.create_engine({"match_id": 5, "host": "localhost", "port": 1})
+        self.assertIs(engine.outcome_reporter, self.server.outcome_reporter)
+        self.assertEqual(engine.match_id, 5)
+
+        await self.server.start()
+        await self.server.stop()
+        self.server.outcome_reporter.close.assert_called_once_with()
+
+    async def test_wire_protocol_match(self):
+        # a match that opts into the wire protocols plays against a gameserver that speaks them
+        gameserver = FakeGameServer(seed=2)
+        host, port = await gameserver.start()
+        self.server.engine_factory = self.server.create_engine
+        await self.server.start()
+        await self.server.submit({"match_id": 3, "host": host, "port": port, "players": list(range(6)),
+                                  "protocols": ["binary", "json"], "seed": 3, "decision_timeout": 1})
+        await self.server.join()
+        await asyncio.wait_for(gameserver.stop(), 1)  # the match closed its connection
+
+        self.assertEqual(self.server.completed_matches, 1)
+        engine = self.server.create_engine({"host": host, "port": port, "players": [0], "protocols": ["json"]})
+        self.assertIsInstance(engine.engine_interface, wire_protocol.WireEngineInterface)
+        self.assertEqual(engine.engine_interface.protocols, ("json",))
+
+
+if __name__ == '__main__':
+    unittest.main()
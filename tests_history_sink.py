@@ -0,0 +1,112 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import game_engine
+import history_sink
+from game_engine import MatchEvent
+from tests_game_engine import CountingEngineInterface
+
+
+class UnclosableBytesIO(io.BytesIO):
+    def close(self):  # keep the contents readable after the sink closes its stream
+        pass
+
+
+def create_test_history(sink):
+    match_history = game_engine.MatchHistory(sink)
+    match_history.record(MatchEvent.NEW_PATH, 0)
+    match_history.record(MatchEvent.ADD_CARD, "Trap", "Ram")
+    match_history.record(MatchEvent.PICKUP_LOOT, 2, 3, 4)
+    match_history.add_event(MatchEvent.KILL_PLAYER, {"player_id": "bot-2", "pocket": 7})
+    return match_history
+
+
+class HistorySinkTestCase(unittest.TestCase):
+    def test_json_lines(self):
+        stream = UnclosableBytesIO()
+        sink = history_sink.HistorySink(stream)
+        match_history = create_test_history(sink)
+        sink.close()
+
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(events, match_history.to_list())
+
+    def test_binary(self):
+        stream = UnclosableBytesIO()
+        sink = history_sink.HistorySink(stream, history_sink.BinaryEncoder())
+        match_history = create_test_history(sink)
+        sink.close()
+
+        self.assertEqual(game_engine.MatchHistory.from_bytes(stream.getvalue()), match_history)
+
+    def test_background_flush(self):
+        stream = UnclosableBytesIO()
+        sink = history_sink.HistorySink(stream, batch_size=2, flush_interval=60)
+        create_test_history(sink)
+
+        deadline = time.time() + 5
+        while stream.getvalue().count(b"\n") < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertGreaterEqual(stream.getvalue().count(b"\n"), 2)
+        sink.close()
+
+    def test_failed_write_is_kept(self):
+        class FlakyStream(UnclosableBytesIO):
+            failures = 1
+
+            def write(self, data):
+                if self.failures:
+                    self.failures -= 1
+                    raise OSError("disk full")
+                return super().write(data)
+
+        stream = FlakyStream()
+        sink = history_sink.HistorySink(stream, batch_size=2, flush_interval=60)
+        match_history = game_engine.MatchHistory(sink)
+        with self.assertLogs(level="ERROR"):
+            match_history.record(MatchEvent.NEW_PATH, 0)
+            match_history.record(MatchEvent.ADD_CARD, "Trap", "Ram")
+            deadline = time.time() + 5
+            while sink.error is None and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertIsInstance(sink.error, OSError)
+        self.assertTrue(sink.flusher.is_alive())
+        self.assertRaises(OSError, match_history.record, MatchEvent.NEW_PATH, 1)
+
+        sink.close()  # the stream works again, nothing it accepted was lost
+        self.assertIsNone(sink.error)
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(events, match_history.to_list()[:2])
+
+    def test_close_raises(self):
+        class BrokenEncoder:
+            @staticmethod
+            def encode(history, position):
+                raise ValueError("cannot encode")
+
+        sink = history_sink.HistorySink(UnclosableBytesIO(), BrokenEncoder(), flush_interval=60)
+        create_test_history(sink)
+        self.assertRaises(ValueError, sink.close)
+        self.assertEqual(len(sink.pending), 4)
+
+    def test_file_sink_game(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.jsonl")
+            sink = history_sink.file_sink(path)
+            engine = game_engine.AsyncGameEngine(engine_interface=CountingEngineInterface(), seed=5,
+                                                 history_sink=sink)
+            asyncio.run(engine.start())
+            sink.close()
+
+            with open(path) as history_file:
+                events = [json.loads(line) for line in history_file]
+        self.assertEqual(events, engine.match_history.to_list())
+
+
+if __name__ == '__main__':
+    unittest.main()
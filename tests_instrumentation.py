@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+
+import game_engine
+import instrumentation
+from tests_batch_engine import ThresholdEngineInterface, THRESHOLDS
+from tests_game_engine import CountingEngineInterface
+
+
+class TimedEngineInterface(CountingEngineInterface):
+    # reports its own per-player latency next to every decision
+    async def request_decisions(self, updates):
+        decisions = await super().request_decisions(updates)
+        for player_id, decision in decisions.items():
+            decision["latency"] = player_id / 1000
+        return decisions
+
+
+class LatencyHistogramTestCase(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = instrumentation.LatencyHistogram()
+        for _ in range(98):
+            histogram.record(0.001)
+        histogram.record(0.5)
+        histogram.record(2.0)
+
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertAlmostEqual(summary["p50"], 0.001, delta=0.00025)
+        self.assertAlmostEqual(summary["p99"], 0.5, delta=0.125)
+        self.assertEqual(summary["max"], 2.0)
+        self.assertAlmostEqual(summary["mean"], 0.02598)
+
+    def test_extremes(self):
+        histogram = instrumentation.LatencyHistogram()
+        self.assertEqual(histogram.summary()["p99"], 0.0)
+
+        histogram.record(0.0)
+        histogram.record(1e6)
+        self.assertEqual(histogram.percentile(50), histogram.min_latency)
+        self.assertEqual(histogram.percentile(100), 1e6)
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    def test_disabled(self):
+        engine = game_engine.GameEngine(engine_interface=ThresholdEngineInterface(THRESHOLDS))
+
+        self.assertIsNone(engine.instrumentation)
+        self.assertNotIn("advancement_phase", vars(engine))
+
+    def test_game_engine(self):
+        metrics = instrumentation.Instrumentation()
+        engine = game_engine.GameEngine(engine_interface=ThresholdEngineInterface(THRESHOLDS), seed=3,
+                                        instrumentation=metrics)
+        engine.engine_interface.report_outcome = lambda winners, match_history: None
+        with self.assertLogs(level="INFO") as logs:
+            engine.start()
+
+        summary = metrics.summary()
+        self.assertEqual(summary["matches"], 1)
+        self.assertEqual(set(summary["phases"]), set(instrumentation.PHASES))
+        self.assertEqual(summary["phases"]["report_outcome"]["count"], 1)
+        self.assertEqual(summary["phases"]["get_decisions"]["count"], summary["phases"]["make_decisions"]["count"])
+        self.assertEqual(set(summary["players"]), {str(player_id) for player_id in range(len(THRESHOLDS))})
+        self.assertEqual(summary["events"]["new_path"], 5)
+        self.assertEqual(sum(summary["events"].values()), len(engine.match_history))
+        self.assertTrue(any("match instrumentation" in line for line in logs.output))
+
+    def test_shared_between_async_engines(self):
+        metrics = instrumentation.Instrumentation(log_summary=False)
+        engines = [game_engine.AsyncGameEngine(engine_interface=TimedEngineInterface(), seed=seed,
+                                               instrumentation=metrics) for seed in range(3)]
+        asyncio.run(game_engine.start_games(engines))
+
+        summary = metrics.summary()
+        self.assertEqual(summary["matches"], 3)
+        self.assertEqual(summary["phases"]["report_outcome"]["count"], 3)
+        self.assertGreater(summary["phases"]["decision_phase"]["count"], 0)
+        self.assertEqual(summary["phases"]["decision_phase"]["count"], summary["phases"]["make_decisions"]["count"])
+        self.assertEqual(summary["players"]["0"]["max"], 0.0)
+        self.assertEqual(summary["players"]["5"]["max"], 0.005)
+        self.assertEqual(summary["decision_requests"], sum(engine.decision_requests for engine in engines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+
+import numpy as np
+
+import game_engine
+from game_engine import CARD_CODES, TEMPLATE_COUNTS
+import oracle
+from oracle import OracleState
+
+
+def counts_of(*cards):  # deck counts holding only the given (card_type, value, count)
+    counts = [0] * len(TEMPLATE_COUNTS)
+    for card_type, value, count in cards:
+        counts[CARD_CODES[(card_type, value)]] = count
+    return tuple(counts)
+
+
+SNAKE_BIT = 1 << oracle.TRAP_INDEX[CARD_CODES[("Trap", "Snake")]]
+
+# late in a path: a snake and a spider on the route, three players in the cave
+LATE_STATE = OracleState(tuple(int(count) for count in TEMPLATE_COUNTS[:-5]) + (2, 2, 3, 3, 3),
+                         SNAKE_BIT | 1, 10, 3, 5, 3, 2)
+
+
+class OracleTestCase(unittest.TestCase):
+    def test_leave_value(self):
+        self.assertEqual(oracle.leave_value(10, 3, 5), 18)
+        self.assertEqual(oracle.leave_value(10, 3, 5, n_leaving=2), 11)
+
+    def test_single_treasure(self):
+        # 11 split between two players leaves 1 on the route, the lone leaver gets 5 + 1
+        state = OracleState(counts_of(("Treasure", 11, 1)), 0, 4, 2, 0, 2, 0)
+        estimate = oracle.DiamantOracle().evaluate(state, horizon=1)
+        self.assertEqual(estimate, (12.0, 6, True))
+
+    def test_repeated_trap_kills(self):
+        state = OracleState(counts_of(("Trap", "Snake", 2)), SNAKE_BIT, 20, 4, 5, 1, 0)
+        estimate = oracle.DiamantOracle().evaluate(state, horizon=1)
+        self.assertEqual(estimate.continue_value, 0)
+        self.assertEqual(estimate.leave_value, 29)
+        self.assertFalse(oracle.DiamantOracle().should_continue(state))
+
+    def test_relic_values(self):
+        # relics picked before the draw decide the value, the 4th and 5th are worth 10
+        state = OracleState(counts_of(("Relic", 5, 2)), 0, 0, 0, 0, 1, 2)
+        self.assertEqual(oracle.DiamantOracle().evaluate(state, horizon=2).continue_value, 15)
+        self.assertEqual(oracle.DiamantOracle().evaluate(state, horizon=2, n_leaving=2).continue_value, 0)
+
+    def test_rollouts_agree_with_exact(self):
+        rng = np.random.default_rng(0)
+        for horizon in (1, 2, 3):
+            survival, gain = oracle.exact_outcome(*oracle.outcome_key(LATE_STATE, horizon))
+            exact_value = survival * (LATE_STATE.pocket + LATE_STATE.route_loot + LATE_STATE.route_relics) + gain
+            self.assertAlmostEqual(oracle.rollout_outcome(LATE_STATE, horizon, 1, 50000, rng)[2], exact_value,
+                                   delta=0.3)
+            self.assertAlmostEqual(oracle.rollout_outcome(LATE_STATE, horizon, 2, 50000, rng)[2],
+                                   oracle.exact_continue_value(LATE_STATE, horizon, 2), delta=0.3)
+
+    def test_exact_limit(self):
+        rollout_oracle = oracle.DiamantOracle(rollouts=50000, exact_limit=1, seed=0)
+        exact_oracle = oracle.DiamantOracle()
+        self.assertFalse(rollout_oracle.evaluate(LATE_STATE, horizon=2).exact)
+        self.assertTrue(exact_oracle.evaluate(LATE_STATE, horizon=2).exact)
+        self.assertAlmostEqual(rollout_oracle.evaluate(LATE_STATE, horizon=2).continue_value,
+                               exact_oracle.evaluate(LATE_STATE, horizon=2).continue_value, delta=0.3)
+
+    def test_cache(self):
+        diamant_oracle = oracle.DiamantOracle(cache_size=2, exact_limit=1, seed=0)
+        diamant_oracle.evaluate(LATE_STATE, horizon=3)
+        # a lone leaver with another pocket shares the entry
+        self.assertAlmostEqual(diamant_oracle.evaluate(LATE_STATE._replace(pocket=0), horizon=3).continue_value,
+                               diamant_oracle.evaluate(LATE_STATE, horizon=3).continue_value - 10 *
+                               diamant_oracle.cache[oracle.outcome_key(LATE_STATE, 3)][0])
+        self.assertEqual(len(diamant_oracle.cache), 1)
+
+        diamant_oracle.evaluate(LATE_STATE, horizon=4)
+        diamant_oracle.evaluate(LATE_STATE, horizon=3)  # the horizon 4 entry is now the oldest one
+        diamant_oracle.evaluate(LATE_STATE, horizon=5)
+        self.assertEqual(list(diamant_oracle.cache), [oracle.outcome_key(LATE_STATE, 3),
+                                                      oracle.outcome_key(LATE_STATE, 5)])
+
+    def test_state_from_game(self):
+        deck = game_engine.Deck(rng=np.random.default_rng(0))
+        board = game_engine.Board()
+        match_history = game_engine.MatchHistory()
+        players = [game_engine.Player(player_id) for player_id in range(3)]
+        players[2].in_cave = False
+        for card in [game_engine.Card("Treasure", 7), game_engine.Card("Trap", "Snake"),
+                     game_engine.Card("Relic", 5)]:
+            board.add_card(card, match_history)
+        board.route[0].value = 1
+        players[0].pocket = 3
+        deck.position = 5
+
+        state = oracle.state_from_game(deck, board, players[0], players)
+        self.assertEqual(sum(state.counts), len(deck.codes) - 5)
+        self.assertEqual(state[1:], (SNAKE_BIT, 3, 1, 5, 2, 1))
@@ -0,0 +1,187 @@
+import asyncio
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import game_engine
+from outcome_reporter import OutcomeReporter
+from tests_batch_engine import ThresholdEngineInterface
+from tests_game_engine import CountingEngineInterface
+
+
+class ResultsService(ThreadingHTTPServer):
+    # local results service, answers with the queued status codes and then with 200
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ResultsHandler)
+        self.statuses = []
+        self.batches = []  # (content encoding, outcomes) of every accepted post
+        self.clients = set()
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:" + str(self.server_address[1]) + "/outcomes"
+
+    def outcomes(self) -> list:
+        return [outcome for _, outcomes in self.batches for outcome in outcomes]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class ResultsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keeps the connection open between posts
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.clients.add(self.client_address)
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status == 200:
+            encoding = self.headers.get("Content-Encoding")
+            self.server.batches.append((encoding, json.loads(gzip.decompress(body) if encoding == "gzip" else body)))
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def unused_url() -> str:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return "http://127.0.0.1:" + str(probe.getsockname()[1]) + "/outcomes"
+
+
+def finished_history(seed: int) -> game_engine.MatchHistory:
+    engine = game_engine.GameEngine(engine_interface=ThresholdEngineInterface([5, 10, 20]), seed=seed)
+    engine.run_game()
+    return engine.match_history
+
+
+class OutcomeReporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.service = ResultsService()
+        self.spool_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.service.stop()
+        self.spool_dir.cleanup()
+
+    def reporter(self, url=None, **kwargs) -> OutcomeReporter:
+        kwargs = dict(dict(spool_dir=self.spool_dir.name, flush_interval=60, backoff=0.01), **kwargs)
+        return OutcomeReporter(url or self.service.url, **kwargs)
+
+    def test_batches(self):
+        history = finished_history(0)
+        reporter = self.reporter(batch_size=5, details={"runner": "test"})
+        for match in range(12):
+            reporter.report([match], history, match_id=match, player_ids=[0, 1, 2])
+        reporter.close()
+
+        self.assertEqual([len(outcomes) for _, outcomes in self.service.batches], [5, 5, 2])
+        self.assertEqual([outcome["winners"] for outcome in self.service.outcomes()], [[match] for match in range(12)])
+        self.assertEqual(self.service.outcomes()[0]["match_history"], history.to_list())
+        self.assertEqual(self.service.outcomes()[0]["runner"], "test")
+        self.assertEqual([outcome["match_id"] for outcome in self.service.outcomes()], list(range(12)))
+        self.assertEqual(self.service.outcomes()[0]["player_ids"], [0, 1, 2])
+        self.assertEqual({encoding for encoding, _ in self.service.batches}, {"gzip"})
+        self.assertEqual(len(self.service.clients), 1)  # every batch went over the same connection
+        self.assertEqual(reporter.reported, 12)
+
+    def test_small_batches_are_not_compressed(self):
+        reporter = self.reporter(compress_threshold=1 << 20)
+        reporter.report([0], [])
+        reporter.close()
+        self.assertEqual(self.service.batches, [(None, [mock.ANY])])
+
+    def test_retry(self):
+        self.service.statuses = [503, 500]
+        reporter = self.reporter()
+        reporter.report([1], [])
+        with self.assertLogs(level="WARNING"):
+            reporter.close()
+
+        self.assertEqual(reporter.failed_posts, 2)
+        self.assertEqual(reporter.reported, 1)
+        self.assertEqual(reporter.spool_files(), [])
+
+    def test_spool(self):
+        down = self.reporter(url=unused_url(), batch_size=2, max_retries=1)
+        for match in range(3):
+            down.report([match], [])
+        with self.assertLogs(level="WARNING"):
+            down.close()
+        self.assertEqual(len(down.spool_files()), 2)
+        self.assertEqual(down.spooled, 3)
+
+        # the spooled outcomes go out first, in order, once the service is there again
+        up = self.reporter()
+        up.report([3], [])
+        up.close()
+        self.assertEqual([outcome["winners"] for outcome in self.service.outcomes()], [[0], [1], [2], [3]])
+        self.assertEqual(up.spool_files(), [])
+        self.assertEqual(up.reported, 4)
+
+    def test_max_pending(self):
+        # a slow service does not let the queue grow, the overflow is spooled by the background thread
+        reporter = self.reporter(url=unused_url(), max_pending=2)
+        spooling_threads = []
+        spool = reporter.spool
+
+        def recording_spool(*args):
+            spooling_threads.append(threading.current_thread())
+            spool(*args)
+
+        reporter.spool = recording_spool
+        for match in range(3):
+            reporter.report([match], [], match_id=match)
+        self.assertEqual(reporter.pending, [])
+        with self.assertLogs(level="WARNING"):
+            reporter.close()
+        self.assertEqual(len(reporter.spool_files()), 1)
+        self.assertEqual(reporter.spooled, 3)
+        self.assertEqual(spooling_threads, [reporter.sender])
+
+    def test_max_pending_without_spool_dir(self):
+        reporter = self.reporter(spool_dir=None, max_pending=2)
+        with self.assertLogs(level="ERROR"):
+            for match in range(4):
+                reporter.report([match], [], match_id=match)
+        self.assertEqual([outcome[3] for outcome in reporter.pending], [2, 3])
+        self.assertEqual(reporter.dropped, 2)
+        reporter.close()
+        self.assertEqual([outcome["match_id"] for outcome in self.service.outcomes()], [2, 3])
+
+    def test_engine_reports_in_background(self):
+        reporter = self.reporter()
+        engine_interface = CountingEngineInterface()
+        engine_interface.report_outcome = mock.Mock()
+        engine = game_engine.AsyncGameEngine(engine_interface=engine_interface, seed=4, outcome_reporter=reporter,
+                                             match_id="m4")
+
+        loop = asyncio.new_event_loop()
+        try:
+            winners = loop.run_until_complete(engine.start())
+        finally:
+            loop.close()
+        reporter.close()
+
+        engine_interface.report_outcome.assert_not_called()
+        self.assertEqual(self.service.outcomes()[0]["winners"], winners)
+        self.assertEqual(self.service.outcomes()[0]["match_id"], "m4")
+        self.assertEqual(self.service.outcomes()[0]["player_ids"], list(range(6)))
+        self.assertEqual(self.service.outcomes()[0]["match_history"], engine.match_history.to_list())
+        self.assertFalse(os.listdir(self.spool_dir.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+import game_engine
+import ratings
+from tests_batch_engine import final_chests, ThresholdEngineInterface
+
+
+def random_matches(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    bots = ["bot" + str(bot) for bot in range(8)]
+    matches = []
+    for _ in range(count):
+        players = rng.sample(bots, rng.randint(2, 5))
+        matches.append((players, [rng.randint(0, 2) for _ in players]))
+    return matches
+
+
+class RanksTestCase(unittest.TestCase):
+    def test_winner_ranks(self):
+        self.assertEqual(ratings.winner_ranks(4, [1, 3]), [1, 0, 1, 0])
+        self.assertEqual(ratings.chest_ranks([10, 30, 10, 5]), [1, 0, 1, 3])
+
+    def test_history_ranks(self):
+        thresholds = [4, 12, 30]
+        engine = game_engine.GameEngine(engine_interface=ThresholdEngineInterface(thresholds), seed=7)
+        winners = engine.run_game()
+        ranks = ratings.history_ranks(engine.match_history.to_bytes(), len(thresholds))
+        self.assertEqual(ranks, ratings.chest_ranks(final_chests(engine.match_history, len(thresholds))))
+        self.assertEqual([player_id for player_id, rank in enumerate(ranks) if rank == 0], winners)
+
+
+class RatingBookTestCase(unittest.TestCase):
+    def test_elo(self):
+        book = ratings.RatingBook(ratings.Elo())
+        book.record(["a", "b"], [0, 1])
+        self.assertEqual(book.rating("a"), [1516.0])
+        self.assertEqual(book.rating("b"), [1484.0])
+        book.record(["c", "d"], [0, 0])
+        self.assertEqual(book.rating("c"), [1500.0])
+        # three players: the winner beats both, the k factor is spread over the two opponents
+        book.record(["e", "f", "g"], [0, 1, 1])
+        self.assertEqual(book.rating("e"), [1516.0])
+        self.assertEqual(book.rating("f"), [1492.0])
+
+    def test_trueskill(self):
+        book = ratings.RatingBook(ratings.TrueSkill())
+        book.record(["a", "b", "c"], [0, 1, 1])
+        (mu_a, sigma_a), (mu_b, sigma_b), (mu_c, _) = book.rating("a"), book.rating("b"), book.rating("c")
+        self.assertGreater(mu_a, 25)
+        self.assertLess(mu_b, 25)
+        self.assertAlmostEqual(mu_b, mu_c)
+        self.assertAlmostEqual(mu_a - 25, 2 * (25 - mu_b))
+        self.assertLess(sigma_a, 25 / 3)
+        self.assertLess(sigma_b, 25 / 3)
+        self.assertEqual([player for player, *_ in book.leaderboard()], ["a", "b", "c"])
+
+    def test_bulk_matches_incremental(self):
+        matches = random_matches(300)
+        for model in ratings.MODELS.values():
+            incremental, bulk = ratings.RatingBook(model()), ratings.RatingBook(model())
+            for players, ranks in matches:
+                incremental.record(players, ranks)
+            bulk.record_many(matches)
+            self.assertEqual(bulk.index, incremental.index)
+            np.testing.assert_allclose(bulk.values, incremental.values)
+            np.testing.assert_array_equal(bulk.matches_played, incremental.matches_played)
+            self.assertEqual(bulk.matches, 300)
+
+    def test_match_waves(self):
+        matches = [(["a", "b"], [0, 1]), (["c", "d"], [0, 1]), (["b", "c"], [0, 1]), (["e", "f"], [0, 1])]
+        self.assertEqual(ratings.match_waves(matches), [0, 0, 1, 0])
+
+    def test_record_results(self):
+        book = ratings.RatingBook()
+        book.record_results([{"pairing": ["a", "b"], "winners": [0]}, {"pairing": ["a", "b"], "winners": [0, 1]}])
+        book.record_result({"pairing": ["b", "c"], "winners": [1]})
+        self.assertEqual(book.matches, 3)
+        # a gave some rating back in the tie with the weaker b, c won against b without that
+        self.assertEqual([player for player, *_ in book.leaderboard(2)], ["c", "a"])
+        self.assertRaises(ValueError, book.record, ["a", "b"], [0])
+
+    def test_self_play_is_skipped(self):
+        book = ratings.RatingBook()
+        with self.assertLogs(level="WARNING"):
+            book.record_results([{"pairing": ["a", "a"], "winners": [0]}, {"pairing": ["a", "b"], "winners": [0]}])
+        self.assertEqual(book.matches, 1)
+        self.assertEqual(book.matches_played.tolist(), [1, 1])
+
+    def test_checkpoint(self):
+        book = ratings.RatingBook(ratings.TrueSkill(beta=3.0))
+        book.record_many(random_matches(50))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ratings.json")
+            book.save(path)
+            loaded = ratings.RatingBook.load(path)
+
+        self.assertEqual(loaded.model.beta, 3.0)
+        self.assertEqual(loaded.leaderboard(), book.leaderboard())
+        self.assertEqual(loaded.matches, 50)
+        # a loaded book carries on exactly like the one that was saved
+        loaded.record(["bot0", "new"], [0, 1])
+        book.record(["bot0", "new"], [0, 1])
+        self.assertEqual(loaded.leaderboard(), book.leaderboard())
+
+    def test_checkpoint_keeps_player_ids(self):
+        book = ratings.RatingBook()
+        book.record([0, "1"], [0, 1])
+        loaded = ratings.RatingBook.from_dict(json.loads(json.dumps(book.to_dict())))
+        self.assertEqual(list(loaded.index), [0, "1"])
+
+        loaded.record([0, 2], [1, 0])
+        self.assertEqual(len(loaded.index), 3)
@@ -0,0 +1,157 @@
+import asyncio
+import unittest
+
+import game_engine
+from game_engine import MatchEvent
+import replay
+from tests_batch_engine import ThresholdEngineInterface
+from tests_game_engine import CountingEngineInterface
+
+
+def recorded_history(*events):
+    match_history = game_engine.MatchHistory()
+    for event in events:
+        match_history.record(*event)
+    return match_history
+
+
+# two players share a 7 and a 5, player 1 leaves alone with the relic, a second snake kills player 0
+VALID_EVENTS = [
+    (MatchEvent.NEW_PATH, 0),
+    (MatchEvent.ADD_CARD, "Treasure", 7),
+    (MatchEvent.CHANGE_CARD, 0, "Treasure", 1),
+    (MatchEvent.PICKUP_LOOT, 0, 0, 3),
+    (MatchEvent.PICKUP_LOOT, 1, 0, 3),
+    (MatchEvent.ADD_CARD, "Relic", 5),
+    (MatchEvent.ADD_CARD, "Trap", "Snake"),
+    (MatchEvent.ADD_CARD, "Treasure", 5),
+    (MatchEvent.CHANGE_CARD, 3, "Treasure", 1),
+    (MatchEvent.PICKUP_LOOT, 0, 3, 2),
+    (MatchEvent.PICKUP_LOOT, 1, 3, 2),
+    (MatchEvent.CHANGE_CARD, 0, "Treasure", 0),
+    (MatchEvent.PICKUP_LOOT, 1, 5, 1),
+    (MatchEvent.CHANGE_CARD, 3, "Treasure", 0),
+    (MatchEvent.PICKUP_LOOT, 1, 6, 1),
+    (MatchEvent.PICKUP_LOOT, 1, 7, 5),
+    (MatchEvent.CHANGE_CARD, 1, "Relic", 0),
+    (MatchEvent.LEAVE_CAVE, 1, 12, 0),
+    (MatchEvent.TRIGGER_TRAP, "Trap", "Snake"),
+    (MatchEvent.ADD_CARD, "Trap", "Snake"),
+    (MatchEvent.KILL_PLAYER, 0, 5),
+    (MatchEvent.NEW_PATH, 1),
+]
+
+
+class MatchReplayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.match_history = recorded_history(*VALID_EVENTS)
+
+    def test_seek(self):
+        match_replay = replay.MatchReplay(self.match_history, snapshot_interval=4)
+        state = match_replay.seek(17)
+
+        self.assertEqual(match_replay.player_ids, [0, 1])
+        self.assertEqual(state.position, 17)
+        self.assertEqual([(card.card_type, card.value) for card in state.board.route],
+                         [("Treasure", 0), ("Relic", 0), ("Trap", "Snake"), ("Treasure", 0)])
+        self.assertEqual(state.board.relics_picked, 1)
+        self.assertEqual((state.players[0].pocket, state.players[1].pocket), (5, 12))
+        self.assertEqual(len(match_replay.snapshots), 5)
+
+        final_state = match_replay.seek(len(self.match_history))
+        self.assertEqual(final_state.path_num, 1)
+        self.assertEqual((final_state.players[0].chest, final_state.players[1].chest), (0, 12))
+        self.assertTrue(final_state.players[0].in_cave)
+        self.assertEqual(final_state.board.route, [])
+
+    def test_seek_back(self):
+        match_replay = replay.MatchReplay(self.match_history, snapshot_interval=4)
+        match_replay.seek(len(self.match_history))
+        state = match_replay.seek(3)
+
+        self.assertEqual(state.board.route[0].value, 1)
+        self.assertEqual(state.players[0].pocket, 0)
+        self.assertEqual(match_replay.seek(len(self.match_history)).players[1].chest, 12)
+
+    def test_snapshots_match_full_replay(self):
+        engine = game_engine.AsyncGameEngine(engine_interface=CountingEngineInterface(), seed=2)
+        asyncio.run(engine.start())
+        match_history = engine.match_history
+        with_snapshots = replay.MatchReplay(match_history, snapshot_interval=16)
+        without_snapshots = replay.MatchReplay(match_history, snapshot_interval=len(match_history) + 1)
+
+        for position in replay.MatchReplay(match_history).event_positions(MatchEvent.ADD_CARD):
+            state = with_snapshots.seek(position)
+            expected_state = without_snapshots.seek(position)
+            self.assertEqual([player.pocket for player in state.players.values()],
+                             [player.pocket for player in expected_state.players.values()])
+            self.assertEqual([card.value for card in state.board.route],
+                             [card.value for card in expected_state.board.route])
+
+        final_state = with_snapshots.seek(len(match_history))
+        best_chest = max(player.chest for player in final_state.players.values())
+        winners = [player_id for player_id, player in final_state.players.items() if player.chest == best_chest]
+        self.assertEqual(sorted(engine.engine_interface.winners), winners)
+
+
+class VerifyHistoryTestCase(unittest.TestCase):
+    def test_valid_history(self):
+        self.assertEqual(replay.verify_history(recorded_history(*VALID_EVENTS)), [])
+
+    def test_wrong_pocket(self):
+        events = list(VALID_EVENTS)
+        events[17] = (MatchEvent.LEAVE_CAVE, 1, 11, 0)
+
+        problems = replay.verify_history(recorded_history(*events))
+        self.assertEqual(len(problems), 1)
+        self.assertTrue(problems[0].startswith("17: player 1"))
+
+    def test_uneven_split(self):
+        events = list(VALID_EVENTS)
+        events[4] = (MatchEvent.PICKUP_LOOT, 1, 0, 4)
+
+        self.assertTrue(replay.verify_history(recorded_history(*events))[0].startswith("2: treasure split"))
+
+    def test_card_rules(self):
+        events = list(VALID_EVENTS)
+        events[5] = (MatchEvent.ADD_CARD, "Relic", 0)
+        del events[18]  # the second snake without its trigger
+
+        problems = replay.verify_history(recorded_history(*events))
+        self.assertTrue(problems[0].startswith("5: relic added with value 0"))
+        self.assertTrue(any(problem.startswith("18: trap Snake") for problem in problems))
+
+    def test_cards_left_between_paths(self):
+        # three relics on each of three paths, but the first two paths already took six of the five relics
+        events = []
+        for path_num, value in enumerate((5, 10, 10)):
+            events += [(MatchEvent.NEW_PATH, path_num)] + [(MatchEvent.ADD_CARD, "Relic", value)] * 3
+
+        problems = replay.verify_history(recorded_history(*events))
+        self.assertEqual(problems, ["7: too many Relic 5 cards", "9: too many Relic 5 cards",
+                                    "10: too many Relic 5 cards", "11: too many Relic 5 cards"])
+
+    def test_verify_histories(self):
+        broken_history = recorded_history(*VALID_EVENTS[:2], (MatchEvent.ADD_CARD, "Treasure", 6))
+        histories = [recorded_history(*VALID_EVENTS).to_bytes(), broken_history] * 3
+
+        results = replay.verify_histories(histories, processes=2, chunksize=2)
+        self.assertEqual(results[::2], [[], [], []])
+        self.assertEqual(results[1], ["2: Treasure 6 is not a card of the deck"])
+        self.assertEqual(results, replay.verify_histories(histories))
+
+    def test_seeded_games(self):
+        # duplicate cards are separate cards: a second Treasure 5 is drawn worth 5 after the first one was split,
+        # only the 4th and 5th relic are worth 10, and the verifier sees any of them as a card outside the deck
+        histories = []
+        for seed in range(300):
+            thresholds = [2, 5, 9, 14, 30][:2 + seed % 4]
+            engine = game_engine.GameEngine(engine_interface=ThresholdEngineInterface(thresholds), seed=seed)
+            engine.run_game()
+            histories.append(engine.match_history.to_bytes())
+
+        self.assertEqual([problems for problems in replay.verify_histories(histories) if problems], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+import batch_engine
+import sweep
+from sweep import Strategy
+from tests_batch_engine import THRESHOLDS, threshold_decisions
+
+
+class SweepTestCase(unittest.TestCase):
+    def test_parse_strategy(self):
+        self.assertEqual(sweep.parse_strategy("pocket:12"), Strategy("pocket", 12))
+        self.assertEqual(sweep.strategy_name(Strategy("traps", 2)), "traps:2")
+        self.assertRaises(ValueError, sweep.parse_strategy, "greedy:3")
+        self.assertEqual(sweep.strategy_grid(pocket=[5, 10], traps=[1]),
+                         [Strategy("pocket", 5), Strategy("pocket", 10), Strategy("traps", 1)])
+
+    def test_strategy_table(self):
+        # pocket strategies make the same decisions as the batch engine tests' thresholds
+        seeds = list(range(20))
+        table = sweep.StrategyTable(tuple(Strategy("pocket", threshold) for threshold in THRESHOLDS))
+        self.assertEqual(batch_engine.BatchGameEngine(table, len(THRESHOLDS)).run_games(seeds),
+                         batch_engine.BatchGameEngine(threshold_decisions, len(THRESHOLDS)).run_games(seeds))
+
+        state = batch_engine.BatchState(2, 2)
+        state.traps_seen[0, :2] = True
+        decisions = sweep.StrategyTable((Strategy("traps", 2), Strategy("traps", 3)))(state)
+        self.assertEqual(decisions.tolist(), [[False, True], [True, True]])
+
+    def test_wilson_interval(self):
+        lower, upper = sweep.wilson_interval(50, 100, 1.96)
+        self.assertAlmostEqual(lower, 0.4038, places=4)
+        self.assertAlmostEqual(upper, 0.5962, places=4)
+        self.assertEqual(sweep.wilson_interval(0, 0, 1.96), (0.0, 1.0))
+        self.assertEqual(sweep.wilson_interval(10, 10, 1.96)[1], 1.0)
+
+    def test_play_batch(self):
+        strategies = (Strategy("pocket", 5), Strategy("pocket", 12))
+        seeds = sweep.batch_seeds(0, 3, 1, 50)
+        matchup_id, wins, games = sweep.play_batch((3, strategies, seeds))
+        self.assertEqual((matchup_id, games), (3, 50))
+        self.assertAlmostEqual(wins.sum(), 50)
+        # the seeds of a batch do not depend on anything else, so batches replay exactly
+        np.testing.assert_array_equal(sweep.play_batch((3, strategies, sweep.batch_seeds(0, 3, 1, 50)))[1], wins)
+        self.assertFalse(np.array_equal(sweep.play_batch((3, strategies, sweep.batch_seeds(0, 3, 2, 50)))[1], wins))
+
+    def test_early_stopping(self):
+        # walking out after the first coin loses clearly, the mirror matchup never gets clear
+        matchups = [(Strategy("pocket", 1), Strategy("pocket", 10)), (Strategy("pocket", 8), Strategy("pocket", 8))]
+        summaries = list(sweep.run_sweep(matchups, processes=2, batch_size=200, min_games=400, max_games=2000))
+        final = {summary["matchup_id"]: summary for summary in summaries if summary["done"]}
+
+        self.assertEqual(sorted(final), [0, 1])
+        self.assertTrue(final[0]["decided"])
+        self.assertLess(final[0]["games"], 2000)
+        self.assertGreater(final[0]["win_rates"][1], final[0]["intervals"][0][1])
+        self.assertEqual(final[1]["games"], 2000)
+        self.assertFalse(final[1]["decided"])
+        self.assertEqual(sum(summary["done"] for summary in summaries), 2)
@@ -0,0 +1,76 @@
+import unittest
+
+import game_engine
+import tournament
+
+
+def always_leave(_):
+    return 0
+
+
+def always_continue(_):
+    return 1
+
+
+class RoundRobinTestCase(unittest.TestCase):
+    def test_round_robin_pairings(self):
+        pairings = tournament.round_robin(["a", "b", "c"], rounds=2)
+
+        self.assertEqual(len(pairings), 6)
+        self.assertIn(("a", "b"), pairings)
+        self.assertIn(("b", "c"), pairings)
+
+    def test_load_bot_cached(self):
+        bot = tournament.load_bot("tests_tournament:always_leave")
+
+        self.assertIs(bot, tournament.load_bot("tests_tournament:always_leave"))
+        self.assertEqual(bot(None), 0)
+
+
+class BotTableTestCase(unittest.TestCase):
+    def test_bot_class_per_seat(self):
+        engine_interface = tournament.BotTableInterface(["tests_bot_pool:Calls", "tests_bot_pool:Calls"])
+
+        self.assertIsNot(engine_interface.bots[0], engine_interface.bots[1])
+        self.assertEqual(engine_interface.request_decisions([]), {0: {"decision": 1}, 1: {"decision": 1}})
+
+    def test_bots_see_every_event(self):
+        # the bot that leaves right away is not asked for the rest of the path, but gets those events later
+        seen = {0: [], 1: []}
+
+        def recording_bot(player_id, decision):
+            def bot(updates):
+                seen[player_id].extend(updates)
+                return decision
+            return bot
+
+        engine_interface = tournament.BotTableInterface([])
+        engine_interface.bots, engine_interface.players = [recording_bot(0, 0), recording_bot(1, 1)], range(2)
+        engine = game_engine.GameEngine(engine_interface=engine_interface, seed=3)
+        engine.run_game()
+
+        self.assertGreater(engine.skipped_decision_requests, 0)
+        for player_id in (0, 1):
+            self.assertEqual(seen[player_id], engine.match_history[:len(seen[player_id])])
+        self.assertGreater(len(seen[0]), len(engine.match_history) // 2)
+
+
+class RunTournamentTestCase(unittest.TestCase):
+    def test_run_match_reproducible(self):
+        job = (0, ("tests_tournament:always_leave", "tests_tournament:always_continue"), 7)
+
+        self.assertEqual(tournament.run_match(job), tournament.run_match(job))
+
+    def test_run_tournament_results(self):
+        pairings = [("tests_tournament:always_leave", "tests_tournament:always_continue")] * 8
+
+        results = list(tournament.run_tournament(pairings, processes=2))
+
+        self.assertEqual(sorted(result["match_id"] for result in results), list(range(8)))
+        for result in results:
+            self.assertTrue(set(result["winning_bots"]) <= set(result["pairing"]))
+            self.assertEqual(result, tournament.run_match((result["match_id"], pairings[0], result["seed"])))
+
+
+if __name__ == '__main__':
+    unittest.main()
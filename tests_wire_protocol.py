@@ -0,0 +1,147 @@
+import asyncio
+import json
+import unittest
+
+from benchmarks import FakeGameServer, SocketEngineInterface, turn_history
+import game_engine
+from game_engine import MatchEvent
+import wire_protocol
+
+
+class LegacyGameServer(FakeGameServer):
+    # a server from before the protocol negotiation, it answers every line with decisions
+    async def handle_connection(self, reader, writer):
+        self.connections.add(asyncio.current_task())
+        while await reader.readline():
+            writer.write((json.dumps(self.decisions.request_decisions(None)) + "\n").encode())
+            await writer.drain()
+        writer.close()
+
+
+class EncodingTestCase(unittest.TestCase):
+    def test_varint(self):
+        for value in (0, 1, 127, 128, 300, 2 ** 40):
+            buffer = bytearray()
+            wire_protocol.write_varint(buffer, value)
+            self.assertEqual(wire_protocol.read_varint(buffer, 0), (value, len(buffer)))
+        self.assertEqual([wire_protocol.zigzag(value) for value in (0, -1, 1, -2)], [0, 1, 2, 3])
+        for value in (0, -1, 5, -300, 2 ** 40, -2 ** 40):
+            self.assertEqual(wire_protocol.unzigzag(wire_protocol.zigzag(value)), value)
+
+    def test_updates(self):
+        match_history = turn_history()
+        match_history.record(MatchEvent.TRIGGER_TRAP, "Trap", "Ram")
+        match_history.record(MatchEvent.PICKUP_LOOT, 2, 400, -3)
+        match_history.record(MatchEvent.LEAVE_CAVE, "bot_a", 12, 30)  # kept as a content dict
+        updates = match_history.get_updates()
+
+        payload = wire_protocol.encode_updates(updates)
+        self.assertEqual(wire_protocol.decode_updates(payload), updates.to_list())
+        self.assertEqual(wire_protocol.encode_updates(updates.to_list()), payload)
+        self.assertLess(len(payload), len(wire_protocol.JsonProtocol.encode_updates(updates)) / 4)
+        self.assertEqual(json.loads(wire_protocol.JsonProtocol.encode_updates(updates)), updates.to_list())
+
+        self.assertRaises(ValueError, wire_protocol.decode_updates, payload[:-1])
+        self.assertRaises(ValueError, wire_protocol.decode_updates, payload + b"\0")
+
+    def test_decisions(self):
+        decisions = {0: {"decision": 1}, 5: {"decision": 0}, -1: {"decision": True}}
+        payload = wire_protocol.encode_decisions(decisions)
+        self.assertEqual(wire_protocol.decode_decisions(payload),
+                         {0: {"decision": 1}, 5: {"decision": 0}, -1: {"decision": 1}})
+        self.assertRaises(ValueError, wire_protocol.decode_decisions, payload[:-1])
+
+    def test_frame(self):
+        async def read(data):
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return [await wire_protocol.read_frame(reader), await wire_protocol.read_frame(reader)]
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(read(wire_protocol.frame(2, b"x" * 200))),
+                             [(2, b"x" * 200), None])
+            self.assertRaises(asyncio.IncompleteReadError, loop.run_until_complete,
+                              read(wire_protocol.frame(2, b"x" * 200)[:-1]))
+        finally:
+            loop.close()
+
+
+class NegotiationTestCase(unittest.IsolatedAsyncioTestCase):
+    async def play(self, server, protocols) -> tuple:
+        address = await server.start()
+        engine_interface = SocketEngineInterface(address, protocols=protocols)
+        engine = game_engine.AsyncGameEngine(engine_interface=engine_interface, seed=3)
+        winners = await engine.start()
+        engine_interface.close()
+        await server.stop()
+        return engine_interface.protocol, winners, engine.match_history
+
+    async def test_protocols(self):
+        protocol, winners, match_history = await self.play(FakeGameServer(seed=1), tuple(wire_protocol.PROTOCOLS))
+        self.assertIs(protocol, wire_protocol.BinaryProtocol)
+
+        # both protocols carry the same decisions, so the same game is played
+        for server, protocols in ((FakeGameServer(seed=1, protocols=("json",)), tuple(wire_protocol.PROTOCOLS)),
+                                  (FakeGameServer(seed=1), ("json",))):
+            json_protocol, json_winners, json_history = await self.play(server, protocols)
+            self.assertIs(json_protocol, wire_protocol.JsonProtocol)
+            self.assertEqual(json_winners, winners)
+            self.assertEqual(json_history, match_history)
+
+        # an older server answers the protocol line like a request, the connection stays on json
+        protocol, _, _ = await self.play(LegacyGameServer(seed=1), tuple(wire_protocol.PROTOCOLS))
+        self.assertIs(protocol, wire_protocol.JsonProtocol)
+
+    async def test_client_without_negotiation(self):
+        server = FakeGameServer(seed=0)
+        reader, writer = await asyncio.open_connection(*await server.start())
+        await wire_protocol.JsonProtocol.write_updates(writer, turn_history().get_updates())
+        decisions = await wire_protocol.JsonProtocol.read_decisions(reader)
+        writer.close()
+        await server.stop()
+        self.assertEqual(sorted(decisions), list(range(6)))
+
+    async def test_late_reply_is_dropped(self):
+        # the first reply misses the decision deadline, the next turn must not take it for its own
+        class SlowFirstGameServer(FakeGameServer):
+            async def handle_connection(self, reader, writer):
+                self.connections.add(asyncio.current_task())
+                protocol, _ = await wire_protocol.accept_protocol(reader, writer, self.protocols)
+                turn = 0
+                while await protocol.read_updates(reader) is not None:
+                    turn += 1
+                    if turn == 1:
+                        await asyncio.sleep(0.2)
+                    await protocol.write_decisions(writer, {0: {"decision": turn}})
+                writer.close()
+
+        for protocols in (("json",), ("binary",)):
+            server = SlowFirstGameServer(protocols=protocols)
+            engine_interface = wire_protocol.WireEngineInterface(await server.start(), range(1), protocols)
+            await engine_interface.init_players()
+
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(engine_interface.request_decisions(turn_history().get_updates()), 0.05)
+            await asyncio.sleep(0.3)
+            self.assertEqual(await engine_interface.request_decisions(turn_history().get_updates()),
+                             {0: {"decision": 2}})
+
+            engine_interface.close()
+            await server.stop()
+
+    async def test_closed_connection(self):
+        server = FakeGameServer(seed=0)
+        engine_interface = wire_protocol.WireEngineInterface(await server.start(), range(6))
+        await engine_interface.init_players()
+        engine_interface.writer.close()
+        await server.stop()
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                await engine_interface.request_decisions(turn_history().get_updates())
+        engine_interface.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import argparse
+from collections import Counter
+import importlib
+import inspect
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+
+from game_engine import GameEngine
+
+
+_loaded_bots = {}  # per worker process, so every bot module is imported once and reused between games
+
+
+def load_bot(bot_spec: str):
+    # bot_spec is "module" or "module:function", the function defaults to handle_decision like dummy_player
+    if bot_spec not in _loaded_bots:
+        module_name, _, function_name = bot_spec.partition(":")
+        module = importlib.import_module(module_name)
+        _loaded_bots[bot_spec] = getattr(module, function_name or "handle_decision")
+    return _loaded_bots[bot_spec]
+
+
+def create_bot(bot_spec: str):
+    # a bot class gets one instance per game and seat to keep its state in, a bot function is shared by all of them
+    bot = load_bot(bot_spec)
+    return bot() if inspect.isclass(bot) else bot
+
+
+def round_robin(bot_specs: list, players_per_match: int = 2, rounds: int = 1) -> list:
+    # every combination of bots plays `rounds` matches
+    return [pairing for _ in range(rounds) for pairing in itertools.combinations(bot_specs, players_per_match)]
+
+
+class BotTableInterface:
+    """
+        offline engine interface where every seat is played by a different bot
+        each bot receives the match history updates and returns its decision, like dummy_player.handle_decision
+        bot classes are instantiated for every seat, see create_bot
+    """
+    accepts_history_views = True
+    accepts_player_subsets = True  # bots that already left are not asked
+
+    def __init__(self, bot_specs: list):
+        self.bots = [create_bot(bot_spec) for bot_spec in bot_specs]
+        self.players = range(len(self.bots))
+
+    def init_players(self):
+        pass
+
+    def request_decisions(self, updates, player_ids=None):
+        # asked for a subset, updates are per player: the events since that bot's last decision
+        if player_ids is None:
+            return {player_id: {"decision": self.bots[player_id](updates)} for player_id in self.players}
+        return {player_id: {"decision": self.bots[player_id](updates[player_id])} for player_id in player_ids}
+
+    def report_outcome(self, winners, match_history):
+        pass
+
+
+def run_match(job: tuple) -> dict:
+    match_id, pairing, seed = job
+    engine = GameEngine(engine_interface=BotTableInterface(pairing), seed=seed)
+    winners = engine.run_game()
+
+    return {"match_id": match_id, "pairing": list(pairing), "seed": seed,
+            "winners": winners, "winning_bots": [pairing[player_id] for player_id in winners]}
+
+
+def _preload_bots(bot_specs: list):
+    for bot_spec in bot_specs:
+        load_bot(bot_spec)
+
+
+def run_tournament(pairings: list, processes: int = None, chunksize: int = None, seed: int = 0):
+    """
+        plays every pairing in a pool of worker processes and yields match results as they finish
+        match i is seeded with seed + i, so any single match can be replayed with run_match
+    """
+    processes = processes or os.cpu_count() or 1
+    jobs = [(match_id, tuple(pairing), seed + match_id) for match_id, pairing in enumerate(pairings)]
+    if chunksize is None:  # a few chunks per worker keeps the load balanced without paying IPC per game
+        chunksize = max(1, len(jobs) // (processes * 4))
+
+    bot_specs = sorted({bot_spec for pairing in pairings for bot_spec in pairing})
+    with multiprocessing.Pool(processes, initializer=_preload_bots, initargs=(bot_specs,)) as pool:
+        yield from pool.imap_unordered(run_match, jobs, chunksize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play offline bots against each other on every core")
+    parser.add_argument("bots", nargs="+", help="bot modules as module or module:function (or class)")
+    parser.add_argument("--players-per-match", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    wins = Counter()
+    pairings = round_robin(args.bots, args.players_per_match, args.rounds)
+    for result in run_tournament(pairings, args.processes, args.chunksize, args.seed):
+        print(json.dumps(result), flush=True)
+        wins.update(result["winning_bots"])
+
+    logging.info("tournament wins: " + str(dict(wins)))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,334 @@
+"""
+    compact binary framing of the decision requests between the engine and the bots, with json as the fallback
+
+    a frame is a varint length followed by that many bytes: one frame type byte and the payload
+    updates payload: varint event count, then per event its event code byte and one zigzag varint per field in
+    EVENT_FIELDS order, card types and trap names as the integers MatchHistory stores. Events kept as a content
+    dict have EXTRA_EVENT_FLAG set on their code and carry a varint length prefixed json content instead
+    decisions payload: varint player count, then a zigzag varint player id and a zigzag varint decision per player
+
+    the protocol is picked once per connection: at init_players the client sends one json line
+    {"protocols": [names in order of preference]} and the server answers {"protocol": name}. Anything else,
+    e.g. the decisions an older server answers to every line, means the connection stays on json lines
+
+    matches opt in with GAMESERVER_PROTOCOLS for game_engine.py or a "protocols" key in a game_server assignment,
+    the other matches keep the gameserver's own EngineInterface. The outcome of a match does not travel over this
+    connection, report it with an OutcomeReporter (see game_server --report-url)
+    benchmarks.py times the decision round-trip of both protocols against benchmarks.FakeGameServer
+"""
+import asyncio
+import json
+
+from game_engine import EVENT_FIELDS, EVENT_TYPES, EventSequence, EXTRA_EVENT_FLAG, MatchHistory
+
+
+FRAME_UPDATES = 1
+FRAME_DECISIONS = 2
+MAX_FRAME_SIZE = 1 << 24
+FIELD_COUNTS = tuple(len(EVENT_FIELDS[event_type]) for event_type in EVENT_TYPES)
+
+
+def write_varint(buffer: bytearray, value: int):
+    # unsigned LEB128, seven bits per byte with the high bit set on every byte but the last
+    while value > 0x7f:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, offset: int) -> tuple:
+    # (value, offset after it)
+    value, shift = 0, 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def zigzag(value: int) -> int:
+    # small negative numbers stay small: 0, -1, 1, -2, ... become 0, 1, 2, 3, ...
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def encode_updates(updates) -> bytes:
+    # updates are a MatchHistory view, as accepts_history_views interfaces get them, or a list of event dicts
+    if not isinstance(updates, EventSequence):
+        updates = MatchHistory.from_events(updates)
+    history = updates.history
+    buffer = bytearray()
+    write_varint(buffer, len(updates))
+    for position in range(updates.start, updates.stop):
+        code = history.event_codes[position]
+        if position in history.extra_content:
+            content = json.dumps(history.extra_content[position]).encode()
+            buffer.append(code | EXTRA_EVENT_FLAG)
+            write_varint(buffer, len(content))
+            buffer += content
+            continue
+        buffer.append(code)
+        for column in history.fields[:FIELD_COUNTS[code]]:
+            value = zigzag(column[position])
+            if value < 0x80:  # most fields are small, one byte without the loop
+                buffer.append(value)
+            else:
+                write_varint(buffer, value)
+    return bytes(buffer)
+
+
+def decode_updates(payload: bytes) -> MatchHistory:
+    # a MatchHistory compares equal to the list of event dicts the json protocol delivers
+    history = MatchHistory()
+    columns = history.fields
+    try:
+        count, offset = read_varint(payload, 0)
+        for _ in range(count):
+            code = payload[offset]
+            offset += 1
+            if code & EXTRA_EVENT_FLAG:
+                length, offset = read_varint(payload, offset)
+                history.add_event(EVENT_TYPES[code & ~EXTRA_EVENT_FLAG], json.loads(payload[offset:offset + length]))
+                offset += length
+                continue
+            field_count = FIELD_COUNTS[code]
+            for index in range(3):
+                if index < field_count:
+                    value = payload[offset]
+                    if value < 0x80:
+                        offset += 1
+                    else:
+                        value, offset = read_varint(payload, offset)
+                    columns[index].append(value >> 1 if not value & 1 else -((value + 1) >> 1))
+                else:
+                    columns[index].append(0)
+            history.event_codes.append(code)
+    except IndexError:
+        raise ValueError("truncated or unknown event in an updates frame")
+    if offset != len(payload):
+        raise ValueError("updates frame has " + str(len(payload) - offset) + " bytes left over")
+    return history
+
+
+def encode_decisions(decisions: dict) -> bytes:
+    # {player_id: {"decision": ...}} with integer player ids, the only form the binary protocol carries
+    buffer = bytearray()
+    write_varint(buffer, len(decisions))
+    for player_id, decision in decisions.items():
+        write_varint(buffer, zigzag(player_id))
+        write_varint(buffer, zigzag(int(decision["decision"])))
+    return bytes(buffer)
+
+
+def decode_decisions(payload: bytes) -> dict:
+    decisions = {}
+    try:
+        count, offset = read_varint(payload, 0)
+        for _ in range(count):
+            player_id, offset = read_varint(payload, offset)
+            decision, offset = read_varint(payload, offset)
+            decisions[unzigzag(player_id)] = {"decision": unzigzag(decision)}
+    except IndexError:
+        raise ValueError("truncated decisions frame")
+    return decisions
+
+
+def frame(frame_type: int, payload: bytes) -> bytes:
+    header = bytearray()
+    write_varint(header, len(payload) + 1)
+    header.append(frame_type)
+    return bytes(header) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple:
+    # (frame type, payload), None once the other side closed the connection between frames
+    length, shift = 0, 0
+    while True:
+        byte = await reader.read(1)
+        if not byte:
+            if shift:
+                raise asyncio.IncompleteReadError(b"", None)
+            return None
+        length |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            break
+        shift += 7
+    if not 0 < length <= MAX_FRAME_SIZE:
+        raise ValueError("frame of " + str(length) + " bytes")
+    body = await reader.readexactly(length)
+    return body[0], body[1:]
+
+
+async def read_payload(reader: asyncio.StreamReader, frame_type: int):
+    received = await read_frame(reader)
+    if received is None:
+        return None
+    if received[0] != frame_type:
+        raise ValueError("expected frame type " + str(frame_type) + ", got " + str(received[0]))
+    return received[1]
+
+
+def json_player_id(player_id: str):
+    # json object keys are strings, the engine's player ids are mostly integers
+    try:
+        return int(player_id)
+    except ValueError:
+        return player_id
+
+
+class JsonProtocol:
+    # one json document per line: a list of event dicts per request, {player_id: {"decision": ...}} per reply
+    name = "json"
+
+    @staticmethod
+    def encode_updates(updates) -> bytes:
+        if isinstance(updates, EventSequence):
+            history = updates.history
+            return ("[" + ", ".join(history.event_json(position) for position in range(updates.start, updates.stop))
+                    + "]\n").encode()
+        return (json.dumps(updates) + "\n").encode()
+
+    @staticmethod
+    async def write_updates(writer: asyncio.StreamWriter, updates):
+        writer.write(JsonProtocol.encode_updates(updates))
+        await writer.drain()
+
+    @staticmethod
+    async def read_updates(reader: asyncio.StreamReader):
+        line = await reader.readline()
+        return json.loads(line) if line else None
+
+    @staticmethod
+    async def write_decisions(writer: asyncio.StreamWriter, decisions: dict):
+        writer.write((json.dumps(decisions) + "\n").encode())
+        await writer.drain()
+
+    @staticmethod
+    async def read_decisions(reader: asyncio.StreamReader) -> dict:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("connection closed while waiting for decisions")
+        return {json_player_id(player_id): decision for player_id, decision in json.loads(line).items()}
+
+
+class BinaryProtocol:
+    # length prefixed frames, see the module docstring
+    name = "binary"
+
+    @staticmethod
+    async def write_updates(writer: asyncio.StreamWriter, updates):
+        writer.write(frame(FRAME_UPDATES, encode_updates(updates)))
+        await writer.drain()
+
+    @staticmethod
+    async def read_updates(reader: asyncio.StreamReader):
+        payload = await read_payload(reader, FRAME_UPDATES)
+        return None if payload is None else decode_updates(payload)
+
+    @staticmethod
+    async def write_decisions(writer: asyncio.StreamWriter, decisions: dict):
+        writer.write(frame(FRAME_DECISIONS, encode_decisions(decisions)))
+        await writer.drain()
+
+    @staticmethod
+    async def read_decisions(reader: asyncio.StreamReader) -> dict:
+        payload = await read_payload(reader, FRAME_DECISIONS)
+        if payload is None:
+            raise ConnectionError("connection closed while waiting for decisions")
+        return decode_decisions(payload)
+
+
+PROTOCOLS = {protocol.name: protocol for protocol in (BinaryProtocol, JsonProtocol)}  # in order of preference
+
+
+async def negotiate(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, offered=tuple(PROTOCOLS)):
+    # client side, the protocol the server picked from `offered`, json if it did not pick one
+    writer.write((json.dumps({"protocols": list(offered)}) + "\n").encode())
+    await writer.drain()
+    try:
+        name = json.loads(await reader.readline()).get("protocol")
+    except (ValueError, AttributeError):
+        name = None
+    return PROTOCOLS[name] if name in offered and name in PROTOCOLS else JsonProtocol
+
+
+async def accept_protocol(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, supported=tuple(PROTOCOLS)):
+    """
+        server side of negotiate, returns (protocol, updates of a first request or None)
+        the first of the client's protocols that is supported wins, a client that starts with a request
+        instead of the protocol line is an older json client, its request is returned to be answered
+    """
+    line = await reader.readline()
+    if not line:
+        return JsonProtocol, None
+    request = json.loads(line)
+    if not isinstance(request, dict) or "protocols" not in request:
+        return JsonProtocol, request
+    name = next((name for name in request["protocols"] if name in supported and name in PROTOCOLS), "json")
+    writer.write((json.dumps({"protocol": name}) + "\n").encode())
+    await writer.drain()
+    return PROTOCOLS[name], None
+
+
+class WireEngineInterface:
+    """
+        async engine interface for bots behind one TCP connection, e.g. a bot host serving a whole match
+        init_players connects and negotiates the protocol, only json is offered with protocols=("json",)
+
+        the server answers every request in order, a background task reads the replies so a request cancelled at
+        the decision deadline never leaves half a frame behind, and its late reply is dropped by the next request
+    """
+    accepts_history_views = True  # the binary protocol encodes straight from the MatchHistory columns
+
+    def __init__(self, address: tuple, players, protocols=tuple(PROTOCOLS)):
+        self.address = address
+        self.players = players
+        self.protocols = protocols
+        self.protocol = None
+        self.reader = None
+        self.writer = None
+        self.replies = None
+        self.reply_reader = None
+        self.requests_sent = 0
+        self.replies_taken = 0
+
+    async def init_players(self):
+        self.reader, self.writer = await asyncio.open_connection(*self.address)
+        self.protocol = await negotiate(self.reader, self.writer, self.protocols)
+        self.replies = asyncio.Queue()
+        self.reply_reader = asyncio.ensure_future(self.read_replies())
+
+    async def read_replies(self):
+        try:
+            while True:
+                self.replies.put_nowait(await self.protocol.read_decisions(self.reader))
+        except Exception as error:  # the connection is gone, this and every later request fail with it
+            self.replies.put_nowait(error)
+
+    async def request_decisions(self, updates):
+        self.requests_sent += 1
+        request_number = self.requests_sent
+        await self.protocol.write_updates(self.writer, updates)  # buffered before the first await, never half sent
+        while True:
+            reply = await self.replies.get()
+            if isinstance(reply, Exception):
+                self.replies.put_nowait(reply)
+                raise reply
+            self.replies_taken += 1
+            if self.replies_taken == request_number:
+                return reply
+            # the reply to a request that was cancelled, e.g. at the decision deadline
+
+    def report_outcome(self, winners, match_history):
+        pass
+
+    def close(self):
+        if self.reply_reader is not None:
+            self.reply_reader.cancel()
+        if self.writer is not None:
+            self.writer.close()